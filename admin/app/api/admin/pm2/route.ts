@@ -2,64 +2,87 @@ import { NextRequest, NextResponse } from 'next/server'
 import { requireAuth, createApiResponse } from '@/lib/api-helpers'
 import { exec } from 'child_process'
 import { promisify } from 'util'
+import fs from 'fs'
+import path from 'path'
 
 const execAsync = promisify(exec)
 
 export const dynamic = 'force-dynamic'
 export const maxDuration = 60 // Увеличиваем максимальное время выполнения до 60 секунд
 
-// Управление PM2 процессами
-export async function POST(request: NextRequest) {
-  try {
-    // Проверяем аутентификацию: либо через cookie (для веб-интерфейса), либо через API ключ (для админ-бота)
-    const authToken = request.cookies.get('auth_token')?.value
-    const apiKey = request.headers.get('X-API-Key') || request.headers.get('Authorization')?.replace('Bearer ', '')
-    const adminApiKey = process.env.ADMIN_API_KEY
-    
-    // Логирование для отладки (только в development)
+// Список процессов для управления
+// ВАЖНО: Исключаем админ-бота (admin-bot) и админку (bingo-admin), 
+// чтобы они всегда работали и API был доступен для включения остальных процессов
+const PROCESSES_TO_MANAGE = [
+  'bingo-bot',
+  'bingo-bot-1xbet',
+  'bingo-bot-mostbet',
+  'bingo-email-watcher',
+  'bingo-operator-bot',
+  'bingo-payment'
+]
+
+// Аутентификация: либо cookie (веб-интерфейс), либо X-API-Key (админ-бот).
+// Возвращает ответ 401 или null, если доступ разрешен
+function checkAccess(request: NextRequest): NextResponse | null {
+  const authToken = request.cookies.get('auth_token')?.value
+  const apiKey = request.headers.get('X-API-Key') || request.headers.get('Authorization')?.replace('Bearer ', '')
+  const adminApiKey = process.env.ADMIN_API_KEY
+  
+  // Логирование для отладки (только в development)
+  if (process.env.NODE_ENV !== 'production') {
+    console.log('[PM2 API] Auth check:', {
+      hasAuthToken: !!authToken,
+      hasApiKey: !!apiKey,
+      hasAdminApiKey: !!adminApiKey,
+      apiKeyMatch: apiKey && adminApiKey ? apiKey === adminApiKey : false
+    })
+  }
+  
+  // Если есть API ключ и он совпадает с ADMIN_API_KEY - разрешаем доступ
+  if (apiKey && adminApiKey && apiKey === adminApiKey) {
+    // Доступ разрешен через API ключ
     if (process.env.NODE_ENV !== 'production') {
-      console.log('[PM2 API] Auth check:', {
-        hasAuthToken: !!authToken,
-        hasApiKey: !!apiKey,
-        hasAdminApiKey: !!adminApiKey,
-        apiKeyMatch: apiKey && adminApiKey ? apiKey === adminApiKey : false
-      })
+      console.log('[PM2 API] Access granted via API key')
     }
-    
-    // Если есть API ключ и он совпадает с ADMIN_API_KEY - разрешаем доступ
-    if (apiKey && adminApiKey && apiKey === adminApiKey) {
-      // Доступ разрешен через API ключ
+  } else if (authToken) {
+    // Проверяем обычную аутентификацию через cookie
+    try {
+      requireAuth(request)
       if (process.env.NODE_ENV !== 'production') {
-        console.log('[PM2 API] Access granted via API key')
-      }
-    } else if (authToken) {
-      // Проверяем обычную аутентификацию через cookie
-      try {
-        requireAuth(request)
-        if (process.env.NODE_ENV !== 'production') {
-          console.log('[PM2 API] Access granted via auth token')
-        }
-      } catch {
-        console.error('[PM2 API] Auth token validation failed')
-        return NextResponse.json(
-          createApiResponse(null, 'Unauthorized'),
-          { status: 401 }
-        )
+        console.log('[PM2 API] Access granted via auth token')
       }
-    } else {
-      console.error('[PM2 API] No authentication provided', {
-        hasApiKey: !!apiKey,
-        hasAdminApiKey: !!adminApiKey,
-        hasAuthToken: !!authToken
-      })
+    } catch {
+      console.error('[PM2 API] Auth token validation failed')
       return NextResponse.json(
         createApiResponse(null, 'Unauthorized'),
         { status: 401 }
       )
     }
+  } else {
+    console.error('[PM2 API] No authentication provided', {
+      hasApiKey: !!apiKey,
+      hasAdminApiKey: !!adminApiKey,
+      hasAuthToken: !!authToken
+    })
+    return NextResponse.json(
+      createApiResponse(null, 'Unauthorized'),
+      { status: 401 }
+    )
+  }
+  return null
+}
+
+// Управление PM2 процессами
+export async function POST(request: NextRequest) {
+  try {
+    const denied = checkAccess(request)
+    if (denied) {
+      return denied
+    }
 
     const body = await request.json()
-    const { action } = body
+    const { action, name } = body
 
     if (!action || !['stop', 'restart', 'start'].includes(action)) {
       return NextResponse.json(
@@ -68,17 +91,15 @@ export async function POST(request: NextRequest) {
       )
     }
 
-    // Список процессов для управления
-    // ВАЖНО: Исключаем админ-бота (admin-bot) и админку (bingo-admin), 
-    // чтобы они всегда работали и API был доступен для включения остальных процессов
-    const processesToManage = [
-      'bingo-bot',
-      'bingo-bot-1xbet',
-      'bingo-bot-mostbet',
-      'bingo-email-watcher',
-      'bingo-operator-bot',
-      'bingo-payment'
-    ]
+    if (name !== undefined && !PROCESSES_TO_MANAGE.includes(name)) {
+      return NextResponse.json(
+        createApiResponse(null, `Unknown process: ${name}`),
+        { status: 400 }
+      )
+    }
+
+    // Один процесс (rolling restart из админ-бота) или все сразу
+    const processesToManage = name ? [name] : PROCESSES_TO_MANAGE
     
     // Логируем список процессов для отладки
     if (process.env.NODE_ENV !== 'production') {
@@ -115,7 +136,8 @@ export async function POST(request: NextRequest) {
       try {
         console.log(`[PM2 API] Executing: ${command}`)
         const { stdout, stderr } = await execAsync(command, {
-          timeout: 20000, // 20 секунд на каждый процесс
+          // PM2 ждет завершения процесса до kill_timeout (30 секунд у ботов, пока они дорабатывают заявки)
+          timeout: 45000,
           maxBuffer: 1024 * 1024 * 2 // 2MB буфер
         })
         
@@ -182,3 +204,62 @@ export async function POST(request: NextRequest) {
   }
 }
 
+// Состояние процессов для rolling restart: статус, pid, число рестартов, uptime
+// и heartbeat из <cwd>/metrics/<script>.json (пишут telegram_bot/metrics.py)
+export async function GET(request: NextRequest) {
+  try {
+    const denied = checkAccess(request)
+    if (denied) {
+      return denied
+    }
+
+    const { stdout } = await execAsync('pm2 jlist', {
+      timeout: 20000,
+      maxBuffer: 1024 * 1024 * 10
+    })
+    // pm2 иногда печатает предупреждения перед JSON
+    const list: any[] = JSON.parse(stdout.slice(stdout.indexOf('[')))
+    const now = Date.now()
+
+    const processes = list
+      .filter((proc) => PROCESSES_TO_MANAGE.includes(proc.name))
+      .map((proc) => {
+        const env = proc.pm2_env || {}
+        let heartbeat: { pid: number; age_seconds: number } | null = null
+        if (env.pm_cwd && env.pm_exec_path) {
+          const metricsFile = path.join(
+            env.pm_cwd,
+            'metrics',
+            `${path.basename(env.pm_exec_path, path.extname(env.pm_exec_path))}.json`
+          )
+          try {
+            const metrics = JSON.parse(fs.readFileSync(metricsFile, 'utf-8'))
+            heartbeat = {
+              pid: metrics.pid,
+              age_seconds: Math.round(now / 1000 - metrics.ts),
+            }
+          } catch {
+            // Приложение не пишет метрики (payment, email-watcher, форки ботов)
+          }
+        }
+        return {
+          name: proc.name,
+          status: env.status,
+          pid: proc.pid,
+          restarts: env.restart_time ?? 0,
+          uptime_seconds: env.status === 'online' && env.pm_uptime
+            ? Math.round((now - env.pm_uptime) / 1000)
+            : 0,
+          heartbeat,
+        }
+      })
+
+    return NextResponse.json(createApiResponse({ processes }))
+  } catch (error: any) {
+    console.error('PM2 status API error:', error)
+    return NextResponse.json(
+      createApiResponse(null, error.message || 'Failed to get PM2 status'),
+      { status: 500 }
+    )
+  }
+}
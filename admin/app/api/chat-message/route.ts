@@ -66,6 +66,29 @@ export async function POST(request: NextRequest) {
       }
     }
 
+    // Любое входящее сообщение в операторский бот открывает чат. Делаем это здесь,
+    // чтобы бот не отправлял отдельный PATCH open-operator-chat на каждое сообщение
+    if (direction === 'in' && botType === 'operator') {
+      try {
+        await prisma.botUserData.upsert({
+          where: {
+            userId_dataType: {
+              userId: userIdBigInt,
+              dataType: 'operator_chat_status',
+            },
+          },
+          update: { dataValue: 'open' },
+          create: {
+            userId: userIdBigInt,
+            dataType: 'operator_chat_status',
+            dataValue: 'open',
+          },
+        })
+      } catch (error) {
+        console.error('❌ Error opening operator chat:', error)
+      }
+    }
+
     const message = await prisma.chatMessage.create({
       data: {
         userId: userIdBigInt,
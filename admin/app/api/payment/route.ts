@@ -3,6 +3,8 @@ import { prisma } from '@/lib/prisma'
 import { createApiResponse } from '@/lib/api-helpers'
 import { Prisma } from '@prisma/client'
 import { addLog } from '@/lib/logs'
+import { resolveReceipt } from '@/lib/receipt-dedup'
+import { emitBotEvent } from '@/lib/bot-events'
 
 // API для создания заявок из внешних источников (мини-приложение, бот и т.д.)
 export async function OPTIONS() {
@@ -53,6 +55,7 @@ export async function POST(request: NextRequest) {
       telegram_first_name,
       telegram_last_name,
       receipt_photo, // base64 строка фото чека
+      receipt_hash, // sha256 фото чека: если receipt_photo не передан, берем уже сохраненный чек с этим хешем
       withdrawal_code, // код подтверждения вывода
       uncreated_request_id,
       bot_type, // тип бота (main, mostbet, 1xbet) - передается напрямую из бота
@@ -303,6 +306,7 @@ export async function POST(request: NextRequest) {
               where: { userId: userIdBigInt },
               update: {
                 isActive: false,
+                blockChangedAt: new Date(),
               },
               create: {
                 userId: userIdBigInt,
@@ -311,9 +315,11 @@ export async function POST(request: NextRequest) {
                 lastName: currentUserData?.lastName || null,
                 language: 'ru',
                 isActive: false,
+                blockChangedAt: new Date(),
               },
             })
             console.log(`🔒 Auto-blocked user ${userIdBigInt.toString()} for using blocked accountId ${finalAccountId}`)
+            await emitBotEvent('user.blocked', { userId: userIdBigInt, blocked: true })
             addLog('warn', `🔒 Auto-blocked user ${userIdBigInt.toString()} for using blocked accountId ${finalAccountId}`, {
               userId: userIdBigInt.toString(),
               accountId: finalAccountId,
@@ -366,6 +372,22 @@ export async function POST(request: NextRequest) {
       }
     }
     
+    // Чек по хешу: повторно присланный чек не загружается заново, плюс сигнал о дубле
+    const receipt = await resolveReceipt(processedPhoto, receipt_hash, userIdBigInt)
+    if (receipt.missing) {
+      return NextResponse.json(
+        createApiResponse(null, 'Receipt not found'),
+        { status: 409, headers: { 'Access-Control-Allow-Origin': '*' } }
+      )
+    }
+    if (receipt.duplicateOf) {
+      addLog('warning', `⚠️ Чек уже использовался в заявке #${receipt.duplicateOf}`, {
+        userId: finalUserId,
+        duplicateOf: receipt.duplicateOf,
+        photoFileId: receipt.photoFileId,
+      })
+    }
+
     console.log('💾 Payment API - Saving to database:', {
       userId: userIdBigInt.toString(),
       username: telegram_username,
@@ -488,11 +510,12 @@ export async function POST(request: NextRequest) {
           
           const errorMessage = `У вас уже есть активная заявка на пополнение (ID: #${activeDepositRequest.id}, создана ${timeAgo} мин. назад). Пожалуйста, дождитесь обработки первой заявки перед созданием новой.`
           
+          // activeRequestId - бот по нему дописывает чек в свою заявку, если ответ на ее создание потерялся
           const errorResponse = NextResponse.json(
-            createApiResponse(
-              null,
-              errorMessage
-            ),
+            {
+              ...createApiResponse(null, errorMessage),
+              activeRequestId: activeDepositRequest.id,
+            },
             { 
               status: 400,
               headers: {
@@ -735,7 +758,8 @@ export async function POST(request: NextRequest) {
           bank: cleanString(bank),
           phone: finalPhone ? cleanString(finalPhone) : null,
           status: 'pending',
-          photoFileUrl: processedPhoto, // Сохраняем base64 фото чека (с префиксом data:image если нужно)
+          photoFileUrl: receipt.photoFileUrl, // Сохраняем base64 фото чека (с префиксом data:image если нужно)
+          photoFileId: receipt.photoFileId, // sha256 чека для дедупликации
           withdrawalCode: cleanString(withdrawal_code), // Сохраняем код подтверждения вывода
           botType: finalBotType || 'main', // Сохраняем botType для определения, из какого бота была создана заявка
         },
@@ -775,6 +799,7 @@ export async function POST(request: NextRequest) {
         bookmaker: newRequest.bookmaker,
         accountId: newRequest.accountId,
         has_photo: !!newRequest.photoFileUrl,
+        duplicate_receipt_of: receipt.duplicateOf,
         createdAt: newRequest.createdAt
       }
       
@@ -961,6 +986,7 @@ export async function PUT(request: NextRequest) {
       status, 
       status_detail,
       receipt_photo,
+      receipt_hash,
       telegram_user_id,
       amount,
       bookmaker,
@@ -1020,6 +1046,7 @@ export async function PUT(request: NextRequest) {
         },
         requestType: true,
         amount: true,
+        userId: true, // Владелец: чек по хешу берется только из его заявок
       },
     })
     
@@ -1069,7 +1096,9 @@ export async function PUT(request: NextRequest) {
     }
 
     // Обновляем фото чека, если передано (используем cleanBase64 для сохранения целостности base64)
-    if (receipt_photo !== undefined) {
+    // или передан только receipt_hash уже загруженного ранее чека
+    let duplicateReceiptOf: number | null = null
+    if (receipt_photo !== undefined || receipt_hash !== undefined) {
       const processedPhoto = cleanBase64(receipt_photo)
       
       // Детальное логирование фото для отладки (PUT запрос)
@@ -1095,7 +1124,26 @@ export async function PUT(request: NextRequest) {
         })
       }
       
-      updateData.photoFileUrl = processedPhoto
+      const receipt = await resolveReceipt(processedPhoto, receipt_hash, existingRequest.userId, parseInt(id))
+      if (receipt.missing) {
+        const response = NextResponse.json(
+          createApiResponse(null, 'Receipt not found'),
+          { status: 409 }
+        )
+        response.headers.set('Access-Control-Allow-Origin', '*')
+        return response
+      }
+      if (receipt.duplicateOf) {
+        duplicateReceiptOf = receipt.duplicateOf
+        addLog('warning', `⚠️ Чек заявки #${id} уже использовался в заявке #${receipt.duplicateOf}`, {
+          requestId: id,
+          duplicateOf: receipt.duplicateOf,
+          photoFileId: receipt.photoFileId,
+        })
+      }
+      
+      updateData.photoFileUrl = receipt.photoFileUrl
+      updateData.photoFileId = receipt.photoFileId
     }
 
     // Обновляем другие поля, если переданы
@@ -1198,7 +1246,8 @@ export async function PUT(request: NextRequest) {
     // 2. Заявка все еще pending
     // 3. Заявка еще не обработана автопополнением
     // 4. Нет уже обработанных платежей
-    const isFirstReceipt = receipt_photo !== undefined && !existingRequest.photoFileUrl
+    const receiptProvided = receipt_photo !== undefined || receipt_hash !== undefined
+    const isFirstReceipt = receiptProvided && !existingRequest.photoFileUrl
     const isPendingDeposit = updatedRequest.requestType === 'deposit' && updatedRequest.status === 'pending' && updatedRequest.amount
     const isNotProcessed = existingRequest.processedBy !== 'автопополнение'
     const hasNoProcessedPayments = !existingRequest.incomingPayments?.length
@@ -1264,14 +1313,18 @@ export async function PUT(request: NextRequest) {
         // При ошибке все равно запускаем повторную проверку
         checkPayment(2, 3000).catch(() => {})
       })
-    } else if (receipt_photo !== undefined && existingRequest.photoFileUrl) {
+    } else if (receiptProvided && existingRequest.photoFileUrl) {
       console.log(`⚠️ Payment API PUT - Receipt already exists for request ${updatedRequest.id}, skipping autodeposit`)
     }
 
+    // Само фото чека обратно не отправляем (клиент его только что прислал)
+    const { photoFileUrl: savedPhoto, ...updatedRequestData } = updatedRequest
     const response = NextResponse.json(
       createApiResponse({
-        ...updatedRequest,
+        ...updatedRequestData,
         amount: updatedRequest.amount ? updatedRequest.amount.toString() : null,
+        has_photo: !!savedPhoto,
+        duplicate_receipt_of: duplicateReceiptOf,
       })
     )
     response.headers.set('Access-Control-Allow-Origin', '*')
@@ -0,0 +1,98 @@
+import { NextRequest } from 'next/server'
+import { prisma } from '@/lib/prisma'
+
+export const dynamic = 'force-dynamic'
+
+// Как часто проверять новые события и слать keepalive
+const POLL_INTERVAL_MS = 1000
+const KEEPALIVE_MS = 15000
+// Событий за одну выборку
+const BATCH_SIZE = 100
+
+// Поток событий для ботов (text/event-stream).
+// Продолжение после переподключения - с заголовком Last-Event-ID (или ?lastEventId=).
+// Без него поток начинается с текущего конца: прошлое бот берет из /public/replica.
+// Если нужных событий уже нет (почищены), приходит event: reset - бот перезагружает снимок
+export async function GET(request: NextRequest) {
+  const { searchParams } = new URL(request.url)
+  const requested = request.headers.get('last-event-id') || searchParams.get('lastEventId')
+
+  const latest = await prisma.botEvent.findFirst({ orderBy: { id: 'desc' }, select: { id: true } })
+  let lastId = latest?.id || 0
+  let reset = false
+
+  const resumeFrom = Number(requested)
+  if (requested && resumeFrom === lastId) {
+    // Бот ничего не пропустил
+  } else if (requested && Number.isInteger(resumeFrom) && resumeFrom >= 0 && resumeFrom < lastId) {
+    const oldest = await prisma.botEvent.findFirst({ orderBy: { id: 'asc' }, select: { id: true } })
+    // События после resumeFrom еще хранятся, если старейшее сохраненное не дальше следующего
+    reset = !oldest || oldest.id > resumeFrom + 1
+    if (!reset) lastId = resumeFrom
+  } else if (requested) {
+    reset = true
+  }
+
+  const encoder = new TextEncoder()
+  const stream = new ReadableStream({
+    async start(controller) {
+      let closed = false
+      const close = () => {
+        if (closed) return
+        closed = true
+        try {
+          controller.close()
+        } catch {
+          // поток уже закрыт клиентом
+        }
+      }
+      request.signal.addEventListener('abort', close)
+
+      const send = (text: string) => {
+        if (!closed) controller.enqueue(encoder.encode(text))
+      }
+
+      send(`retry: 3000\n\n`)
+      if (reset) {
+        send(`id: ${lastId}\nevent: reset\ndata: {}\n\n`)
+      }
+      send(`id: ${lastId}\nevent: hello\ndata: {}\n\n`)
+
+      let lastSentAt = Date.now()
+      while (!closed) {
+        try {
+          const events = await prisma.botEvent.findMany({
+            where: { id: { gt: lastId } },
+            orderBy: { id: 'asc' },
+            take: BATCH_SIZE,
+          })
+          for (const event of events) {
+            send(`id: ${event.id}\nevent: ${event.type}\ndata: ${JSON.stringify(event.payload)}\n\n`)
+            lastId = event.id
+          }
+          if (events.length > 0) {
+            lastSentAt = Date.now()
+            if (events.length === BATCH_SIZE) continue
+          } else if (Date.now() - lastSentAt >= KEEPALIVE_MS) {
+            send(`: keepalive\n\n`)
+            lastSentAt = Date.now()
+          }
+        } catch (error) {
+          console.error('Error reading bot events:', error)
+          close()
+          break
+        }
+        await new Promise((resolve) => setTimeout(resolve, POLL_INTERVAL_MS))
+      }
+    },
+  })
+
+  return new Response(stream, {
+    headers: {
+      'Content-Type': 'text/event-stream; charset=utf-8',
+      'Cache-Control': 'no-cache, no-transform',
+      Connection: 'keep-alive',
+      'X-Accel-Buffering': 'no',
+    },
+  })
+}
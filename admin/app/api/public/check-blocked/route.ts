@@ -1,6 +1,7 @@
 import { NextRequest, NextResponse } from 'next/server'
 import { prisma } from '@/lib/prisma'
 import { createApiResponse } from '@/lib/api-helpers'
+import { emitBotEvent } from '@/lib/bot-events'
 
 export async function POST(request: NextRequest) {
   try {
@@ -70,6 +71,7 @@ export async function POST(request: NextRequest) {
               where: { userId: userIdBigInt },
               update: {
                 isActive: false,
+                blockChangedAt: new Date(),
               },
               create: {
                 userId: userIdBigInt,
@@ -78,9 +80,11 @@ export async function POST(request: NextRequest) {
                 lastName: null,
                 language: 'ru',
                 isActive: false,
+                blockChangedAt: new Date(),
               },
             })
             console.log(`🔒 Auto-blocked user ${userId.toString()} for using blocked accountId ${accountId}`)
+            await emitBotEvent('user.blocked', { userId: userIdBigInt, blocked: true })
           } catch (error) {
             console.error('Error auto-blocking user:', error)
           }
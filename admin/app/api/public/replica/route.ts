@@ -0,0 +1,104 @@
+import { NextRequest, NextResponse } from 'next/server'
+import { prisma } from '@/lib/prisma'
+import { createApiResponse } from '@/lib/api-helpers'
+import { buildPaymentSettings } from '@/lib/payment-settings'
+
+export const dynamic = 'force-dynamic'
+
+// Больше изменений за один запрос - бот перезагружает снимок целиком
+const MAX_CHANGES = 1000
+
+// accountId, которыми пользовались пользователи (по их заявкам)
+async function accountIdsOf(userIds: bigint[]): Promise<string[]> {
+  if (userIds.length === 0) return []
+  const requests = await prisma.request.findMany({
+    where: { userId: { in: userIds }, accountId: { not: null } },
+    select: { accountId: true },
+    distinct: ['accountId'],
+  })
+  return requests.map((item) => item.accountId as string)
+}
+
+// accountId заблокирован, если им пользовался хоть один заблокированный пользователь
+// (так же считает /public/check-blocked)
+async function blockedAmong(accountIds: string[]): Promise<Set<string>> {
+  if (accountIds.length === 0) return new Set()
+  const requests = await prisma.request.findMany({
+    where: { accountId: { in: accountIds } },
+    select: { accountId: true, userId: true },
+    distinct: ['accountId', 'userId'],
+  })
+  const blockedUsers = await prisma.botUser.findMany({
+    where: { userId: { in: Array.from(new Set(requests.map((item) => item.userId))) }, isActive: false },
+    select: { userId: true },
+  })
+  const blockedIds = new Set(blockedUsers.map((user) => user.userId.toString()))
+  return new Set(
+    requests
+      .filter((item) => blockedIds.has(item.userId.toString()))
+      .map((item) => item.accountId as string)
+  )
+}
+
+// Реплика данных для ботов: настройки платежей и заблокированные пользователи/accountId.
+// Без since - полный снимок, с since (cursor прошлого ответа) - только изменения.
+// settings приходят, только если их версия отличается от settingsVersion бота
+export async function GET(request: NextRequest) {
+  try {
+    const { searchParams } = new URL(request.url)
+    const since = Number(searchParams.get('since') || 0)
+    const knownSettingsVersion = searchParams.get('settingsVersion')
+
+    // Время берем до запросов, чтобы следующая синхронизация не пропустила изменения во время чтения
+    const cursor = Date.now()
+    const { settings, version } = await buildPaymentSettings()
+    const settingsPart = version === knownSettingsVersion ? {} : { settings, settingsVersion: version }
+
+    if (!Number.isFinite(since) || since <= 0) {
+      const blockedUsers = await prisma.botUser.findMany({
+        where: { isActive: false },
+        select: { userId: true },
+      })
+      const userIds = blockedUsers.map((user) => user.userId)
+      return NextResponse.json(
+        createApiResponse({
+          full: true,
+          cursor,
+          ...settingsPart,
+          blockedUsers: userIds.map((id) => id.toString()),
+          blockedAccounts: await accountIdsOf(userIds),
+        })
+      )
+    }
+
+    const changed = await prisma.botUser.findMany({
+      where: { blockChangedAt: { gt: new Date(since) } },
+      select: { userId: true, isActive: true },
+      take: MAX_CHANGES,
+    })
+    if (changed.length >= MAX_CHANGES) {
+      return NextResponse.json(createApiResponse({ full: false, truncated: true, cursor }))
+    }
+
+    // accountId изменившихся пользователей пересчитываем целиком: разблокировка одного
+    // пользователя не разблокирует accountId, которым пользовался другой заблокированный
+    const touchedAccounts = await accountIdsOf(changed.map((user) => user.userId))
+    const blockedAccounts = await blockedAmong(touchedAccounts)
+
+    return NextResponse.json(
+      createApiResponse({
+        full: false,
+        cursor,
+        ...settingsPart,
+        users: changed.map((user) => ({ userId: user.userId.toString(), blocked: !user.isActive })),
+        accounts: touchedAccounts.map((accountId) => ({ accountId, blocked: blockedAccounts.has(accountId) })),
+      })
+    )
+  } catch (error: any) {
+    console.error('Error building replica:', error)
+    return NextResponse.json(
+      createApiResponse(null, error.message || 'Failed to build replica'),
+      { status: 500 }
+    )
+  }
+}
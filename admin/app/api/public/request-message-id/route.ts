@@ -0,0 +1,48 @@
+import { NextRequest, NextResponse } from 'next/server'
+import { prisma } from '@/lib/prisma'
+import { createApiResponse, isBotRequest } from '@/lib/api-helpers'
+
+export const dynamic = 'force-dynamic'
+
+// ID сообщения бота о созданной заявке (для ботов: одиночный запрос и /public/request-writes).
+// Только с X-Bot-Token: без него любой мог бы переписать сообщение чужой заявки
+export async function PATCH(request: NextRequest) {
+  try {
+    if (!isBotRequest(request)) {
+      return NextResponse.json(createApiResponse(null, 'Unauthorized'), { status: 401 })
+    }
+
+    const body = await request.json()
+    const id = parseInt(body?.request_id)
+    if (isNaN(id)) {
+      return NextResponse.json(
+        createApiResponse(null, 'Invalid request ID'),
+        { status: 400 }
+      )
+    }
+
+    const { message_id } = body
+    if (!message_id) {
+      return NextResponse.json(
+        createApiResponse(null, 'message_id is required'),
+        { status: 400 }
+      )
+    }
+
+    await prisma.request.update({
+      where: { id },
+      data: {
+        requestCreatedMessageId: BigInt(message_id),
+      },
+    })
+
+    return NextResponse.json(
+      createApiResponse({ success: true })
+    )
+  } catch (error: any) {
+    return NextResponse.json(
+      createApiResponse(null, error.message || 'Failed to update message ID'),
+      { status: 500 }
+    )
+  }
+}
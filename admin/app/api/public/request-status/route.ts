@@ -0,0 +1,53 @@
+import { NextRequest, NextResponse } from 'next/server'
+import { prisma } from '@/lib/prisma'
+import { createApiResponse } from '@/lib/api-helpers'
+
+export const dynamic = 'force-dynamic'
+
+const MAX_IDS = 200
+// Отдаем статусы только недавних заявок: окно оплаты на странице - 5 минут,
+// остальное - запас на часы клиента и последний опрос после окончания окна
+const STATUS_WINDOW_MS = 10 * 60 * 1000
+
+// Статусы нескольких заявок одним запросом.
+// payment_site опрашивает этот endpoint одним потоком за все открытые страницы оплаты
+// и рассылает изменения страницам через SSE (/api/events).
+// Endpoint открытый, поэтому заявки старше STATUS_WINDOW_MS в ответ не попадают
+export async function GET(request: NextRequest) {
+  try {
+    const { searchParams } = new URL(request.url)
+    const ids = (searchParams.get('ids') || '')
+      .split(',')
+      .map((id) => parseInt(id, 10))
+      .filter((id) => Number.isInteger(id) && id > 0)
+      .slice(0, MAX_IDS)
+
+    if (ids.length === 0) {
+      return NextResponse.json(
+        createApiResponse(null, 'ids is required'),
+        { status: 400 }
+      )
+    }
+
+    const requests = await prisma.request.findMany({
+      where: {
+        id: { in: ids },
+        createdAt: { gte: new Date(Date.now() - STATUS_WINDOW_MS) },
+      },
+      select: { id: true, status: true },
+    })
+
+    const statuses: Record<string, string> = {}
+    for (const item of requests) {
+      statuses[item.id.toString()] = item.status
+    }
+
+    return NextResponse.json(createApiResponse({ statuses }))
+  } catch (error: any) {
+    console.error('Error fetching request statuses:', error)
+    return NextResponse.json(
+      createApiResponse(null, error.message || 'Failed to fetch request statuses'),
+      { status: 500 }
+    )
+  }
+}
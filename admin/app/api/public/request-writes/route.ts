@@ -0,0 +1,88 @@
+import { NextRequest, NextResponse } from 'next/server'
+import { createApiResponse, isBotRequest } from '@/lib/api-helpers'
+import { PUT as updatePayment } from '@/app/api/payment/route'
+import { PATCH as updateMessageId } from '@/app/api/public/request-message-id/route'
+
+export const dynamic = 'force-dynamic'
+
+// Больше записей в одном запросе не принимаем
+const MAX_WRITES = 200
+
+type RequestWrite =
+  | { op: 'message_id'; requestId: number | string; messageId: number | string }
+  | { op: 'status'; requestId: number | string; status: string; statusDetail?: string | null }
+
+// Одна запись выполняется тем же обработчиком, что и одиночный запрос, чтобы правила не расходились
+async function applyWrite(request: NextRequest, write: RequestWrite) {
+  let response: Response
+  if (write.op === 'message_id') {
+    const inner = new NextRequest(new URL('/api/public/request-message-id', request.url), {
+      method: 'PATCH',
+      body: JSON.stringify({ request_id: write.requestId, message_id: write.messageId }),
+      headers: { 'Content-Type': 'application/json', 'X-Bot-Token': request.headers.get('x-bot-token') || '' },
+    })
+    response = await updateMessageId(inner)
+  } else if (write.op === 'status') {
+    const inner = new NextRequest(new URL('/api/payment', request.url), {
+      method: 'PUT',
+      body: JSON.stringify({ id: write.requestId, status: write.status, status_detail: write.statusDetail }),
+      headers: { 'Content-Type': 'application/json' },
+    })
+    response = await updatePayment(inner)
+  } else {
+    return createApiResponse(null, `Unknown op: ${(write as any).op}`)
+  }
+  try {
+    return await response.json()
+  } catch {
+    return createApiResponse(null, `Bad response: ${response.status}`)
+  }
+}
+
+// Пачка мелких записей по заявкам от ботов (ID сообщения о заявке, статус по таймеру).
+// Записи одной заявки выполняются по порядку, разных заявок - параллельно.
+// results[i] - ответ на writes[i] в том же формате, что и у одиночного запроса.
+// Только для ботов (X-Bot-Token, см. isBotRequest)
+export async function POST(request: NextRequest) {
+  try {
+    if (!isBotRequest(request)) {
+      return NextResponse.json(createApiResponse(null, 'Unauthorized'), { status: 401 })
+    }
+
+    const body = await request.json()
+    const writes: RequestWrite[] = Array.isArray(body?.writes) ? body.writes : []
+    if (writes.length === 0 || writes.length > MAX_WRITES) {
+      return NextResponse.json(
+        createApiResponse(null, `writes must contain 1..${MAX_WRITES} items`),
+        { status: 400 }
+      )
+    }
+
+    const byRequest = new Map<string, number[]>()
+    writes.forEach((write, index) => {
+      const key = String(write?.requestId)
+      byRequest.set(key, [...(byRequest.get(key) || []), index])
+    })
+
+    const results: any[] = new Array(writes.length)
+    await Promise.all(
+      Array.from(byRequest.values()).map(async (indexes) => {
+        for (const index of indexes) {
+          try {
+            results[index] = await applyWrite(request, writes[index])
+          } catch (error: any) {
+            results[index] = createApiResponse(null, error.message || 'Write failed')
+          }
+        }
+      })
+    )
+
+    return NextResponse.json(createApiResponse({ results }))
+  } catch (error: any) {
+    console.error('Error applying request writes:', error)
+    return NextResponse.json(
+      createApiResponse(null, error.message || 'Failed to apply request writes'),
+      { status: 500 }
+    )
+  }
+}
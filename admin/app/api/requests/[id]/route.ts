@@ -4,6 +4,7 @@ import { Prisma } from '@prisma/client'
 import { requireAuth, createApiResponse } from '@/lib/api-helpers'
 import { sendNotificationToUser, formatDepositMessage, formatWithdrawMessage, formatRejectMessage, getAdminUsername, sendMainMenuToUser } from '@/lib/send-notification'
 import { formatDateTimeBishkek } from '@/lib/date-utils'
+import { emitBotEvent } from '@/lib/bot-events'
 
 // Отключаем кеширование для актуальных данных
 export const dynamic = 'force-dynamic'
@@ -285,6 +286,14 @@ export async function PATCH(
 
     // Отправляем уведомления при изменении статуса (асинхронно, не блокируем ответ)
     if (body.status && body.status !== currentRequest.status) {
+      await emitBotEvent('request.status', {
+        requestId: id,
+        userId: currentRequest.userId,
+        requestType: currentRequest.requestType,
+        botType: currentRequest.botType,
+        status: body.status,
+      })
+
       // Запускаем отправку уведомлений в фоне, не ждем завершения
       ;(async () => {
         try {
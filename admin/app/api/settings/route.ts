@@ -1,6 +1,7 @@
 import { NextRequest, NextResponse } from 'next/server'
 import { prisma } from '@/lib/prisma'
 import { requireAuth, createApiResponse } from '@/lib/api-helpers'
+import { emitBotEvent } from '@/lib/bot-events'
 
 export async function GET(request: NextRequest) {
   try {
@@ -134,6 +135,8 @@ export async function POST(request: NextRequest) {
       await updateSetting('require_channel_subscription', body.require_channel_subscription.toString(), 'Требовать подписку на канал')
     }
 
+    await emitBotEvent('settings.changed')
+
     return NextResponse.json(
       createApiResponse(null, undefined)
     )
@@ -2,6 +2,7 @@ import { NextRequest, NextResponse } from 'next/server'
 import { prisma } from '@/lib/prisma'
 import { requireAuth, createApiResponse } from '@/lib/api-helpers'
 import { syncUserFromRequest } from '@/lib/sync-user'
+import { emitBotEvent } from '@/lib/bot-events'
 
 // Отключаем кеширование для актуальных данных
 export const dynamic = 'force-dynamic'
@@ -208,6 +209,8 @@ export async function PATCH(
       where: { userId },
       update: {
         isActive,
+        // Боты по этой отметке получают изменения блокировок (GET /public/replica)
+        blockChangedAt: new Date(),
       },
       create: {
         userId,
@@ -216,8 +219,10 @@ export async function PATCH(
         lastName: lastRequest?.lastName || null,
         language: 'ru',
         isActive,
+        blockChangedAt: new Date(),
       },
     })
+    await emitBotEvent('user.blocked', { userId, blocked: !isActive })
 
     // Если пользователь заблокирован, логируем все его accountId для отслеживания
     if (!isActive) {
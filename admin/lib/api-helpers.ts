@@ -66,3 +66,10 @@ export function requireAuth(request: NextRequest): TokenPayload {
   return user
 }
 
+// Записи ботов через /api/public (middleware их не проверяет): заголовок X-Bot-Token
+// должен совпасть с BOT_SERVICE_TOKEN. Пока токен не задан, такие записи закрыты
+export function isBotRequest(request: NextRequest): boolean {
+  const expected = process.env.BOT_SERVICE_TOKEN
+  const token = request.headers.get('x-bot-token')
+  return !!expected && token === expected
+}
@@ -1,4 +1,5 @@
 import { prisma } from './prisma'
+import { emitBotEvent } from './bot-events'
 
 // Дебаунсинг для предотвращения параллельных проверок одной заявки
 const checkingRequests = new Map<number, Promise<any>>()
@@ -757,6 +758,14 @@ export async function matchAndProcessPayment(paymentId: number, amount: number)
     
     // Если успешно - отправляем уведомление и возвращаем результат
     if (depositResult.success && depositResult.updatedRequest) {
+      await emitBotEvent('request.status', {
+        requestId: request.id,
+        userId: depositResult.updatedRequest.userId,
+        requestType: 'deposit',
+        botType: depositResult.updatedRequest.botType,
+        status: 'autodeposit_success',
+      })
+
       // Отправляем уведомление пользователю
       try {
         const fullRequest = await prisma.request.findUnique({
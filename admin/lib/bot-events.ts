@@ -0,0 +1,34 @@
+import { prisma } from './prisma'
+
+// События для ботов (читаются через SSE /api/public/bot-events):
+// settings.changed - изменились настройки платежей
+// user.blocked - { userId, blocked }
+// request.status - { requestId, userId, requestType, botType, status }
+export type BotEventType = 'settings.changed' | 'user.blocked' | 'request.status'
+
+// Сколько хранить события: бот, отключившийся дольше, получает reset и берет снимок реплики
+const RETENTION_MS = 24 * 60 * 60 * 1000
+// Старые события чистим не на каждой записи, а примерно раз в PRUNE_EVERY событий
+const PRUNE_EVERY = 500
+
+function serialize(value: any): any {
+  return JSON.parse(JSON.stringify(value, (_, item) => (typeof item === 'bigint' ? item.toString() : item)))
+}
+
+// Записать событие для ботов. Никогда не бросает исключение: событие - только ускорение,
+// боты все равно синхронизируются по /public/replica
+export async function emitBotEvent(type: BotEventType, payload: Record<string, any> = {}) {
+  try {
+    const event = await prisma.botEvent.create({
+      data: { type, payload: serialize(payload) },
+      select: { id: true },
+    })
+    if (event.id % PRUNE_EVERY === 0) {
+      await prisma.botEvent.deleteMany({
+        where: { createdAt: { lt: new Date(Date.now() - RETENTION_MS) } },
+      })
+    }
+  } catch (error) {
+    console.error(`Error emitting bot event ${type}:`, error)
+  }
+}
@@ -0,0 +1,68 @@
+import { prisma } from '@/lib/prisma'
+
+export const DEFAULT_PAYMENT_SETTINGS = {
+  deposits: { enabled: true, banks: ['mbank', 'bakai', 'balance', 'demir', 'omoney', 'megapay'] },
+  withdrawals: { enabled: true, banks: ['kompanion', 'odengi', 'bakai', 'balance', 'megapay', 'mbank'] },
+  casinos: {
+    '1xbet': true,
+    '1win': true,
+    melbet: true,
+    mostbet: true,
+    winwin: true,
+    '888starz': true,
+    '1xcasino': true,
+    betwinner: true,
+    wowbet: true
+  } as Record<string, boolean>,
+  pause: false,
+  maintenance_message: 'Технические работы. Попробуйте позже.',
+  require_receipt_photo: false,
+  channel: '@bingokg_news',
+  channel_id: '-1002450771165',
+  require_channel_subscription: true,
+}
+
+// Настройки платежей из BotConfiguration в формате /public/payment-settings.
+// version меняется при любом изменении, удалении или добавлении ключа (для реплики в ботах)
+export async function buildPaymentSettings() {
+  const configs = await prisma.botConfiguration.findMany()
+  const settingsMap: Record<string, any> = {}
+  let lastUpdated = 0
+
+  configs.forEach((config) => {
+    let value: any = config.value
+    // Пытаемся распарсить JSON, если это строка
+    if (typeof value === 'string') {
+      try {
+        value = JSON.parse(value)
+      } catch {
+        // Если не JSON, оставляем как строку
+      }
+    }
+    settingsMap[config.key] = value
+    lastUpdated = Math.max(lastUpdated, config.updatedAt.getTime())
+  })
+
+  // Получаем настройки депозитов
+  const depositSettings = settingsMap.deposit_settings || settingsMap.deposits || DEFAULT_PAYMENT_SETTINGS.deposits
+
+  // Получаем настройки выводов
+  const withdrawalSettings = settingsMap.withdrawal_settings || settingsMap.withdrawals || DEFAULT_PAYMENT_SETTINGS.withdrawals
+
+  // Получаем настройки казино
+  const casinoSettings = settingsMap.casinos || DEFAULT_PAYMENT_SETTINGS.casinos
+
+  const settings = {
+    deposits: typeof depositSettings === 'object' ? depositSettings : { enabled: depositSettings !== false, banks: [] },
+    withdrawals: typeof withdrawalSettings === 'object' ? withdrawalSettings : { enabled: withdrawalSettings !== false, banks: [] },
+    casinos: casinoSettings,
+    pause: settingsMap.pause === 'true' || settingsMap.pause === true,
+    maintenance_message: settingsMap.maintenance_message || DEFAULT_PAYMENT_SETTINGS.maintenance_message,
+    require_receipt_photo: settingsMap.require_receipt_photo === 'true' || settingsMap.require_receipt_photo === true,
+    channel: (typeof settingsMap.channel === 'string' ? settingsMap.channel : settingsMap.channel?.toString()) || DEFAULT_PAYMENT_SETTINGS.channel,
+    channel_id: (typeof settingsMap.channel_id === 'string' ? settingsMap.channel_id : settingsMap.channel_id?.toString()) || DEFAULT_PAYMENT_SETTINGS.channel_id,
+    require_channel_subscription: settingsMap.require_channel_subscription === 'true' || settingsMap.require_channel_subscription === true,
+  }
+
+  return { settings, version: `${configs.length}:${lastUpdated}` }
+}
@@ -0,0 +1,72 @@
+/**
+ * Дедупликация фото чеков по хешу содержимого
+ * Хеш хранится в requests.photo_file_id в виде "sha256:<hex>" (рядом с photoFileUrl),
+ * поэтому повторно присланный тот же чек можно передать ссылкой (только на чек из
+ * заявок того же пользователя), а админка получает дешевый сигнал "этот чек уже был
+ * у другой заявки"
+ */
+import { createHash } from 'crypto'
+import { prisma } from './prisma'
+
+const HASH_PREFIX = 'sha256:'
+
+export function isReceiptHash(value: any): value is string {
+  return typeof value === 'string' && /^[a-f0-9]{64}$/.test(value)
+}
+
+// Хеш байт изображения из data URI / чистого base64 (тот же, что считает бот)
+export function hashReceiptPhoto(photo: string): string {
+  const base64 = photo.startsWith('data:') ? photo.slice(photo.indexOf(',') + 1) : photo
+  return createHash('sha256').update(Buffer.from(base64, 'base64')).digest('hex')
+}
+
+export interface ResolvedReceipt {
+  photoFileUrl: string | null
+  photoFileId: string | null
+  duplicateOf: number | null
+  missing: boolean // передан только хеш, а такого чека в БД нет - бот должен прислать фото целиком
+}
+
+/**
+ * Определить, что сохранить в photoFileUrl/photoFileId
+ * @param processedPhoto фото после cleanBase64 (или null, если передан только хеш)
+ * @param receiptHash sha256 от бота (необязательно)
+ * @param userId владелец заявки: по одному хешу берется только его собственный чек
+ * @param excludeRequestId текущая заявка (при PUT не считаем ее дублем самой себя)
+ */
+export async function resolveReceipt(
+  processedPhoto: string | null,
+  receiptHash: any,
+  userId: bigint,
+  excludeRequestId?: number
+): Promise<ResolvedReceipt> {
+  const hash = processedPhoto ? hashReceiptPhoto(processedPhoto) : (isReceiptHash(receiptHash) ? receiptHash : null)
+  if (!hash) {
+    return { photoFileUrl: processedPhoto, photoFileId: null, duplicateOf: null, missing: false }
+  }
+
+  const photoFileId = `${HASH_PREFIX}${hash}`
+  // По индексу photo_file_id, без чтения самих фото
+  const matches = await prisma.request.findMany({
+    where: { photoFileId, photoFileUrl: { not: null } },
+    select: { id: true },
+    orderBy: { id: 'asc' },
+    take: 2,
+  })
+  const duplicate = matches.find((m) => m.id !== excludeRequestId)
+  const duplicateOf = duplicate ? duplicate.id : null
+
+  if (processedPhoto) {
+    return { photoFileUrl: processedPhoto, photoFileId, duplicateOf, missing: false }
+  }
+  // /api/payment открытый: знание хеша не дает права на чужое фото, только на свое
+  const source = await prisma.request.findFirst({
+    where: { photoFileId, userId, photoFileUrl: { not: null } },
+    select: { photoFileUrl: true },
+    orderBy: { id: 'asc' },
+  })
+  if (!source?.photoFileUrl) {
+    return { photoFileUrl: null, photoFileId: null, duplicateOf: null, missing: true }
+  }
+  return { photoFileUrl: source.photoFileUrl, photoFileId, duplicateOf, missing: false }
+}
@@ -0,0 +1,2 @@
+-- CreateIndex
+CREATE INDEX IF NOT EXISTS "requests_photo_file_id_idx" ON "requests"("photo_file_id");
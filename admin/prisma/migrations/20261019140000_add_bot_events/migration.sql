@@ -0,0 +1,12 @@
+-- CreateTable
+CREATE TABLE IF NOT EXISTS "bot_events" (
+    "id" SERIAL NOT NULL,
+    "type" VARCHAR(50) NOT NULL,
+    "payload" JSONB NOT NULL,
+    "created_at" TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP,
+
+    CONSTRAINT "bot_events_pkey" PRIMARY KEY ("id")
+);
+
+-- CreateIndex
+CREATE INDEX IF NOT EXISTS "bot_events_created_at_idx" ON "bot_events"("created_at");
@@ -45,8 +45,8 @@ ssl_context = ssl.create_default_context()
 ssl_context.check_hostname = False
 ssl_context.verify_mode = ssl.CERT_NONE
 
-async def manage_pm2(action: str) -> dict:
-    """Управление PM2 процессами через API"""
+async def pm2_api(method: str, payload: dict = None, timeout: int = 60) -> dict:
+    """Запрос к /admin/pm2 (POST - команда, GET - состояние процессов)"""
     connector = aiohttp.TCPConnector(ssl=ssl_context)
     
     # Получаем API ключ из переменных окружения
@@ -54,7 +54,7 @@ async def manage_pm2(action: str) -> dict:
     
     # Логирование для отладки
     if admin_api_key:
-        logger.info(f"[PM2] API key found: {admin_api_key[:10]}... (length: {len(admin_api_key)})")
+        logger.debug(f"[PM2] API key found: {admin_api_key[:10]}... (length: {len(admin_api_key)})")
     else:
         logger.warning("[PM2] ADMIN_API_KEY not found in environment variables!")
     
@@ -65,17 +65,18 @@ async def manage_pm2(action: str) -> dict:
         headers = {'Content-Type': 'application/json'}
         if admin_api_key:
             headers['X-API-Key'] = admin_api_key
-            logger.info(f"[PM2] Sending request to {url} with API key")
+            logger.debug(f"[PM2] Sending {method} {url} with API key")
         else:
             logger.error("[PM2] Cannot send request: ADMIN_API_KEY is missing!")
         
         try:
             # Увеличиваем таймаут до 60 секунд, так как остановка/перезапуск процессов может занять время
-            async with session.post(
+            async with session.request(
+                method,
                 url,
-                json={'action': action},
+                json=payload,
                 headers=headers,
-                timeout=aiohttp.ClientTimeout(total=60, connect=10),
+                timeout=aiohttp.ClientTimeout(total=timeout, connect=10),
                 ssl=ssl_context
             ) as response:
                 # Проверяем статус ответа
@@ -99,7 +100,7 @@ async def manage_pm2(action: str) -> dict:
                     }
                 try:
                     result = await response.json()
-                    logger.info(f"[PM2] API response received: success={result.get('success')}")
+                    logger.debug(f"[PM2] API response received: success={result.get('success')}")
                     return result
                 except Exception as e:
                     logger.error(f"[PM2] Failed to parse JSON: {e}")
@@ -109,10 +110,10 @@ async def manage_pm2(action: str) -> dict:
                         'error': str(e)
                     }
         except asyncio.TimeoutError:
-            logger.error(f"[PM2] Timeout while trying to {action} PM2 processes")
+            logger.error(f"[PM2] Timeout on {method} {url} ({payload})")
             return {
                 'success': False,
-                'message': f'Timeout while trying to {action} PM2 processes (60s timeout exceeded)',
+                'message': f'Timeout on PM2 request ({timeout}s timeout exceeded)',
                 'error': 'Request timeout'
             }
         except aiohttp.ClientConnectorError as e:
@@ -144,6 +145,21 @@ async def manage_pm2(action: str) -> dict:
                 'error': str(e)
             }
 
+async def manage_pm2(action: str, name: str = None) -> dict:
+    """Управление PM2 процессами через API (name - только один процесс)"""
+    payload = {'action': action}
+    if name:
+        payload['name'] = name
+    return await pm2_api('POST', payload, timeout=60)
+
+async def get_pm2_status() -> dict:
+    """Состояние процессов: {name: {status, pid, restarts, uptime_seconds, heartbeat}}"""
+    result = await pm2_api('GET', timeout=30)
+    if not result.get('success'):
+        return {}
+    processes = (result.get('data') or {}).get('processes') or []
+    return {proc['name']: proc for proc in processes}
+
 def is_admin(user_id: int) -> bool:
     """Проверка, является ли пользователь админом"""
     if not ADMIN_IDS:
@@ -178,7 +194,7 @@ async def cmd_start(message: Message):
         )]
     ])
     await message.answer(
-        '▶️ Управление сервером\n\nНажмите кнопку для включения/перезапуска всех ботов (pm2 restart all)',
+        '▶️ Управление сервером\n\nНажмите кнопку для включения/перезапуска ботов. Процессы перезапускаются по одному, каждый следующий - после того как предыдущий поднялся',
         reply_markup=keyboard_start
     )
 
@@ -228,9 +244,106 @@ async def pm2_stop_callback(callback: CallbackQuery):
         except:
             pass
 
+# Rolling restart: процессы перезапускаются по одному. PM2 посылает процессу SIGINT и ждет
+# kill_timeout (ecosystem.config.js), бот за это время дорабатывает начатое. Следующий
+# процесс трогаем только когда новый экземпляр предыдущего поднялся и стабилен.
+ROLLING_ORDER = [
+    'bingo-email-watcher',
+    'bingo-payment',
+    'bingo-bot-1xbet',
+    'bingo-bot-mostbet',
+    'bingo-operator-bot',
+    'bingo-bot',
+]
+READY_TIMEOUT = int(os.getenv('ROLLING_READY_TIMEOUT', '120'))  # сек на подъем одного процесса
+STABLE_SECONDS = int(os.getenv('ROLLING_STABLE_SECONDS', '10'))  # столько процесс должен проработать без рестартов
+HEARTBEAT_MAX_AGE = 30  # сек, свежесть файла метрик бота (telegram_bot/metrics.py)
+POLL_INTERVAL = 2
+
+rolling_lock = asyncio.Lock()
+rolling_task = None
+
+def is_ready(before: dict, current: dict) -> bool:
+    """Новый экземпляр процесса поднялся и работает"""
+    if not current or current.get('status') != 'online':
+        return False
+    if before and current.get('pid') == before.get('pid') and current.get('restarts') == before.get('restarts'):
+        return False  # PM2 еще не перезапустил процесс
+    if current.get('uptime_seconds', 0) < STABLE_SECONDS:
+        return False
+    # Боты с файлом метрик считаются готовыми, когда новый процесс начал писать heartbeat
+    if before and before.get('heartbeat'):
+        heartbeat = current.get('heartbeat') or {}
+        if heartbeat.get('pid') != current.get('pid') or heartbeat.get('age_seconds', HEARTBEAT_MAX_AGE + 1) > HEARTBEAT_MAX_AGE:
+            return False
+    return True
+
+def format_progress(states: dict, footer: str = '') -> str:
+    lines = ['🔄 Поочередный перезапуск ботов', '']
+    for name in ROLLING_ORDER:
+        lines.append(f"{states.get(name, '⏳')} {name}")
+    if footer:
+        lines += ['', footer]
+    return '\n'.join(lines)
+
+async def rolling_restart(progress: Message, user_id: int):
+    """Перезапуск процессов по одному с отчетом в одном редактируемом сообщении"""
+    states = {}
+
+    async def update(footer: str = ''):
+        try:
+            await progress.edit_text(format_progress(states, footer))
+        except Exception as e:
+            # "message is not modified" и т.п. - не мешают перезапуску
+            logger.debug(f"[PM2] Could not edit progress message: {e}")
+
+    # rolling_lock захватывает вызывающий, здесь он только освобождается
+    try:
+        logger.info(f"[PM2] User {user_id} started rolling restart")
+        for index, name in enumerate(ROLLING_ORDER):
+            before = (await get_pm2_status()).get(name)
+            states[name] = '🔄'
+            await update(f'Перезапуск {name} ({index + 1}/{len(ROLLING_ORDER)})...')
+
+            result = await manage_pm2('restart', name)
+            if not result.get('success'):
+                error_msg = result.get('message') or result.get('error') or 'Неизвестная ошибка'
+                states[name] = '❌'
+                await update(f'❌ {name}: {error_msg}\nОстальные процессы не тронуты.')
+                logger.error(f"[PM2] Rolling restart stopped at {name}: {error_msg}")
+                return
+
+            states[name] = '⏱'
+            await update(f'Ждем готовности {name}...')
+            deadline = asyncio.get_running_loop().time() + READY_TIMEOUT
+            current = None
+            while asyncio.get_running_loop().time() < deadline:
+                await asyncio.sleep(POLL_INTERVAL)
+                current = (await get_pm2_status()).get(name)
+                if is_ready(before, current):
+                    break
+            else:
+                states[name] = '❌'
+                status = (current or {}).get('status', 'unknown')
+                await update(
+                    f'❌ {name} не поднялся за {READY_TIMEOUT} с (статус: {status}).\n'
+                    f'Остальные процессы не тронуты, проверьте логи: pm2 logs {name}'
+                )
+                logger.error(f"[PM2] Rolling restart stopped: {name} not ready, status={status}")
+                return
+
+            states[name] = '✅'
+            logger.info(f"[PM2] {name} restarted, pid {current.get('pid')}")
+
+        await update('✅ Все процессы перезапущены')
+        logger.info(f"[PM2] Rolling restart by {user_id} finished")
+    finally:
+        rolling_lock.release()
+
 @router.callback_query(F.data == 'pm2_restart')
 async def pm2_restart_callback(callback: CallbackQuery):
-    """Обработка кнопки 'Включить ботов'"""
+    """Обработка кнопки 'Включить ботов' - поочередный перезапуск"""
+    global rolling_task
     if not is_admin(callback.from_user.id):
         try:
             await callback.answer('❌ У вас нет прав для выполнения этого действия', show_alert=True)
@@ -238,37 +351,28 @@ async def pm2_restart_callback(callback: CallbackQuery):
             pass
         return
     
+    if rolling_lock.locked():
+        try:
+            await callback.answer('⏳ Перезапуск уже выполняется', show_alert=True)
+        except:
+            pass
+        return
+    # Захватываем сразу, до первого await: повторное нажатие уже увидит блокировку.
+    # Свободный Lock захватывается без переключения задач
+    await rolling_lock.acquire()
+    
     try:
-        await callback.answer('⏳ Выполняется команда pm2 restart all...')
+        await callback.answer('⏳ Запускаю поочередный перезапуск...')
     except:
         pass
     
     try:
-        result = await manage_pm2('restart')
-        
-        if result.get('success'):
-            processed = result.get('processed', 0)
-            total = result.get('total', 0)
-            results = result.get('results', '')
-            stdout = result.get('stdout', '')
-            
-            response_text = f'✅ Боты перезапущены!\n\nОбработано: {processed}/{total}'
-            if results:
-                response_text += f'\n\nДетали:\n```\n{results}\n```'
-            elif stdout:
-                response_text += f'\n\nВывод:\n```\n{stdout}\n```'
-            await callback.message.answer(response_text, parse_mode='Markdown')
-            logger.info(f"[PM2] User {callback.from_user.id} restarted PM2 processes: {processed}/{total}")
-        else:
-            error_msg = result.get('message') or result.get('error') or 'Неизвестная ошибка'
-            error_details = result.get('stderr', '')
-            response = f'❌ Ошибка при перезапуске ботов:\n\n{error_msg}'
-            if error_details:
-                response += f'\n\nДетали:\n```\n{error_details}\n```'
-            await callback.message.answer(response, parse_mode='Markdown')
-            logger.error(f"[PM2] Failed to restart PM2: {error_msg}")
+        progress = await callback.message.answer(format_progress({}))
+        # Перезапуск идет в фоне, прогресс - в сообщении, обработчик не блокируется
+        rolling_task = asyncio.create_task(rolling_restart(progress, callback.from_user.id))
     except Exception as e:
-        logger.error(f"[PM2] Error restarting PM2: {e}", exc_info=True)
+        rolling_lock.release()
+        logger.error(f"[PM2] Error starting rolling restart: {e}", exc_info=True)
         try:
             await callback.message.answer(f'❌ Ошибка при выполнении команды: {str(e)}')
         except:
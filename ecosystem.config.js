@@ -33,6 +33,8 @@ module.exports = {
       merge_logs: true,
       autorestart: true,
       max_memory_restart: '300M',
+      // Время на остановку: бот дорабатывает начатые обработчики и сохраняет таймеры
+      kill_timeout: 30000,
       instances: 1,
       exec_mode: 'fork'
     },
@@ -76,7 +78,7 @@ module.exports = {
       name: 'bingo-payment',
       cwd: './payment_site',
       script: './venv/bin/python3',
-      args: '-u -m gunicorn -w 4 -b 0.0.0.0:3002 --timeout 120 --access-logfile - --error-logfile - app:app',
+      args: '-u -m gunicorn -w 4 -k gthread --threads 32 -b 0.0.0.0:3002 --timeout 120 --access-logfile - --error-logfile - app:app',
       interpreter: 'none',
       env: {
         FLASK_ENV: 'production',
@@ -107,6 +109,8 @@ module.exports = {
       merge_logs: true,
       autorestart: true,
       max_memory_restart: '300M',
+      // Время на остановку: бот дорабатывает начатые обработчики и сохраняет таймеры
+      kill_timeout: 30000,
       instances: 1,
       exec_mode: 'fork'
     },
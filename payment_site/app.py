@@ -1,4 +1,4 @@
-from flask import Flask, render_template, request, jsonify, send_from_directory
+from flask import Flask, Response, render_template, request, jsonify
 from flask_cors import CORS
 import aiohttp
 import asyncio
@@ -9,10 +9,18 @@ import os
 import json
 import ssl
 import hashlib
+import hmac
+import secrets
+import queue
+import threading
+import time
+from concurrent.futures import Future
 from datetime import datetime, timedelta
 from pathlib import Path
 from PIL import Image, ImageDraw, ImageFont
 
+from assets import asset_url, init_assets, send_asset
+
 # ASCII логотип для вывода в консоль
 ASCII_LOGO = """
  ███████████   ███                                        
@@ -84,12 +92,15 @@ if not os.path.exists(IMAGES_DIR):
     print(f"Warning: Images directory not found: {IMAGES_DIR}")
     IMAGES_DIR = None
 
-# Банки для пополнения
+init_assets(IMAGES_DIR)
+app.jinja_env.globals['asset_url'] = asset_url
+
+# Банки для пополнения (иконки со ссылками с отпечатком содержимого)
 BANKS = [
-    {'id': 'mbank', 'name': 'Mbank', 'icon': '/static/images/mbank.png'},
-    {'id': 'omoney', 'name': 'О банк', 'icon': '/static/images/omoney.jpg'},
-    {'id': 'bakai', 'name': 'BAKAI', 'icon': '/static/images/bakai.jpg'},
-    {'id': 'megapay', 'name': 'MEGApay', 'icon': '/static/images/megapay.jpg'},
+    {'id': 'mbank', 'name': 'Mbank', 'icon': asset_url('mbank.png')},
+    {'id': 'omoney', 'name': 'О банк', 'icon': asset_url('omoney.jpg')},
+    {'id': 'bakai', 'name': 'BAKAI', 'icon': asset_url('bakai.jpg')},
+    {'id': 'megapay', 'name': 'MEGApay', 'icon': asset_url('megapay.jpg')},
 ]
 
 async def generate_qr_async(amount, bank):
@@ -118,12 +129,51 @@ async def generate_qr_async(amount, bank):
             print(f"[Payment Site] Error connecting to admin API: {e}")
             return {'success': False, 'error': f'Connection error: {str(e)}'}
 
-def generate_qr_image(qr_hash, unique_id=None):
-    """Генерация изображения QR кода с встроенным водяным знаком и уникальным ID"""
+# Одновременные одинаковые запросы к админке /public/generate-qr (несколько вкладок,
+# повтор при смене банка) ждут один запрос. Ответ не кэшируется: реквизиты в админке
+# могут смениться в любой момент, и следующий запрос должен получить уже новые.
+# Воркеры gunicorn работают потоками (gthread), поэтому ожидание внутри воркера.
+_qr_inflight = {}  # (сумма, банк) -> Future с ответом
+_qr_lock = threading.Lock()
+
+def _run_generate_qr(amount, bank):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(generate_qr_async(amount, bank))
+    finally:
+        loop.close()
+
+def fetch_qr_data(amount, bank):
+    """Ответ админки для (amount, bank): из уже идущего запроса или новым запросом"""
+    key = (round(amount, 2), bank)
+    with _qr_lock:
+        future = _qr_inflight.get(key)
+        leader = future is None
+        if leader:
+            future = _qr_inflight[key] = Future()
+    
+    if not leader:
+        print(f"[Payment Site] Waiting for in-flight admin API request for {key}")
+        return future.result(timeout=30)
+    
+    try:
+        result = _run_generate_qr(amount, bank)
+    except Exception as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _qr_lock:
+            _qr_inflight.pop(key, None)
+    
+    future.set_result(result)
+    return result
+
+def render_qr_png(qr_hash, unique_id=None, box_size=12):
+    """Рендер QR кода с водяным знаком в PNG (сырые байты)"""
     qr = qrcode.QRCode(
         version=1,
         error_correction=qrcode.constants.ERROR_CORRECT_M,  # Увеличиваем коррекцию ошибок для лучшей читаемости
-        box_size=12,  # Увеличен размер QR кода
+        box_size=box_size,  # По умолчанию 12 - увеличенный размер QR кода
         border=4,
     )
     qr.add_data(qr_hash)
@@ -265,25 +315,230 @@ def generate_qr_image(qr_hash, unique_id=None):
     # Сохраняем в буфер
     buffer = io.BytesIO()
     final_img.save(buffer, format='PNG', quality=95)
-    buffer.seek(0)
-    
-    img_base64 = base64.b64encode(buffer.read()).decode('utf-8')
+    return buffer.getvalue()
+
+def generate_qr_image(qr_hash, unique_id=None, box_size=12):
+    """Генерация изображения QR кода с встроенным водяным знаком и уникальным ID (data URI)"""
+    png_bytes = render_qr_png(qr_hash, unique_id, box_size=box_size)
+    img_base64 = base64.b64encode(png_bytes).decode('utf-8')
     return f'data:image/png;base64,{img_base64}'
 
+# QR картинки по ссылке: /api/qr/<ключ>.png
+# Ключ = параметры рендера (ссылка, unique_id) + HMAC подпись, поэтому картинку
+# можно отдать любым воркером gunicorn без общего хранилища, а чужие ссылки с нашим
+# водяным знаком сгенерировать нельзя. Одинаковый ключ - одинаковые байты PNG,
+# поэтому ETag строгий, а браузер/nginx могут кэшировать картинку сколько угодно.
+QR_RENDER_VERSION = 1  # увеличить при изменении render_qr_png (сбросит кэши)
+QR_CACHE_MAX_AGE = int(os.getenv('QR_CACHE_MAX_AGE', 86400))
+QR_SECRET_PATH = Path(__file__).parent / '.qr_secret'
+
+def load_qr_secret():
+    """Секрет подписи из QR_SIGNING_SECRET или файла .qr_secret (создается один раз, общий для воркеров)"""
+    secret = os.getenv('QR_SIGNING_SECRET')
+    if secret:
+        return secret.encode()
+    if not QR_SECRET_PATH.exists():
+        tmp = QR_SECRET_PATH.with_name(f'.qr_secret.{os.getpid()}')
+        tmp.write_text(secrets.token_hex(32))
+        try:
+            # link атомарен и не перезаписывает: если другой воркер успел первым, берем его секрет
+            os.link(tmp, QR_SECRET_PATH)
+        except FileExistsError:
+            pass
+        finally:
+            tmp.unlink()
+    return QR_SECRET_PATH.read_text().strip().encode()
+
+QR_SECRET = load_qr_secret()
+
+def _b64(data):
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+def _unb64(text):
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+def _qr_signature(payload):
+    return _b64(hmac.new(QR_SECRET, payload.encode('ascii'), hashlib.sha256).digest()[:16])
+
+def make_qr_key(qr_data, unique_id=None):
+    """Ключ картинки QR для /api/qr/<ключ>.png"""
+    payload = _b64(json.dumps([qr_data, unique_id or ''], separators=(',', ':'), ensure_ascii=False).encode('utf-8'))
+    return f'{payload}.{_qr_signature(payload)}'
+
+def parse_qr_key(key):
+    """(qr_data, unique_id) или None, если ключ поврежден или подпись не наша"""
+    payload, _, signature = key.rpartition('.')
+    if not payload or not hmac.compare_digest(signature, _qr_signature(payload)):
+        return None
+    try:
+        qr_data, unique_id = json.loads(_unb64(payload))
+    except (ValueError, TypeError):
+        return None
+    return qr_data, unique_id or None
+
+@app.route('/api/qr/<key>.png')
+def qr_png(key):
+    """PNG QR кода по ключу из /api/generate-qr (qr_url)"""
+    params = parse_qr_key(key)
+    if params is None:
+        return '', 404
+    
+    etag = hashlib.sha256(f'{QR_RENDER_VERSION}:{key}'.encode('ascii')).hexdigest()[:32]
+    headers = {'Cache-Control': f'public, max-age={QR_CACHE_MAX_AGE}, immutable'}
+    if request.if_none_match.contains(etag):
+        response = Response(status=304, headers=headers)
+        response.set_etag(etag)
+        return response
+    
+    response = Response(render_qr_png(*params), mimetype='image/png', headers=headers)
+    response.set_etag(etag)
+    return response
+
+# События для страницы оплаты (SSE): /api/events?request_id=&created_at=
+# Раньше страница сама считала таймер и ничего не знала о статусе заявки. Теперь
+# сервер присылает время окончания, событие expired и изменения статуса заявки.
+# Статусы всех открытых страниц воркера опрашиваются одним потоком одним запросом
+# в админку (/public/request-status) раз в SSE_POLL_INTERVAL секунд. Админка отдает
+# статусы только заявок, созданных за последние 10 минут (окно оплаты с запасом).
+PAYMENT_WINDOW_SECONDS = 5 * 60
+SSE_POLL_INTERVAL = float(os.getenv('SSE_POLL_INTERVAL', 2))
+SSE_KEEPALIVE = float(os.getenv('SSE_KEEPALIVE', 15))
+# Поток gunicorn занят, пока открыт поток событий: оставляем потоки для обычных запросов
+SSE_MAX_STREAMS = int(os.getenv('SSE_MAX_STREAMS', 24))
+SSE_MAX_SECONDS = PAYMENT_WINDOW_SECONDS + 60
+PENDING_STATUSES = ('pending',)
+
+_status_watchers = {}   # request_id -> set(queue.Queue)
+_known_statuses = {}    # request_id -> последний статус из админки
+_status_lock = threading.Lock()
+_status_poller = None
+_open_streams = 0
+
+async def fetch_request_statuses_async(request_ids):
+    """{request_id: status} из админки"""
+    connector = aiohttp.TCPConnector(ssl=ssl_context)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        async with session.get(
+            f'{API_BASE_URL}/public/request-status',
+            params={'ids': ','.join(request_ids)},
+            timeout=aiohttp.ClientTimeout(total=10)
+        ) as response:
+            result = await response.json()
+    if not result.get('success'):
+        raise RuntimeError(result.get('error') or f'status {response.status}')
+    return (result.get('data') or {}).get('statuses') or {}
+
+def _poll_statuses():
+    """Поток опроса статусов: работает, пока есть хоть одна открытая страница с заявкой"""
+    global _status_poller
+    while True:
+        with _status_lock:
+            request_ids = sorted(_status_watchers)
+            if not request_ids:
+                _status_poller = None
+                return
+        try:
+            statuses = asyncio.run(fetch_request_statuses_async(request_ids))
+        except Exception as e:
+            print(f"[Payment Site] Request status poll failed: {e}")
+            statuses = {}
+        with _status_lock:
+            for request_id, status in statuses.items():
+                if _known_statuses.get(request_id) == status:
+                    continue
+                _known_statuses[request_id] = status
+                for watcher in _status_watchers.get(request_id, ()):
+                    watcher.put(status)
+        time.sleep(SSE_POLL_INTERVAL)
+
+def watch_request(request_id, watcher):
+    global _status_poller
+    with _status_lock:
+        _status_watchers.setdefault(request_id, set()).add(watcher)
+        if request_id in _known_statuses:
+            watcher.put(_known_statuses[request_id])
+        if _status_poller is None:
+            _status_poller = threading.Thread(target=_poll_statuses, name='request-status-poller', daemon=True)
+            _status_poller.start()
+
+def unwatch_request(request_id, watcher):
+    with _status_lock:
+        watchers = _status_watchers.get(request_id)
+        if watchers is None:
+            return
+        watchers.discard(watcher)
+        if not watchers:
+            del _status_watchers[request_id]
+            _known_statuses.pop(request_id, None)
+
+def _sse(event, data):
+    return f'event: {event}\ndata: {json.dumps(data)}\n\n'
+
+@app.route('/api/events')
+def events():
+    """Поток событий страницы оплаты: hello, status, expired"""
+    global _open_streams
+    request_id = request.args.get('request_id', '').strip()
+    if not request_id.isdigit():
+        request_id = None
+    try:
+        created_at = int(request.args.get('created_at', ''))
+    except ValueError:
+        created_at = int(time.time() * 1000)
+    expires_at = created_at + PAYMENT_WINDOW_SECONDS * 1000
+    
+    with _status_lock:
+        if _open_streams >= SSE_MAX_STREAMS:
+            # Страница продолжит работать на своем таймере
+            return '', 503
+        _open_streams += 1
+    
+    def release():
+        global _open_streams
+        with _status_lock:
+            _open_streams -= 1
+    
+    def stream():
+        watcher = queue.Queue()
+        deadline = min(expires_at / 1000, time.time() + SSE_MAX_SECONDS)
+        try:
+            if request_id:
+                watch_request(request_id, watcher)
+            yield _sse('hello', {'server_time': int(time.time() * 1000), 'expires_at': expires_at})
+            while True:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    if time.time() * 1000 >= expires_at:
+                        yield _sse('expired', {'expires_at': expires_at})
+                    return
+                try:
+                    status = watcher.get(timeout=min(remaining, SSE_KEEPALIVE))
+                except queue.Empty:
+                    yield ': keepalive\n\n'
+                    continue
+                yield _sse('status', {'request_id': request_id, 'status': status})
+                if status not in PENDING_STATUSES:
+                    return
+        finally:
+            if request_id:
+                unwatch_request(request_id, watcher)
+    
+    response = Response(stream(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',  # nginx не должен буферизовать поток
+    })
+    # Слот освобождается при закрытии ответа, даже если поток не начал читаться
+    response.call_on_close(release)
+    return response
+
 @app.route('/')
 def index():
     return render_template('index.html')
 
 @app.route('/static/images/<path:filename>')
 def images(filename):
-    """Отдача изображений банков"""
-    if not IMAGES_DIR or not os.path.exists(IMAGES_DIR):
-        return '', 404
-    try:
-        return send_from_directory(IMAGES_DIR, filename)
-    except:
-        # Если файл не найден, возвращаем пустой ответ
-        return '', 404
+    """Отдача изображений банков (ETag по содержимому, см. assets.py)"""
+    return send_asset(filename)
 
 @app.route('/success')
 def success():
@@ -325,7 +580,7 @@ def pay():
     
     # Вычисляем время окончания (5 минут от времени создания)
     created_at_dt = datetime.fromtimestamp(created_at_timestamp / 1000)
-    expires_at = created_at_dt + timedelta(minutes=5)
+    expires_at = created_at_dt + timedelta(seconds=PAYMENT_WINDOW_SECONDS)
     expires_timestamp = int(expires_at.timestamp() * 1000)
     
     # Генерируем уникальный идентификатор для отслеживания
@@ -355,20 +610,14 @@ def generate_qr():
         
         print(f"[Payment Site] Generating QR for amount: {amount}, bank: {bank}")
         
-        # Асинхронный вызов
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
         try:
-            qr_data = loop.run_until_complete(generate_qr_async(amount, bank))
+            qr_data = fetch_qr_data(amount, bank)
         except Exception as e:
             print(f"[Payment Site] Error calling admin API: {e}")
-            loop.close()
             return jsonify({
                 'success': False,
                 'error': f'Failed to connect to admin API: {str(e)}'
             }), 500
-        finally:
-            loop.close()
         
         print(f"[Payment Site] QR data received: success={qr_data.get('success')}, error={qr_data.get('error')}")
         
@@ -389,24 +638,28 @@ def generate_qr():
             
             print(f"[Payment Site] Generating QR image for URL: {omoney_url[:50]}...")
             
-            try:
-                # Кодируем ссылку O!Money в QR код вместо qr_hash
-                qr_image = generate_qr_image(omoney_url, unique_id)
-                print(f"[Payment Site] QR image generated successfully, length: {len(qr_image)}")
-            except Exception as e:
-                print(f"[Payment Site] Error generating QR image: {e}", exc_info=True)
-                return jsonify({
-                    'success': False,
-                    'error': f'Failed to generate QR image: {str(e)}'
-                }), 500
-            
-            return jsonify({
+            # Кодируем ссылку O!Money в QR код вместо qr_hash
+            result = {
                 'success': True,
                 'qr_hash': qr_hash,
-                'qr_image': qr_image,
+                'qr_url': f'/api/qr/{make_qr_key(omoney_url, unique_id)}.png',
                 'all_bank_urls': qr_data.get('all_bank_urls', {}),
                 'bank_urls': qr_data.get('all_bank_urls', {})  # Для совместимости
-            })
+            }
+            
+            # Картинка внутри JSON (data URI) - только для старых клиентов, которые не знают qr_url
+            if request.json.get('image') != 'url':
+                try:
+                    result['qr_image'] = generate_qr_image(omoney_url, unique_id)
+                    print(f"[Payment Site] QR image generated successfully, length: {len(result['qr_image'])}")
+                except Exception as e:
+                    print(f"[Payment Site] Error generating QR image: {e}")
+                    return jsonify({
+                        'success': False,
+                        'error': f'Failed to generate QR image: {str(e)}'
+                    }), 500
+            
+            return jsonify(result)
         else:
             error_msg = qr_data.get('error', 'Failed to generate QR')
             print(f"[Payment Site] Admin API returned error: {error_msg}")
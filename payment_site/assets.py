@@ -0,0 +1,121 @@
+"""
+Статика payment_site (иконки банков из admin/public/images)
+
+Раньше каждый запрос /static/images/<файл> шел через send_from_directory без
+заголовков кэша. Теперь файлы индексируются при старте (sha256 содержимого):
+
+- ETag = хэш содержимого, If-None-Match -> 304;
+- asset_url('mbank.png') -> '/static/images/mbank.png?v=<хэш>': такая ссылка
+  кэшируется на год как immutable, ссылка без ?v - на ASSET_MAX_AGE с ревалидацией;
+- файлы до ASSET_MEMORY_MAX_BYTES отдаются из памяти, без чтения диска;
+- если задан ASSET_ACCEL_PREFIX (internal location nginx), тело отдает nginx
+  через X-Accel-Redirect, воркер только ставит заголовки.
+
+Файл, замененный или добавленный после старта, переиндексируется при первом запросе.
+"""
+
+import hashlib
+import mimetypes
+import os
+
+from flask import Response, request, send_file
+from werkzeug.security import safe_join
+
+ASSET_MAX_AGE = int(os.getenv('ASSET_MAX_AGE', 3600))
+ASSET_IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+ASSET_MEMORY_MAX_BYTES = int(os.getenv('ASSET_MEMORY_MAX_BYTES', 64 * 1024))
+# Например '/_bank_images/' - location с internal и alias на admin/public/images
+ASSET_ACCEL_PREFIX = os.getenv('ASSET_ACCEL_PREFIX', '')
+
+_directory = None
+# имя файла -> {'path', 'hash', 'size', 'mtime', 'mimetype', 'data' (bytes или None)}
+_index = {}
+
+
+def _fingerprint(filename, path):
+    stat = os.stat(path)
+    with open(path, 'rb') as f:
+        data = f.read()
+    entry = {
+        'path': path,
+        'hash': hashlib.sha256(data).hexdigest()[:16],
+        'size': stat.st_size,
+        'mtime': stat.st_mtime,
+        'mimetype': mimetypes.guess_type(filename)[0] or 'application/octet-stream',
+        'data': data if stat.st_size <= ASSET_MEMORY_MAX_BYTES else None,
+    }
+    _index[filename] = entry
+    return entry
+
+
+def init_assets(directory):
+    """Проиндексировать все файлы директории (вызывается при старте)"""
+    global _directory
+    _directory = directory
+    _index.clear()
+    if not directory:
+        return
+    for root, _, files in os.walk(directory):
+        for name in files:
+            path = os.path.join(root, name)
+            filename = os.path.relpath(path, directory).replace(os.sep, '/')
+            try:
+                _fingerprint(filename, path)
+            except OSError as e:
+                print(f"[Assets] Could not index {filename}: {e}")
+    in_memory = sum(1 for entry in _index.values() if entry['data'] is not None)
+    print(f"[Assets] Indexed {len(_index)} files from {directory} ({in_memory} in memory)")
+
+
+def _lookup(filename):
+    """Запись индекса с проверкой, что файл не менялся; None - файла нет"""
+    if not _directory:
+        return None
+    entry = _index.get(filename)
+    path = entry['path'] if entry else safe_join(_directory, filename)
+    if path is None:
+        return None
+    try:
+        stat = os.stat(path)
+    except OSError:
+        _index.pop(filename, None)
+        return None
+    if entry is None or stat.st_mtime != entry['mtime'] or stat.st_size != entry['size']:
+        if not os.path.isfile(path):
+            return None
+        entry = _fingerprint(filename, path)
+    return entry
+
+
+def asset_url(filename):
+    """Ссылка на файл с отпечатком содержимого (для шаблонов и BANKS)"""
+    entry = _lookup(filename)
+    if entry is None:
+        return f'/static/images/{filename}'
+    return f"/static/images/{filename}?v={entry['hash']}"
+
+
+def send_asset(filename):
+    """Ответ Flask для /static/images/<filename>"""
+    entry = _lookup(filename)
+    if entry is None:
+        return '', 404
+
+    if request.args.get('v') == entry['hash']:
+        cache_control = f'public, max-age={ASSET_IMMUTABLE_MAX_AGE}, immutable'
+    else:
+        cache_control = f'public, max-age={ASSET_MAX_AGE}'
+    headers = {'Cache-Control': cache_control}
+
+    if request.if_none_match.contains(entry['hash']):
+        response = Response(status=304, headers=headers)
+    elif ASSET_ACCEL_PREFIX:
+        headers['X-Accel-Redirect'] = ASSET_ACCEL_PREFIX.rstrip('/') + '/' + filename
+        response = Response(mimetype=entry['mimetype'], headers=headers)
+    elif entry['data'] is not None:
+        response = Response(entry['data'], mimetype=entry['mimetype'], headers=headers)
+    else:
+        response = send_file(entry['path'], mimetype=entry['mimetype'], etag=False, max_age=None)
+        response.headers['Cache-Control'] = cache_control
+    response.set_etag(entry['hash'])
+    return response
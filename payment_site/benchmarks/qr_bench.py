@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк генерации QR изображений payment_site
+
+Измеряет:
+- время рендера render_qr_png (медиана и p95) по размерам модуля, длинам URL и наличию шрифтов
+- размер PNG
+- пиковую память Python-аллокаций (tracemalloc, без внутренних буферов Pillow)
+- стоимость транспорта data URI (base64 + JSON) против сырых байт,
+  включая путь декодирования бота (split + base64.b64decode)
+
+Результаты сравниваются с сохраненным baseline.json: если медиана рендера
+или транспорта выросла больше чем в --max-ratio раз, скрипт завершается с кодом 1.
+Без baseline.json тоже код 1 (иначе проверка молча ничего не проверяет), если не
+передан --save-baseline или --allow-missing-baseline.
+
+Использование:
+    python benchmarks/qr_bench.py                  # сравнить с baseline
+    python benchmarks/qr_bench.py --save-baseline  # перезаписать baseline на этой машине
+    python benchmarks/qr_bench.py --allow-missing-baseline  # только замеры, если baseline еще нет
+"""
+
+import argparse
+import base64
+import contextlib
+import json
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent))
+
+import app as payment_app  # noqa: E402
+
+BASELINE_PATH = BENCH_DIR / 'baseline.json'
+
+BOX_SIZES = [8, 12, 16]
+
+# Ссылки O!Money разной длины (короткий hash, типичный hash, hash с параметрами)
+URLS = {
+    'short': 'https://api.dengi.o.kg/ru/qr/#' + 'a1b2c3d4' * 4,
+    'typical': 'https://api.dengi.o.kg/ru/qr/#' + '00020101021132' + 'f' * 110,
+    'long': 'https://api.dengi.o.kg/ru/qr/#' + '00020101021132' + 'e' * 300,
+}
+
+
+@contextlib.contextmanager
+def fonts_unavailable():
+    """Имитирует сервер без TrueType шрифтов (рендер падает на load_default)"""
+    original = payment_app.ImageFont.truetype
+
+    def _missing(font=None, *args, **kwargs):
+        # Pillow >= 10.1 сам вызывает truetype() из load_default() с BytesIO,
+        # поэтому отключаем только загрузку по пути к файлу
+        if isinstance(font, (str, Path)):
+            raise OSError('font disabled for benchmark')
+        return original(font, *args, **kwargs)
+
+    payment_app.ImageFont.truetype = _missing
+    try:
+        yield
+    finally:
+        payment_app.ImageFont.truetype = original
+
+
+def _timings(func, iterations):
+    samples = []
+    result = None
+    for _ in range(iterations):
+        started = time.perf_counter()
+        result = func()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    p95_index = min(len(samples) - 1, int(round(len(samples) * 0.95)) - 1)
+    return result, {
+        'median_ms': round(statistics.median(samples), 3),
+        'p95_ms': round(samples[max(p95_index, 0)], 3),
+    }
+
+
+def _peak_kb(func):
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return round(peak / 1024, 1)
+
+
+def bench_render(box_size, url, iterations):
+    render = lambda: payment_app.render_qr_png(url, box_size=box_size)
+    render()  # прогрев (загрузка шрифтов, импорт плагинов PIL)
+    png_bytes, timing = _timings(render, iterations)
+    return png_bytes, {
+        **timing,
+        'png_bytes': len(png_bytes),
+        'py_peak_kb': _peak_kb(render),
+    }
+
+
+def bench_transport(png_bytes, iterations):
+    """data URI в JSON (как сейчас отдает /api/generate-qr) против сырых байт"""
+    def encode():
+        data_uri = 'data:image/png;base64,' + base64.b64encode(png_bytes).decode('utf-8')
+        return json.dumps({'success': True, 'qr_image': data_uri})
+
+    payload = encode()
+
+    def decode():
+        # Тот же путь, что и в боте: JSON -> split префикса -> b64decode
+        qr_image = json.loads(payload)['qr_image']
+        if qr_image.startswith('data:image'):
+            qr_image = qr_image.split(',', 1)[1]
+        return base64.b64decode(qr_image)
+
+    _, encode_timing = _timings(encode, iterations)
+    decoded, decode_timing = _timings(decode, iterations)
+    assert decoded == png_bytes
+    return {
+        'raw_bytes': len(png_bytes),
+        'data_uri_json_bytes': len(payload.encode('utf-8')),
+        'size_overhead_ratio': round(len(payload.encode('utf-8')) / len(png_bytes), 3),
+        'encode_median_ms': encode_timing['median_ms'],
+        'decode_median_ms': decode_timing['median_ms'],
+    }
+
+
+def run(iterations):
+    results = {}
+    for fonts in ('system', 'default'):
+        ctx = fonts_unavailable() if fonts == 'default' else contextlib.nullcontext()
+        with ctx:
+            for box_size in BOX_SIZES:
+                for url_name, url in URLS.items():
+                    key = f'box{box_size}/{url_name}/fonts-{fonts}'
+                    png_bytes, render_stats = bench_render(box_size, url, iterations)
+                    results[key] = {
+                        'render': render_stats,
+                        'transport': bench_transport(png_bytes, iterations),
+                    }
+                    print(
+                        f"  {key:<32} render {render_stats['median_ms']:>8.2f} ms "
+                        f"(p95 {render_stats['p95_ms']:.2f}) | png {render_stats['png_bytes']:>6} B "
+                        f"| py peak {render_stats['py_peak_kb']:>7.1f} KB "
+                        f"| data URI x{results[key]['transport']['size_overhead_ratio']}"
+                    )
+    return results
+
+
+def compare(results, baseline, max_ratio):
+    """Возвращает список регрессий относительно baseline"""
+    regressions = []
+    base_cases = baseline.get('cases', {})
+    for key, current in results.items():
+        base = base_cases.get(key)
+        if not base:
+            continue
+        checks = [
+            ('render.median_ms', current['render']['median_ms'], base['render']['median_ms']),
+            ('render.png_bytes', current['render']['png_bytes'], base['render']['png_bytes']),
+            ('transport.decode_median_ms', current['transport']['decode_median_ms'], base['transport']['decode_median_ms']),
+        ]
+        for metric, value, base_value in checks:
+            # Сверхмалые значения шумят сильнее, чем сама регрессия
+            if base_value and base_value >= 0.05 and value / base_value > max_ratio:
+                regressions.append(f'{key} {metric}: {base_value} -> {value} (x{value / base_value:.2f})')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк рендера QR изображений')
+    parser.add_argument('--iterations', type=int, default=15, help='Количество замеров на сценарий')
+    parser.add_argument('--max-ratio', type=float, default=2.0, help='Допустимый рост относительно baseline')
+    parser.add_argument('--baseline', type=Path, default=BASELINE_PATH, help='Путь к baseline.json')
+    parser.add_argument('--save-baseline', action='store_true', help='Сохранить результаты как новый baseline')
+    parser.add_argument('--allow-missing-baseline', action='store_true', help='Без baseline только вывести замеры (код 0)')
+    args = parser.parse_args()
+
+    # Проверяем до замеров: без baseline сравнивать не с чем
+    if not args.save_baseline and not args.allow_missing_baseline and not args.baseline.exists():
+        print(f'❌ Baseline не найден ({args.baseline}): запустите с --save-baseline '
+              f'или --allow-missing-baseline')
+        return 1
+
+    print('=' * 80)
+    print('📊 QR BENCHMARK')
+    print('=' * 80)
+    results = run(args.iterations)
+
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps({
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'machine': f'{platform.machine()} / {platform.python_implementation()} {platform.python_version()}',
+            'iterations': args.iterations,
+            'cases': results,
+        }, indent=2, ensure_ascii=False) + '\n', encoding='utf-8')
+        print(f'\n💾 Baseline сохранен: {args.baseline}')
+        return 0
+
+    if not args.baseline.exists():
+        print(f'\n⚠️  Baseline не найден ({args.baseline}), сравнение пропущено (--allow-missing-baseline)')
+        return 0
+
+    baseline = json.loads(args.baseline.read_text(encoding='utf-8'))
+    regressions = compare(results, baseline, args.max_ratio)
+    if regressions:
+        print(f'\n❌ Регрессии (порог x{args.max_ratio}, baseline от {baseline.get("created_at")}):')
+        for line in regressions:
+            print(f'  - {line}')
+        return 1
+
+    print(f'\n✅ Регрессий нет (порог x{args.max_ratio})')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
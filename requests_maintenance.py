@@ -0,0 +1,458 @@
+#!/usr/bin/env python3
+"""
+Архивация и удаление заявок (таблица requests) пачками
+
+Заменяет delete_requests.py / delete_requests_auto.py:
+- выбор заявок по возрасту, статусу, типу, диапазону ID или списку ID
+- перед удалением строки выгружаются через COPY ... TO STDOUT в сжатый CSV (.csv.gz)
+- удаление короткими транзакциями по --batch-size строк (id = ANY(...)),
+  каждая пачка: SELECT ... FOR UPDATE SKIP LOCKED -> COPY -> DELETE -> COMMIT
+- строки, занятые приложением (SKIP LOCKED), запоминаются и повторяются в конце
+  (--locked-retries раз); если они так и не освободились, запуск завершается с
+  ошибкой, а --resume повторит их
+- после каждой пачки пишется checkpoint, прерванный запуск продолжается с --resume;
+  каждая пачка - отдельный gzip member, недописанный хвост архива при --resume
+  отрезается (строки этой пачки остались в БД и выгрузятся снова)
+- паузы между пачками, statement/lock timeout и ожидание при большой нагрузке на БД,
+  чтобы не отнимать соединения и блокировки у админки
+
+Параметры подключения: DATABASE_URL из окружения или admin/.env
+
+Примеры:
+    python requests_maintenance.py --older-than-days 90 --status completed rejected --dry-run
+    python requests_maintenance.py --older-than-days 90 --status completed rejected
+    python requests_maintenance.py --ids 22 44 23 --yes
+    python requests_maintenance.py --resume archives/requests_20260101_120000.csv.gz
+"""
+
+import argparse
+import gzip
+import hashlib
+import io
+import json
+import os
+import sys
+import time
+import zlib
+from datetime import datetime
+from pathlib import Path
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+try:
+    import psycopg2
+    from psycopg2 import sql
+except ImportError:
+    print("❌ Не установлен psycopg2: pip install psycopg2-binary")
+    sys.exit(1)
+
+ROOT_DIR = Path(__file__).resolve().parent
+DEFAULT_ARCHIVE_DIR = ROOT_DIR / 'archives'
+
+# Параметры строки подключения Prisma, которые не понимает libpq
+PRISMA_ONLY_PARAMS = {'schema', 'connection_limit', 'pool_timeout', 'pgbouncer', 'socket_timeout'}
+
+
+def load_database_url():
+    """DATABASE_URL из окружения или admin/.env"""
+    url = os.getenv('DATABASE_URL')
+    env_path = ROOT_DIR / 'admin' / '.env'
+    if not url and env_path.exists():
+        for line in env_path.read_text(encoding='utf-8').splitlines():
+            line = line.strip()
+            if line.startswith('DATABASE_URL='):
+                url = line.split('=', 1)[1].strip().strip('"').strip("'")
+                break
+    if not url:
+        print("❌ DATABASE_URL не найден (ни в окружении, ни в admin/.env)")
+        sys.exit(1)
+
+    parts = urlsplit(url)
+    query = [(k, v) for k, v in parse_qsl(parts.query) if k not in PRISMA_ONLY_PARAMS]
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+def build_filter(args):
+    """WHERE условие и его "подпись" (для проверки checkpoint при --resume)"""
+    conditions = []
+    description = {}
+    if args.ids:
+        conditions.append(sql.SQL('id = ANY({})').format(sql.Literal(sorted(set(args.ids)))))
+        description['ids'] = sorted(set(args.ids))
+    if args.min_id is not None:
+        conditions.append(sql.SQL('id >= {}').format(sql.Literal(args.min_id)))
+        description['min_id'] = args.min_id
+    if args.max_id is not None:
+        conditions.append(sql.SQL('id <= {}').format(sql.Literal(args.max_id)))
+        description['max_id'] = args.max_id
+    if args.older_than_days is not None:
+        conditions.append(sql.SQL("created_at < now() - {} * interval '1 day'").format(sql.Literal(args.older_than_days)))
+        description['older_than_days'] = args.older_than_days
+    if args.status:
+        conditions.append(sql.SQL('status = ANY({})').format(sql.Literal(list(args.status))))
+        description['status'] = list(args.status)
+    if args.type:
+        conditions.append(sql.SQL('request_type = {}').format(sql.Literal(args.type)))
+        description['type'] = args.type
+
+    if not conditions:
+        print("❌ Не задан ни один фильтр (--ids, --min-id/--max-id, --older-than-days, --status, --type)")
+        sys.exit(1)
+
+    signature = hashlib.sha256(json.dumps(description, sort_keys=True).encode()).hexdigest()[:16]
+    return sql.SQL(' AND ').join(conditions), description, signature
+
+
+def connect(url, args):
+    conn = psycopg2.connect(url, application_name='requests_maintenance')
+    with conn.cursor() as cursor:
+        # Не держим долгих блокировок и не зависаем на чужих
+        cursor.execute(sql.SQL('SET statement_timeout = {}').format(sql.Literal(f'{args.statement_timeout}s')))
+        cursor.execute(sql.SQL('SET lock_timeout = {}').format(sql.Literal(f'{args.lock_timeout}s')))
+    conn.commit()
+    return conn
+
+
+def wait_for_capacity(conn, max_active):
+    """Ждем, пока в БД не станет меньше max_active активных запросов (кроме нашего)"""
+    if max_active <= 0:
+        return
+    while True:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                "SELECT count(*) FROM pg_stat_activity "
+                "WHERE datname = current_database() AND state = 'active' AND pid <> pg_backend_pid()"
+            )
+            active = cursor.fetchone()[0]
+        conn.commit()
+        if active < max_active:
+            return
+        print(f"  ⏸️  Активных запросов в БД: {active} (порог {max_active}), ждем...")
+        time.sleep(2)
+
+
+def print_summary(conn, where):
+    with conn.cursor() as cursor:
+        cursor.execute(sql.SQL(
+            'SELECT count(*), min(id), max(id), min(created_at), max(created_at) FROM requests WHERE {}'
+        ).format(where))
+        count, min_id, max_id, min_created, max_created = cursor.fetchone()
+        print(f"\n📊 Подходящих заявок: {count}")
+        if count:
+            print(f"   ID: {min_id} .. {max_id}")
+            print(f"   Создание: {min_created} .. {max_created}")
+            cursor.execute(sql.SQL(
+                'SELECT status, request_type, count(*) FROM requests WHERE {} GROUP BY 1, 2 ORDER BY 3 DESC'
+            ).format(where))
+            print("-" * 80)
+            for status, request_type, n in cursor.fetchall():
+                print(f"  {request_type:<10} {status:<20} {n}")
+            print("-" * 80)
+    conn.commit()
+    return count
+
+
+def load_checkpoint(path):
+    if path.exists():
+        return json.loads(path.read_text(encoding='utf-8'))
+    return None
+
+
+def save_checkpoint(path, state):
+    tmp = path.with_suffix(path.suffix + '.tmp')
+    tmp.write_text(json.dumps(state, indent=2, ensure_ascii=False), encoding='utf-8')
+    os.replace(tmp, path)
+
+
+def complete_gzip_length(path):
+    """Длина архива до конца последнего целого gzip member (после обрыва запуска)"""
+    good = offset = 0
+    decompressor = zlib.decompressobj(wbits=31)
+    with open(path, 'rb') as f:
+        pending = b''
+        while True:
+            buf = pending or f.read(1 << 20)
+            pending = b''
+            if not buf:
+                break
+            try:
+                decompressor.decompress(buf)
+            except zlib.error:
+                break
+            if decompressor.eof:
+                pending = decompressor.unused_data
+                offset += len(buf) - len(pending)
+                good = offset
+                decompressor = zlib.decompressobj(wbits=31)
+            else:
+                offset += len(buf)
+    return good
+
+
+def process_batch(conn, where, batch_size, archive, write_header, archive_only, last_id=0, only_ids=None):
+    """
+    Одна пачка в одной транзакции: следующие batch_size строк после last_id
+    или строки only_ids (повтор пропущенных).
+
+    Returns:
+        (candidates, ids, skipped, размер архива пачки в байтах): candidates - все
+        строки страницы (курсор можно сдвинуть за candidates[-1]), ids - обработанные,
+        skipped - заблокированные приложением (SKIP LOCKED), их нужно повторить
+    """
+    with conn.cursor() as cursor:
+        if only_ids is None:
+            cursor.execute(sql.SQL(
+                'SELECT id FROM requests WHERE {} AND id > %s ORDER BY id LIMIT %s'
+            ).format(where), (last_id, batch_size))
+            candidates = [row[0] for row in cursor.fetchall()]
+        else:
+            candidates = sorted(only_ids)
+        if not candidates:
+            conn.commit()
+            return candidates, [], [], 0
+
+        cursor.execute(sql.SQL(
+            'SELECT id FROM requests WHERE {} AND id = ANY(%s) ORDER BY id FOR UPDATE SKIP LOCKED'
+        ).format(where), (candidates,))
+        ids = [row[0] for row in cursor.fetchall()]
+        skipped = []
+        if len(ids) < len(candidates):
+            # Не взятые строки либо уже не подходят (удалены, сменили статус), либо заняты
+            locked = set(ids)
+            cursor.execute(sql.SQL('SELECT id FROM requests WHERE {} AND id = ANY(%s) ORDER BY id').format(where), (
+                [i for i in candidates if i not in locked],
+            ))
+            skipped = [row[0] for row in cursor.fetchall()]
+        if not ids:
+            conn.commit()
+            return candidates, ids, skipped, 0
+
+        # Пачка сначала выгружается в память (она ограничена --batch-size), а в файл
+        # пишется только после успешного DELETE - при откате строки в архив не попадут
+        chunk = io.BytesIO()
+        if archive is not None:
+            options = 'FORMAT csv, HEADER' if write_header else 'FORMAT csv'
+            copy_query = cursor.mogrify(
+                f'COPY (SELECT * FROM requests WHERE id = ANY(%s) ORDER BY id) TO STDOUT WITH ({options})',
+                (ids,)
+            ).decode('utf-8')
+            cursor.copy_expert(copy_query, chunk)
+
+        if not archive_only:
+            # Как onDelete: SetNull у связи IncomingPayment.request в Prisma
+            cursor.execute('UPDATE incoming_payments SET request_id = NULL WHERE request_id = ANY(%s)', (ids,))
+            cursor.execute('DELETE FROM requests WHERE id = ANY(%s)', (ids,))
+
+        if archive is not None:
+            # Целый gzip member на пачку: обрыв запуска не портит уже записанные пачки
+            archive.write(gzip.compress(chunk.getvalue(), compresslevel=6))
+            archive.flush()
+            os.fsync(archive.fileno())
+    conn.commit()
+    return candidates, ids, skipped, chunk.tell()
+
+
+def run(args):
+    url = load_database_url()
+    where, description, signature = build_filter(args)
+
+    # Архив и checkpoint
+    if args.resume:
+        archive_path = Path(args.resume)
+        checkpoint_path = Path(str(archive_path) + '.checkpoint.json')
+        state = load_checkpoint(checkpoint_path)
+        if not state:
+            print(f"❌ Checkpoint не найден: {checkpoint_path}")
+            return False
+        if state['filter_signature'] != signature:
+            print(f"❌ Фильтр отличается от сохраненного в checkpoint: {state['filter']}")
+            return False
+        state.setdefault('skipped', [])
+        state.pop('finished_at', None)
+        position = 'проход по ID завершен' if state['last_id'] is None else f"с ID > {state['last_id']}"
+        print(f"♻️  Продолжаем: {position}, уже обработано {state['processed']}, "
+              f"отложено занятых {len(state['skipped'])}")
+    else:
+        archive_dir = Path(args.archive_dir)
+        archive_path = archive_dir / f"requests_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv.gz"
+        checkpoint_path = Path(str(archive_path) + '.checkpoint.json')
+        state = {
+            'filter': description,
+            'filter_signature': signature,
+            'archive': None if args.no_archive else str(archive_path),
+            'archive_only': args.archive_only,
+            'last_id': 0,
+            'processed': 0,
+            'skipped': [],  # строки, занятые приложением: повторяются в конце
+            'started_at': datetime.now().isoformat(timespec='seconds'),
+        }
+
+    print(f"🔌 Подключение к базе данных {urlsplit(url).hostname}...")
+    conn = connect(url, args)
+    try:
+        total = print_summary(conn, where)
+        if args.dry_run or not total:
+            return True
+
+        action = 'архивировать' if args.archive_only else ('удалить БЕЗ архива' if not state['archive'] else 'архивировать и удалить')
+        if not args.yes:
+            print(f"\n⚠️  ВНИМАНИЕ: Вы собираетесь {action} до {total} заявок!")
+            confirm = input("Продолжить? (yes/no): ").strip().lower()
+            if confirm not in ['yes', 'y', 'да', 'д']:
+                print("❌ Отменено")
+                return False
+
+        archive = None
+        if state['archive']:
+            Path(state['archive']).parent.mkdir(parents=True, exist_ok=True)
+            archive_file = Path(state['archive'])
+            if archive_file.exists():
+                size = archive_file.stat().st_size
+                good = complete_gzip_length(archive_file)
+                if good < size:
+                    print(f"✂️  Отрезаем недописанный хвост архива: {size - good} Б")
+                    os.truncate(archive_file, good)
+            # Пачки дописываются отдельными gzip member - файл читается zcat/gzip как единое целое
+            archive = open(archive_file, 'ab')
+            print(f"📦 Архив: {state['archive']}")
+        # Checkpoint лежит в каталоге архивов и при --no-archive
+        checkpoint_path.parent.mkdir(parents=True, exist_ok=True)
+        save_checkpoint(checkpoint_path, state)
+
+        batch_size = args.batch_size
+        # Сначала проход по ID, затем круги повторов строк, которые были заняты приложением
+        rounds_done = 0
+        round_left = 0  # сколько строк в начале state['skipped'] относится к текущему кругу
+        try:
+            while True:
+                retrying = state['last_id'] is None
+                if retrying:
+                    if not state['skipped']:
+                        break
+                    if round_left == 0:
+                        if rounds_done >= args.locked_retries:
+                            break
+                        if rounds_done:
+                            # Ждем, пока приложение отпустит строки
+                            print(f"  ⏸️  Заняты приложением: {len(state['skipped'])} заявок, "
+                                  f"повтор {rounds_done + 1}/{args.locked_retries}")
+                            time.sleep(max(args.sleep * 5, 1))
+                        rounds_done += 1
+                        round_left = len(state['skipped'])
+                    retry_ids = state['skipped'][:min(batch_size, round_left)]
+                wait_for_capacity(conn, args.max_active)
+                started = time.monotonic()
+                try:
+                    candidates, ids, skipped, written = process_batch(
+                        conn, where, batch_size, archive,
+                        write_header=state['processed'] == 0, archive_only=state['archive_only'],
+                        last_id=state['last_id'], only_ids=retry_ids if retrying else None,
+                    )
+                except (psycopg2.errors.LockNotAvailable, psycopg2.errors.QueryCanceled) as e:
+                    conn.rollback()
+                    batch_size = max(args.min_batch_size, batch_size // 2)
+                    print(f"  ⚠️  {e.__class__.__name__}: уменьшаем пачку до {batch_size} и повторяем")
+                    time.sleep(args.sleep * 5 or 1)
+                    continue
+
+                if retrying:
+                    # Обработанные и исчезнувшие убираем, снова занятые - в следующий круг
+                    state['skipped'] = state['skipped'][len(retry_ids):] + skipped
+                    round_left -= len(retry_ids)
+                elif candidates:
+                    state['last_id'] = candidates[-1]
+                    state['skipped'] += skipped
+                else:
+                    # Проход по ID закончен
+                    state['last_id'] = None
+                    save_checkpoint(checkpoint_path, state)
+                    if state['skipped']:
+                        print(f"  🔁 Повторяем заявки, занятые приложением: {len(state['skipped'])}")
+                    continue
+
+                elapsed = time.monotonic() - started
+                state['processed'] += len(ids)
+                save_checkpoint(checkpoint_path, state)
+                if ids:
+                    print(f"  ✅ {len(ids)} заявок (ID {ids[0]}..{ids[-1]}), {elapsed:.2f} с, CSV +{written} Б, всего {state['processed']}")
+                if skipped and not retrying:
+                    print(f"  ⏭️  Заняты приложением, повторим в конце: {skipped}")
+
+                # Медленная пачка - уменьшаем размер, быстрая - возвращаем к заданному
+                if elapsed > args.max_batch_seconds:
+                    batch_size = max(args.min_batch_size, batch_size // 2)
+                elif batch_size < args.batch_size:
+                    batch_size = min(args.batch_size, batch_size * 2)
+                time.sleep(args.sleep)
+        finally:
+            if archive is not None:
+                archive.close()
+
+        if state['skipped']:
+            save_checkpoint(checkpoint_path, state)
+            print(f"\n⚠️  Обработано заявок: {state['processed']}, но {len(state['skipped'])} так и остались заняты "
+                  f"приложением: {state['skipped'][:20]}{' ...' if len(state['skipped']) > 20 else ''}")
+            print(f"   Повторить: python {Path(__file__).name} --resume {archive_path} <те же фильтры>")
+            return False
+
+        state['finished_at'] = datetime.now().isoformat(timespec='seconds')
+        save_checkpoint(checkpoint_path, state)
+        print(f"\n✅ Обработано заявок: {state['processed']}")
+        if state['archive']:
+            print(f"📦 Архив: {state['archive']}")
+        print(f"📝 Checkpoint: {checkpoint_path}")
+        return True
+    except psycopg2.Error as e:
+        conn.rollback()
+        print(f"❌ Ошибка базы данных: {e}")
+        print(f"   Продолжить: python {Path(__file__).name} --resume {archive_path} <те же фильтры>")
+        return False
+    finally:
+        conn.close()
+        print("\n🔌 Соединение с базой данных закрыто")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Архивация и удаление заявок пачками')
+    filters = parser.add_argument_group('фильтры (объединяются через AND)')
+    filters.add_argument('--ids', nargs='+', type=int, help='ID заявок (через пробел)')
+    filters.add_argument('--min-id', type=int, help='Минимальный ID (включительно)')
+    filters.add_argument('--max-id', type=int, help='Максимальный ID (включительно)')
+    filters.add_argument('--older-than-days', type=int, help='Созданные раньше, чем N дней назад')
+    filters.add_argument('--status', nargs='+', help='Статусы (completed rejected ...)')
+    filters.add_argument('--type', choices=['deposit', 'withdraw'], help='Тип заявки')
+
+    parser.add_argument('--dry-run', action='store_true', help='Только показать, что будет обработано')
+    parser.add_argument('--yes', '--auto', action='store_true', help='Без интерактивного подтверждения')
+    parser.add_argument('--archive-only', action='store_true', help='Только выгрузить в архив, не удалять')
+    parser.add_argument('--no-archive', action='store_true', help='Удалять без архива')
+    parser.add_argument('--archive-dir', default=str(DEFAULT_ARCHIVE_DIR), help='Каталог для архивов')
+    parser.add_argument('--resume', metavar='ARCHIVE', help='Продолжить прерванный запуск по файлу архива')
+
+    throttle = parser.add_argument_group('нагрузка на БД')
+    throttle.add_argument('--batch-size', type=int, default=200, help='Строк в одной транзакции (пачка архива держится в памяти: в photo_file_url лежат фото чеков)')
+    throttle.add_argument('--min-batch-size', type=int, default=50, help='Минимальный размер пачки при замедлении')
+    throttle.add_argument('--sleep', type=float, default=0.2, help='Пауза между пачками, секунд')
+    throttle.add_argument('--max-batch-seconds', type=float, default=2.0, help='Пачка дольше - уменьшаем размер')
+    throttle.add_argument('--max-active', type=int, default=20, help='Ждать, если активных запросов в БД больше (0 - не проверять)')
+    throttle.add_argument('--statement-timeout', type=int, default=30, help='statement_timeout, секунд')
+    throttle.add_argument('--lock-timeout', type=int, default=3, help='lock_timeout, секунд')
+    throttle.add_argument('--locked-retries', type=int, default=5, help='Сколько раз повторять строки, занятые приложением')
+
+    args = parser.parse_args()
+    if args.archive_only and args.no_archive:
+        parser.error('--archive-only и --no-archive несовместимы')
+
+    print("=" * 80)
+    print("🗄️  АРХИВАЦИЯ И УДАЛЕНИЕ ЗАЯВОК")
+    print("=" * 80)
+
+    success = run(args)
+
+    print("\n" + "=" * 80)
+    print("✅ Скрипт завершен успешно" if success else "⚠️  Скрипт завершен с ошибками")
+    print("=" * 80)
+    return 0 if success else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
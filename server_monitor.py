@@ -1,39 +1,460 @@
 #!/usr/bin/env python3
 """
-Server Monitor - мониторинг сервера
+Server Monitor - мониторинг процессов PM2
+
+Для каждого приложения из ecosystem.config.js (по данным `pm2 jlist` и /proc):
+- CPU %, RSS (вместе с дочерними процессами: npm -> next, gunicorn -> воркеры), открытые FD
+- heartbeat и задержка event loop ботов из <cwd>/metrics/<script>.json (telegram_bot/metrics.py)
+- компактный ring buffer на диске (фиксированный размер, бинарные записи) на каждое приложение
+- тренд RSS: скорость роста (МБ/ч) и прогноз времени до max_memory_restart
+- алерты в Telegram через ADMIN_BOT_TOKEN / ADMIN_IDS (admin/.env) с антиспамом
+
+Скрипт только читает данные, ничего не перезапускает.
 """
 
+import argparse
+import asyncio
+import json
+import logging
+import os
+import re
+import struct
+import time
+import urllib.parse
+import urllib.request
+from datetime import datetime
+from pathlib import Path
+
 # ASCII логотип для вывода в консоль
 # Замените содержимое на свой ASCII-арт
 ASCII_LOGO = """
- ███████████   ███                                        
-▒▒███▒▒▒▒▒███ ▒▒▒                                         
- ▒███    ▒███ ████  ████████    ███████  ██████           
- ▒██████████ ▒▒███ ▒▒███▒▒███  ███▒▒███ ███▒▒███          
- ▒███▒▒▒▒▒███ ▒███  ▒███ ▒███ ▒███ ▒███▒███ ▒███          
- ▒███    ▒███ ▒███  ▒███ ▒███ ▒███ ▒███▒███ ▒███          
- ███████████  █████ ████ █████▒▒███████▒▒██████           
-▒▒▒▒▒▒▒▒▒▒▒  ▒▒▒▒▒ ▒▒▒▒ ▒▒▒▒▒  ▒▒▒▒▒███ ▒▒▒▒▒▒            
-                               ███ ▒███                   
-                              ▒▒██████                    
-                               ▒▒▒▒▒▒                     
+ ███████████   ███
+▒▒███▒▒▒▒▒███ ▒▒▒
+ ▒███    ▒███ ████  ████████    ███████  ██████
+ ▒██████████ ▒▒███ ▒▒███▒▒███  ███▒▒███ ███▒▒███
+ ▒███▒▒▒▒▒███ ▒███  ▒███ ▒███ ▒███ ▒███▒███ ▒███
+ ▒███    ▒███ ▒███  ▒███ ▒███ ▒███ ▒███▒███ ▒███
+ ███████████  █████ ████ █████▒▒███████▒▒██████
+▒▒▒▒▒▒▒▒▒▒▒  ▒▒▒▒▒ ▒▒▒▒ ▒▒▒▒▒  ▒▒▒▒▒███ ▒▒▒▒▒▒
+                               ███ ▒███
+                              ▒▒██████
+                               ▒▒▒▒▒▒
  █████   ████    ███████    ███████████ █████ █████   ████
-▒▒███   ███▒   ███▒▒▒▒▒███ ▒█▒▒▒███▒▒▒█▒▒███ ▒▒███   ███▒ 
- ▒███  ███    ███     ▒▒███▒   ▒███  ▒  ▒███  ▒███  ███   
- ▒███████    ▒███      ▒███    ▒███     ▒███  ▒███████    
- ▒███▒▒███   ▒███      ▒███    ▒███     ▒███  ▒███▒▒███   
- ▒███ ▒▒███  ▒▒███     ███     ▒███     ▒███  ▒███ ▒▒███  
+▒▒███   ███▒   ███▒▒▒▒▒███ ▒█▒▒▒███▒▒▒█▒▒███ ▒▒███   ███▒
+ ▒███  ███    ███     ▒▒███▒   ▒███  ▒  ▒███  ▒███  ███
+ ▒███████    ▒███      ▒███    ▒███     ▒███  ▒███████
+ ▒███▒▒███   ▒███      ▒███    ▒███     ▒███  ▒███▒▒███
+ ▒███ ▒▒███  ▒▒███     ███     ▒███     ▒███  ▒███ ▒▒███
  █████ ▒▒████ ▒▒▒███████▒      █████    █████ █████ ▒▒████
-▒▒▒▒▒   ▒▒▒▒    ▒▒▒▒▒▒▒       ▒▒▒▒▒    ▒▒▒▒▒ ▒▒▒▒▒   ▒▒▒▒ 
+▒▒▒▒▒   ▒▒▒▒    ▒▒▒▒▒▒▒       ▒▒▒▒▒    ▒▒▒▒▒ ▒▒▒▒▒   ▒▒▒▒
 """
 
+ROOT_DIR = Path(__file__).resolve().parent
+ECOSYSTEM_PATH = ROOT_DIR / 'ecosystem.config.js'
+
+CLK_TCK = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+# Пороги алертов
+RSS_WARN_RATIO = 0.85           # RSS >= 85% от max_memory_restart
+RSS_ETA_WARN_SECONDS = 3600     # при текущем росте лимит будет достигнут меньше чем за час
+TREND_WINDOW_SECONDS = 1800     # окно для оценки тренда RSS
+CPU_WARN_PERCENT = 90.0
+FD_WARN = 800
+LOOP_LAG_WARN_MS = 500.0
+HEARTBEAT_STALE_SECONDS = 90
+ALERT_COOLDOWN_SECONDS = 1800
+
+logger = logging.getLogger('server_monitor')
+
+
 def print_logo():
     """Выводит ASCII логотип в консоль"""
     print(ASCII_LOGO)
     print()
 
-# Выводим логотип при запуске
-if __name__ == '__main__':
+
+def load_env():
+    """ADMIN_BOT_TOKEN / ADMIN_IDS из admin/.env (без зависимости от python-dotenv)"""
+    env_path = ROOT_DIR / 'admin' / '.env'
+    if not env_path.exists():
+        return
+    for line in env_path.read_text(encoding='utf-8').splitlines():
+        line = line.strip()
+        if not line or line.startswith('#') or '=' not in line:
+            continue
+        key, value = line.split('=', 1)
+        os.environ.setdefault(key.strip(), value.strip().strip('"').strip("'"))
+
+
+def parse_memory(value) -> int:
+    """'300M' -> байты (формат max_memory_restart в PM2)"""
+    if value is None:
+        return 0
+    if isinstance(value, (int, float)):
+        return int(value)
+    match = re.match(r'^\s*(\d+(?:\.\d+)?)\s*([KMG]?)B?\s*$', str(value), re.IGNORECASE)
+    if not match:
+        return 0
+    number, unit = float(match.group(1)), match.group(2).upper()
+    return int(number * {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}[unit])
+
+
+def load_ecosystem_apps(path: Path) -> dict:
+    """
+    Имена приложений и max_memory_restart из ecosystem.config.js.
+    Файл - JS, поэтому разбираем блоки приложений регулярками (формат у нас фиксированный).
+    """
+    apps = {}
+    if not path.exists():
+        return apps
+    text = path.read_text(encoding='utf-8')
+    blocks = re.split(r"\n\s*\{\s*\n", text)
+    for block in blocks:
+        name = re.search(r"name:\s*['\"]([^'\"]+)['\"]", block)
+        if not name:
+            continue
+        limit = re.search(r"max_memory_restart:\s*['\"]([^'\"]+)['\"]", block)
+        apps[name.group(1)] = {'max_memory': parse_memory(limit.group(1)) if limit else 0}
+    return apps
+
+
+# ---------------------------------------------------------------------------
+# Ring buffer на диске
+# ---------------------------------------------------------------------------
+
+class RingBuffer:
+    """
+    Файл фиксированного размера: заголовок + capacity записей.
+    Запись: ts (double), cpu % (float), rss байт (uint64), fds (uint32), loop lag мс (float)
+    """
+
+    HEADER = struct.Struct('<4sIII')     # magic, version, capacity, записано всего (по модулю 2^32)
+    RECORD = struct.Struct('<dfQIf')
+    MAGIC = b'BGRB'
+    VERSION = 1
+
+    def __init__(self, path: Path, capacity: int):
+        self.path = path
+        self.capacity = capacity
+        self.total = 0
+        path.parent.mkdir(parents=True, exist_ok=True)
+        size = self.HEADER.size + self.RECORD.size * capacity
+        if path.exists() and path.stat().st_size == size:
+            with open(path, 'rb') as f:
+                magic, version, cap, total = self.HEADER.unpack(f.read(self.HEADER.size))
+            if magic == self.MAGIC and version == self.VERSION and cap == capacity:
+                self.total = total
+                return
+        # Новый файл (или другой capacity) - создаем заново
+        with open(path, 'wb') as f:
+            f.write(self.HEADER.pack(self.MAGIC, self.VERSION, capacity, 0))
+            f.truncate(size)
+
+    def append(self, ts: float, cpu: float, rss: int, fds: int, loop_lag: float):
+        index = self.total % self.capacity
+        with open(self.path, 'r+b') as f:
+            f.seek(self.HEADER.size + index * self.RECORD.size)
+            f.write(self.RECORD.pack(ts, cpu, rss, fds, loop_lag))
+            self.total = (self.total + 1) & 0xFFFFFFFF
+            f.seek(0)
+            f.write(self.HEADER.pack(self.MAGIC, self.VERSION, self.capacity, self.total))
+
+    def tail(self, count: int = None) -> list:
+        """Последние записи в хронологическом порядке: [(ts, cpu, rss, fds, lag), ...]"""
+        stored = min(self.total, self.capacity)
+        count = stored if count is None else min(count, stored)
+        if count == 0:
+            return []
+        with open(self.path, 'rb') as f:
+            f.seek(self.HEADER.size)
+            raw = f.read(self.RECORD.size * self.capacity)
+        records = []
+        for i in range(self.total - count, self.total):
+            offset = (i % self.capacity) * self.RECORD.size
+            records.append(self.RECORD.unpack_from(raw, offset))
+        return records
+
+
+def rss_trend(records: list, now: float):
+    """Скорость роста RSS (байт/сек) по МНК за TREND_WINDOW_SECONDS, None если данных мало"""
+    points = [(ts, rss) for ts, _, rss, _, _ in records if now - ts <= TREND_WINDOW_SECONDS and rss > 0]
+    if len(points) < 5 or points[-1][0] - points[0][0] < 300:
+        return None
+    n = len(points)
+    mean_t = sum(t for t, _ in points) / n
+    mean_r = sum(r for _, r in points) / n
+    denom = sum((t - mean_t) ** 2 for t, _ in points)
+    if denom == 0:
+        return None
+    return sum((t - mean_t) * (r - mean_r) for t, r in points) / denom
+
+
+# ---------------------------------------------------------------------------
+# /proc
+# ---------------------------------------------------------------------------
+
+def _children_map() -> dict:
+    """ppid -> [pid] по всем процессам"""
+    children = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat', 'rb') as f:
+                stat = f.read().decode('utf-8', 'replace')
+            ppid = int(stat.rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    return children
+
+
+def _process_tree(pid: int, children: dict) -> list:
+    pids, stack = [], [pid]
+    while stack:
+        current = stack.pop()
+        pids.append(current)
+        stack.extend(children.get(current, []))
+    return pids
+
+
+def _read_proc(pid: int):
+    """(cpu_ticks, rss_bytes, fds) процесса или None, если он уже завершился"""
+    try:
+        with open(f'/proc/{pid}/stat', 'rb') as f:
+            fields = f.read().decode('utf-8', 'replace').rsplit(')', 1)[1].split()
+        # после ')' : state(0) ppid(1) ... utime(11) stime(12)
+        ticks = int(fields[11]) + int(fields[12])
+        with open(f'/proc/{pid}/statm') as f:
+            rss = int(f.read().split()[1]) * PAGE_SIZE
+        try:
+            fds = len(os.listdir(f'/proc/{pid}/fd'))
+        except PermissionError:
+            fds = 0
+        return ticks, rss, fds
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def sample_tree(pid: int, children: dict):
+    """Суммарные cpu_ticks, RSS и FD по процессу и всем его потомкам"""
+    ticks = rss = fds = 0
+    alive = False
+    for p in _process_tree(pid, children):
+        data = _read_proc(p)
+        if data:
+            alive = True
+            ticks += data[0]
+            rss += data[1]
+            fds += data[2]
+    return (ticks, rss, fds) if alive else None
+
+
+# ---------------------------------------------------------------------------
+# Монитор
+# ---------------------------------------------------------------------------
+
+class Monitor:
+    def __init__(self, args):
+        self.args = args
+        self.apps = load_ecosystem_apps(ECOSYSTEM_PATH)
+        self.data_dir = Path(args.data_dir)
+        self.buffers = {}
+        self.prev_ticks = {}   # name -> (pid, ticks, monotonic)
+        self.alerted = {}      # (name, kind) -> ts последнего алерта
+        self.checks = 0
+        self.started_at = datetime.now()
+        self.token = os.getenv('ADMIN_BOT_TOKEN')
+        self.admin_ids = [int(i.strip()) for i in os.getenv('ADMIN_IDS', '').split(',') if i.strip().isdigit()]
+
+    async def pm2_processes(self) -> list:
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                'pm2', 'jlist', stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL
+            )
+            stdout, _ = await asyncio.wait_for(proc.communicate(), timeout=20)
+        except (FileNotFoundError, asyncio.TimeoutError) as e:
+            logger.error(f"❌ pm2 jlist failed: {e}")
+            return []
+        try:
+            # pm2 иногда печатает предупреждения перед JSON
+            text = stdout.decode('utf-8', 'replace')
+            return json.loads(text[text.index('['):])
+        except ValueError as e:
+            logger.error(f"❌ Could not parse pm2 jlist: {e}")
+            return []
+
+    def buffer(self, name: str) -> RingBuffer:
+        if name not in self.buffers:
+            safe = re.sub(r'[^A-Za-z0-9_.-]', '_', name)
+            self.buffers[name] = RingBuffer(self.data_dir / f'{safe}.ring', self.args.ring_size)
+        return self.buffers[name]
+
+    @staticmethod
+    def read_metrics(pm2_env: dict):
+        """Файл метрик бота (telegram_bot/metrics.py), если он есть"""
+        cwd = pm2_env.get('pm_cwd')
+        script = pm2_env.get('pm_exec_path')
+        if not cwd or not script:
+            return None
+        path = Path(cwd) / 'metrics' / f'{Path(script).stem}.json'
+        try:
+            return json.loads(path.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            return None
+
+    async def check(self):
+        processes = await self.pm2_processes()
+        children = await asyncio.to_thread(_children_map)
+        now = time.time()
+        rows = []
+        for proc in processes:
+            name = proc.get('name')
+            if self.apps and name not in self.apps:
+                continue
+            env = proc.get('pm2_env', {})
+            status = env.get('status')
+            pid = proc.get('pid') or 0
+            max_memory = (self.apps.get(name) or {}).get('max_memory') or parse_memory(env.get('max_memory_restart'))
+
+            if status != 'online' or not pid:
+                self.alert(name, 'status', f"🔴 {name}: статус {status}")
+                rows.append((name, status, None, None, None, None, max_memory))
+                continue
+
+            sample = await asyncio.to_thread(sample_tree, pid, children)
+            if sample is None:
+                continue
+            ticks, rss, fds = sample
+            cpu = 0.0
+            prev = self.prev_ticks.get(name)
+            mono = time.monotonic()
+            if prev and prev[0] == pid and mono > prev[2]:
+                cpu = max(0.0, (ticks - prev[1]) / CLK_TCK / (mono - prev[2]) * 100)
+            self.prev_ticks[name] = (pid, ticks, mono)
+
+            metrics = self.read_metrics(env)
+            loop_lag = -1.0
+            if metrics:
+                gauges = metrics.get('gauges', {})
+                loop_lag = float(gauges.get('loop_lag_max_ms', gauges.get('loop_lag_ms', -1.0)))
+                age = now - float(metrics.get('ts', 0))
+                if metrics.get('pid') == pid and age > HEARTBEAT_STALE_SECONDS:
+                    self.alert(name, 'heartbeat', f"💤 {name}: нет heartbeat {int(age)} с (event loop завис?)")
+                if loop_lag >= LOOP_LAG_WARN_MS:
+                    self.alert(name, 'loop_lag', f"🐢 {name}: задержка event loop {loop_lag:.0f} мс")
+
+            ring = self.buffer(name)
+            await asyncio.to_thread(ring.append, now, cpu, rss, fds, loop_lag)
+
+            # Тренды и пороги
+            if max_memory:
+                if rss >= max_memory * RSS_WARN_RATIO:
+                    self.alert(name, 'rss', f"🧠 {name}: RSS {rss / 1024 ** 2:.0f} МБ из {max_memory / 1024 ** 2:.0f} МБ (max_memory_restart)")
+                slope = rss_trend(await asyncio.to_thread(ring.tail), now)
+                if slope and slope > 0:
+                    eta = (max_memory - rss) / slope
+                    if 0 < eta < RSS_ETA_WARN_SECONDS:
+                        self.alert(
+                            name, 'rss_trend',
+                            f"📈 {name}: RSS растет на {slope * 3600 / 1024 ** 2:.1f} МБ/ч, "
+                            f"до перезапуска PM2 ~{eta / 60:.0f} мин ({rss / 1024 ** 2:.0f}/{max_memory / 1024 ** 2:.0f} МБ)"
+                        )
+            if cpu >= CPU_WARN_PERCENT:
+                self.alert(name, 'cpu', f"🔥 {name}: CPU {cpu:.0f}%")
+            if fds >= FD_WARN:
+                self.alert(name, 'fds', f"📂 {name}: открыто {fds} файловых дескрипторов")
+
+            rows.append((name, status, cpu, rss, fds, loop_lag, max_memory))
+
+        self.checks += 1
+        self.report(rows)
+
+    def report(self, rows):
+        logger.info(f"📊 Проверка #{self.checks}: {len(rows)} приложений")
+        for name, status, cpu, rss, fds, lag, max_memory in rows:
+            if cpu is None:
+                logger.info(f"  {name:<22} {status}")
+                continue
+            limit = f"/{max_memory / 1024 ** 2:.0f}" if max_memory else ''
+            lag_text = f" | lag {lag:.0f} мс" if lag >= 0 else ''
+            logger.info(f"  {name:<22} CPU {cpu:5.1f}% | RSS {rss / 1024 ** 2:6.1f}{limit} МБ | FD {fds:4d}{lag_text}")
+
+        if self.args.stats_file:
+            stats = {
+                'started_at': self.started_at.isoformat(timespec='seconds'),
+                'last_check': datetime.now().isoformat(timespec='seconds'),
+                'checks': self.checks,
+                'apps': {
+                    name: {'status': status, 'cpu': cpu, 'rss': rss, 'fds': fds, 'loop_lag_ms': lag}
+                    for name, status, cpu, rss, fds, lag, _ in rows
+                },
+            }
+            Path(self.args.stats_file).write_text(json.dumps(stats, indent=2, ensure_ascii=False), encoding='utf-8')
+
+    def alert(self, name: str, kind: str, text: str):
+        key = (name, kind)
+        now = time.time()
+        if now - self.alerted.get(key, 0) < ALERT_COOLDOWN_SECONDS:
+            return
+        self.alerted[key] = now
+        logger.warning(text)
+        if self.args.no_alerts or not self.token or not self.admin_ids:
+            return
+        asyncio.get_running_loop().create_task(asyncio.to_thread(self._send_telegram, text))
+
+    def _send_telegram(self, text: str):
+        for admin_id in self.admin_ids:
+            body = urllib.parse.urlencode({'chat_id': admin_id, 'text': f"🖥 Server monitor\n{text}"}).encode()
+            try:
+                urllib.request.urlopen(
+                    f'https://api.telegram.org/bot{self.token}/sendMessage', data=body, timeout=10
+                ).close()
+            except Exception as e:
+                logger.error(f"❌ Telegram alert failed for {admin_id}: {e}")
+
+    async def run(self):
+        logger.info(f"Server monitor started: {len(self.apps)} apps from {ECOSYSTEM_PATH.name}, interval {self.args.interval}s")
+        if not self.token or not self.admin_ids:
+            logger.warning("ADMIN_BOT_TOKEN / ADMIN_IDS не заданы - алерты только в лог")
+        while True:
+            started = time.monotonic()
+            try:
+                await self.check()
+            except Exception as e:
+                logger.error(f"❌ Check failed: {e}", exc_info=True)
+            if self.args.once:
+                # Даем отправиться алертам
+                await asyncio.sleep(2)
+                return
+            await asyncio.sleep(max(1.0, self.args.interval - (time.monotonic() - started)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Мониторинг PM2 приложений')
+    parser.add_argument('--interval', type=int, default=30, help='Интервал проверок, секунд')
+    parser.add_argument('--log-file', default='server_activity.log', help='Файл лога')
+    parser.add_argument('--stats-file', default='server_stats.json', help='JSON с последними значениями')
+    parser.add_argument('--data-dir', default=str(ROOT_DIR / 'monitor_data'), help='Каталог ring buffer файлов')
+    parser.add_argument('--ring-size', type=int, default=2880, help='Записей на приложение (2880 x 30 с = сутки)')
+    parser.add_argument('--no-alerts', action='store_true', help='Не отправлять алерты в Telegram')
+    parser.add_argument('--once', action='store_true', help='Одна проверка и выход')
+    args = parser.parse_args()
+
+    handlers = [logging.StreamHandler()]
+    if args.log_file:
+        handlers.append(logging.FileHandler(args.log_file, encoding='utf-8'))
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s', handlers=handlers)
+
+    load_env()
     print_logo()
-    print("Server monitor started...")
+    try:
+        asyncio.run(Monitor(args).run())
+    except KeyboardInterrupt:
+        logger.info("Server monitor stopped")
 
+
+# Выводим логотип при запуске
+if __name__ == '__main__':
+    main()
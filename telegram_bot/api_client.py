@@ -2,6 +2,9 @@ import aiohttp
 import asyncio
 import ssl
 from config import Config
+import bulkhead
+import latency
+from api_models import DecodeError, PaymentSettings, PendingRequest, PlayerCheck, QRResult, UniqueAmount, read as read_model
 from typing import Optional, Dict, Any
 
 # Отключаем проверку SSL для внутренних запросов
@@ -42,6 +45,72 @@ class APIClient:
         except Exception as e:
             return {'success': False, 'message': default_message, 'error': str(e)}
 
+    @staticmethod
+    async def _post_model(path: str, data: Dict[str, Any], model, local_timeout: float = 5, fallback_timeout: float = 10):
+        """
+        POST с ответом в модель (api_models): сначала локальный API, при недоступности
+        или не-JSON ответе - продакшн. Ошибки возвращаются как model.failed(...).
+        """
+        import logging
+        logger = logging.getLogger(__name__)
+        
+        connector = aiohttp.TCPConnector(ssl=ssl_context)
+        async with aiohttp.ClientSession(connector=connector) as session:
+            # Пробуем сначала локальный API, если не доступен - используем продакшн
+            api_url = Config.API_BASE_URL
+            if api_url.startswith('http://localhost'):
+                try:
+                    async with session.post(
+                        f'{api_url}{path}',
+                        json=data,
+                        timeout=aiohttp.ClientTimeout(total=local_timeout)
+                    ) as response:
+                        return await read_model(response, model)
+                except Exception as e:
+                    logger.warning(f"[API] {path} local API failed: {e}, trying fallback")
+                    api_url = Config.API_FALLBACK_URL
+            
+            try:
+                async with session.post(
+                    f'{api_url}{path}',
+                    json=data,
+                    timeout=aiohttp.ClientTimeout(total=fallback_timeout)
+                ) as response:
+                    return await read_model(response, model)
+            except DecodeError as e:
+                return model.failed(str(e))
+            except Exception as e:
+                return model.failed(str(e) or type(e).__name__)
+
+    @staticmethod
+    async def _hedged_read(name: str, method: str, path: str, parse, default_timeout: float, **kwargs):
+        """
+        Идемпотентное чтение: запрос в локальный API, при задержке дольше p95 -
+        параллельный запрос на fallback URL (см. latency.py), берется первый ответ.
+        parse(response) возвращает результат или бросает исключение (ответ не годится).
+        """
+        primary_url = Config.API_BASE_URL
+        # Если API уже удаленный, второй запрос идет на тот же URL
+        secondary_url = Config.API_FALLBACK_URL if primary_url.startswith('http://localhost') else primary_url
+        connector = aiohttp.TCPConnector(ssl=ssl_context)
+        async with aiohttp.ClientSession(connector=connector) as session:
+            async def call(api_url):
+                key = latency.endpoint_key(name, api_url)
+                with latency.measure(key):
+                    async with session.request(
+                        method,
+                        f'{api_url}{path}',
+                        timeout=aiohttp.ClientTimeout(total=latency.timeout(key, default_timeout)),
+                        **kwargs
+                    ) as response:
+                        return await parse(response)
+            
+            delay = latency.hedge_delay(
+                latency.endpoint_key(name, primary_url),
+                min(default_timeout, Config.LATENCY_HEDGE_DEFAULT_DELAY),
+            )
+            return await latency.hedged(lambda: call(primary_url), lambda: call(secondary_url), delay)
+
     @staticmethod
     async def create_request(
         telegram_user_id: str,
@@ -55,6 +124,7 @@ class APIClient:
         telegram_first_name: Optional[str] = None,
         telegram_last_name: Optional[str] = None,
         receipt_photo: Optional[str] = None,
+        receipt_hash: Optional[str] = None,
         withdrawal_code: Optional[str] = None,
         uncreated_request_id: Optional[str] = None,
         bot_type: Optional[str] = None,
@@ -88,6 +158,8 @@ class APIClient:
                 data['telegram_last_name'] = telegram_last_name
             if receipt_photo:
                 data['receipt_photo'] = receipt_photo
+            if receipt_hash:
+                data['receipt_hash'] = receipt_hash
             if withdrawal_code:
                 data['withdrawal_code'] = withdrawal_code
             if uncreated_request_id:
@@ -109,42 +181,19 @@ class APIClient:
                     # Если локальный недоступен, используем продакшн
                     api_url = Config.API_FALLBACK_URL
             
-            async with session.post(
-                f'{api_url}/payment',
-                json=data
-            ) as response:
-                return await APIClient._read_json_or_error(response, APIClient.DEFAULT_RETRY_MESSAGE)
+            # Раньше здесь не было таймаута: зависший API держал обработчик бесконечно
+            with latency.measure(latency.endpoint_key('create-request', api_url)):
+                async with session.post(
+                    f'{api_url}/payment',
+                    json=data,
+                    timeout=aiohttp.ClientTimeout(total=Config.API_CREATE_REQUEST_TIMEOUT, connect=10)
+                ) as response:
+                    return await APIClient._read_json_or_error(response, APIClient.DEFAULT_RETRY_MESSAGE)
     
     @staticmethod
-    async def generate_qr(amount: float, bank: str = 'omoney') -> Dict[str, Any]:
+    async def generate_qr(amount: float, bank: str = 'omoney') -> QRResult:
         """Генерировать QR hash и ссылки на банки"""
-        connector = aiohttp.TCPConnector(ssl=ssl_context)
-        async with aiohttp.ClientSession(connector=connector) as session:
-            # Пробуем сначала локальный API, если не доступен - используем продакшн
-            api_url = Config.API_BASE_URL
-            if api_url.startswith('http://localhost'):
-                try:
-                    async with session.post(
-                        f'{api_url}/public/generate-qr',
-                        json={'amount': amount, 'bank': bank},
-                        timeout=aiohttp.ClientTimeout(total=5)
-                    ) as response:
-                        # Используем безопасное чтение JSON с обработкой ошибок
-                        return await APIClient._read_json_or_error(response, 'Failed to generate QR code')
-                except Exception as e:
-                    # Если локальный недоступен, используем продакшн
-                    import logging
-                    logger = logging.getLogger(__name__)
-                    logger.warning(f"[Generate QR] Local API failed: {e}, trying fallback")
-                    api_url = Config.API_FALLBACK_URL
-            
-            async with session.post(
-                f'{api_url}/public/generate-qr',
-                json={'amount': amount, 'bank': bank},
-                timeout=aiohttp.ClientTimeout(total=10)
-            ) as response:
-                # Используем безопасное чтение JSON с обработкой ошибок
-                return await APIClient._read_json_or_error(response, 'Failed to generate QR code')
+        return await APIClient._post_model('/public/generate-qr', {'amount': amount, 'bank': bank}, QRResult)
 
     @staticmethod
     async def get_unique_amount(
@@ -154,40 +203,20 @@ class APIClient:
         bookmaker: str,
         bank: str = 'omoney',
         bot_type: Optional[str] = None,
-    ) -> Dict[str, Any]:
+    ) -> UniqueAmount:
         """Получить уникальную сумму с копейками (резервация на 10 минут)"""
-        connector = aiohttp.TCPConnector(ssl=ssl_context)
-        async with aiohttp.ClientSession(connector=connector) as session:
-            data = {
-                'userId': str(user_id),
-                'accountId': account_id,
-                'amount': amount,
-                'bookmaker': bookmaker,
-                'bank': bank,
-                'requestType': 'deposit',
-            }
-            if bot_type:
-                data['botType'] = bot_type
-            
-            # Пробуем сначала локальный API, если не доступен - используем продакшн
-            api_url = Config.API_BASE_URL
-            if api_url.startswith('http://localhost'):
-                try:
-                    async with session.post(
-                        f'{api_url}/public/unique-amount',
-                        json=data,
-                        timeout=aiohttp.ClientTimeout(total=5)
-                    ) as response:
-                        return await response.json()
-                except:
-                    # Если локальный недоступен, используем продакшн
-                    api_url = Config.API_FALLBACK_URL
-            
-            async with session.post(
-                f'{api_url}/public/unique-amount',
-                json=data
-            ) as response:
-                return await response.json()
+        data = {
+            'userId': str(user_id),
+            'accountId': account_id,
+            'amount': amount,
+            'bookmaker': bookmaker,
+            'bank': bank,
+            'requestType': 'deposit',
+        }
+        if bot_type:
+            data['botType'] = bot_type
+        
+        return await APIClient._post_model('/public/unique-amount', data, UniqueAmount)
     
     @staticmethod
     async def create_uncreated_request(
@@ -242,53 +271,58 @@ class APIClient:
     
     @staticmethod
     async def generate_qr_image(amount: float, bank: str = 'omoney') -> Dict[str, Any]:
-        """Генерировать QR код и получить изображение (base64)"""
+        """
+        Генерировать QR код и получить изображение.
+        
+        payment_site отдает в JSON только ссылку на PNG (qr_url), картинка скачивается
+        отдельным запросом сырыми байтами. Возвращает {'success': True, 'qr_png': bytes}.
+        """
         import logging
         logger = logging.getLogger(__name__)
         
+        async def fetch(session, payment_site_url):
+            async with session.post(
+                f'{payment_site_url}/api/generate-qr',
+                json={'amount': amount, 'bank': bank, 'image': 'url'},
+                timeout=aiohttp.ClientTimeout(total=10)
+            ) as response:
+                if response.status != 200:
+                    error_text = await response.text()
+                    logger.error(f"[QR Image] Error from payment site ({response.status}): {error_text}")
+                    return {'success': False, 'error': f'Server error: {response.status} - {error_text[:100]}'}
+                result = await response.json()
+            
+            qr_url = result.get('qr_url')
+            if not result.get('success') or not qr_url:
+                return {'success': False, 'error': result.get('error') or 'QR URL not found in response'}
+            
+            async with session.get(
+                f'{payment_site_url}{qr_url}',
+                timeout=aiohttp.ClientTimeout(total=10)
+            ) as response:
+                if response.status != 200 or response.content_type != 'image/png':
+                    return {'success': False, 'error': f'QR image error: {response.status} {response.content_type}'}
+                qr_png = await response.read()
+            logger.info(f"[QR Image] Success from payment site: {payment_site_url} ({len(qr_png)} bytes)")
+            return {'success': True, 'qr_png': qr_png}
+        
         connector = aiohttp.TCPConnector(ssl=ssl_context)
         async with aiohttp.ClientSession(connector=connector) as session:
-            # Используем payment_site API который возвращает готовое изображение
             payment_site_url = Config.PAYMENT_SITE_URL
             logger.info(f"[QR Image] Using payment site URL: {payment_site_url}")
             
             if 'localhost' in payment_site_url.lower():
                 # Для localhost пробуем сначала локальный, потом fallback
                 try:
-                    async with session.post(
-                        f'{payment_site_url}/api/generate-qr',
-                        json={'amount': amount, 'bank': bank},
-                        timeout=aiohttp.ClientTimeout(total=10)
-                    ) as response:
-                        if response.status == 200:
-                            result = await response.json()
-                            logger.info(f"[QR Image] Success from localhost: {payment_site_url}")
-                            return result
-                        else:
-                            error_text = await response.text()
-                            logger.error(f"[QR Image] Error from localhost ({response.status}): {error_text}")
-                            return {'success': False, 'error': f'Server error: {response.status}'}
+                    return await fetch(session, payment_site_url)
                 except asyncio.TimeoutError:
                     logger.error(f"[QR Image] Timeout connecting to localhost: {payment_site_url}")
-                    payment_site_url = Config.PAYMENT_FALLBACK_URL
                 except Exception as e:
                     logger.error(f"[QR Image] Error connecting to localhost: {e}")
-                    payment_site_url = Config.PAYMENT_FALLBACK_URL
+                payment_site_url = Config.PAYMENT_FALLBACK_URL
             
             try:
-                async with session.post(
-                    f'{payment_site_url}/api/generate-qr',
-                    json={'amount': amount, 'bank': bank},
-                    timeout=aiohttp.ClientTimeout(total=10)
-                ) as response:
-                    if response.status == 200:
-                        result = await response.json()
-                        logger.info(f"[QR Image] Success from payment site: {payment_site_url}")
-                        return result
-                    else:
-                        error_text = await response.text()
-                        logger.error(f"[QR Image] Error from payment site ({response.status}): {error_text}")
-                        return {'success': False, 'error': f'Server error: {response.status} - {error_text[:100]}'}
+                return await fetch(session, payment_site_url)
             except asyncio.TimeoutError:
                 logger.error(f"[QR Image] Timeout connecting to payment site: {payment_site_url}")
                 return {'success': False, 'error': 'Connection timeout'}
@@ -297,35 +331,22 @@ class APIClient:
                 return {'success': False, 'error': str(e)}
     
     @staticmethod
-    async def get_pending_request(telegram_user_id: str, request_type: str = 'deposit') -> Dict[str, Any]:
-        """Получить pending заявку для пользователя"""
-        connector = aiohttp.TCPConnector(ssl=ssl_context)
-        async with aiohttp.ClientSession(connector=connector) as session:
-            # Пробуем сначала локальный API, если не доступен - используем продакшн
-            api_url = Config.API_BASE_URL
-            if api_url.startswith('http://localhost'):
-                try:
-                    async with session.get(
-                        f'{api_url}/public/pending-request',
-                        params={'telegram_user_id': telegram_user_id, 'type': request_type},
-                        timeout=aiohttp.ClientTimeout(total=3)
-                    ) as response:
-                        return await response.json()
-                except:
-                    # Если локальный недоступен, используем продакшн
-                    api_url = Config.API_FALLBACK_URL
-            
-            async with session.get(
-                f'{api_url}/public/pending-request',
+    async def get_pending_request(telegram_user_id: str, request_type: str = 'deposit') -> PendingRequest:
+        """Получить pending заявку для пользователя (PendingRequest.found)"""
+        try:
+            return await APIClient._hedged_read(
+                'pending-request', 'GET', '/public/pending-request',
+                lambda response: read_model(response, PendingRequest), 3,
                 params={'telegram_user_id': telegram_user_id, 'type': request_type},
-                timeout=aiohttp.ClientTimeout(total=3)
-            ) as response:
-                return await response.json()
+            )
+        except Exception as e:
+            return PendingRequest.failed(str(e) or type(e).__name__)
     
     @staticmethod
     async def update_request(
         request_id: str,
         receipt_photo: Optional[str] = None,
+        receipt_hash: Optional[str] = None,
         status: Optional[str] = None,
         status_detail: Optional[str] = None,
         **kwargs
@@ -336,6 +357,8 @@ class APIClient:
             data = {}
             if receipt_photo is not None:
                 data['receipt_photo'] = receipt_photo
+            if receipt_hash is not None:
+                data['receipt_hash'] = receipt_hash
             if status is not None:
                 data['status'] = status
             if status_detail is not None:
@@ -371,95 +394,82 @@ class APIClient:
         async with aiohttp.ClientSession(connector=connector) as session:
             # Пробуем сначала локальный API, если не доступен - используем продакшн
             api_url = Config.API_BASE_URL
-            # Убираем /api из конца URL если есть, так как добавляем его в путь
-            if api_url.endswith('/api'):
-                api_url = api_url[:-4]
-            elif api_url.endswith('/api/'):
-                api_url = api_url[:-5]
+            payload = {'request_id': request_id, 'message_id': message_id}
+            headers = {'X-Bot-Token': Config.BOT_SERVICE_TOKEN}
             
             if api_url.startswith('http://localhost'):
                 try:
                     async with session.patch(
-                        f'{api_url}/api/requests/{request_id}/message-id',
-                        json={'message_id': message_id},
+                        f'{api_url}/public/request-message-id',
+                        json=payload,
+                        headers=headers,
                         timeout=aiohttp.ClientTimeout(total=3)
                     ) as response:
                         return await APIClient._read_json_or_error(response, APIClient.DEFAULT_RETRY_MESSAGE)
                 except:
                     # Если локальный недоступен, используем продакшн
                     api_url = Config.API_FALLBACK_URL
-                    if api_url.endswith('/api'):
-                        api_url = api_url[:-4]
-                    elif api_url.endswith('/api/'):
-                        api_url = api_url[:-5]
             
             async with session.patch(
-                f'{api_url}/api/requests/{request_id}/message-id',
-                json={'message_id': message_id},
+                f'{api_url}/public/request-message-id',
+                json=payload,
+                headers=headers,
                 timeout=aiohttp.ClientTimeout(total=3)
             ) as response:
                 return await APIClient._read_json_or_error(response, APIClient.DEFAULT_RETRY_MESSAGE)
     
     @staticmethod
-    async def get_payment_settings() -> Dict[str, Any]:
-        """Получить настройки платежей из админки"""
+    async def request_writes(writes: list) -> Dict[str, Any]:
+        """
+        Пачка мелких записей по заявкам (см. write_batcher.py).
+        
+        Returns:
+            {'success': True, 'data': {'results': [ответ на каждую запись]}};
+            status - HTTP статус ответа (404 - админка без пачек)
+        """
         connector = aiohttp.TCPConnector(ssl=ssl_context)
         async with aiohttp.ClientSession(connector=connector) as session:
-            try:
-                # Пробуем сначала локальный API, если не доступен - используем продакшн
-                api_url = Config.API_BASE_URL
-                if api_url.startswith('http://localhost'):
-                    try:
-                        # Прямой запрос с коротким таймаутом
-                        async with session.get(
-                            f'{api_url}/public/payment-settings',
-                            timeout=aiohttp.ClientTimeout(total=5)
-                        ) as response:
-                            if response.status == 200:
-                                # Проверяем Content-Type перед парсингом JSON
-                                content_type = response.headers.get('Content-Type', '')
-                                if 'application/json' in content_type:
-                                    try:
-                                        data = await response.json()
-                                        return data if data.get('success') else {}
-                                    except Exception as json_error:
-                                        # Если ошибка парсинга JSON, возвращаем пустой словарь
-                                        return {}
-                                else:
-                                    # Если не JSON, возвращаем пустой словарь
-                                    return {}
-                    except Exception as e:
-                        # Если локальный недоступен, используем fallback из конфига
-                        api_url = Config.API_FALLBACK_URL
-                
+            # Пробуем сначала локальный API, если не доступен - используем продакшн
+            api_url = Config.API_BASE_URL
+            if api_url.startswith('http://localhost'):
                 try:
-                    async with session.get(
-                        f'{api_url}/public/payment-settings',
+                    async with session.post(
+                        f'{api_url}/public/request-writes',
+                        json={'writes': writes},
+                        headers={'X-Bot-Token': Config.BOT_SERVICE_TOKEN},
                         timeout=aiohttp.ClientTimeout(total=10)
                     ) as response:
-                        # Проверяем Content-Type перед парсингом JSON
-                        content_type = response.headers.get('Content-Type', '')
-                        if 'application/json' in content_type:
-                            try:
-                                data = await response.json()
-                                return data if data.get('success') else {}
-                            except Exception as json_error:
-                                # Если ошибка парсинга JSON, возвращаем пустой словарь
-                                return {}
-                        else:
-                            # Если не JSON, возвращаем пустой словарь
-                            return {}
-                except Exception as e:
-                    # Если ошибка запроса, возвращаем пустой словарь
-                    return {}
-            except Exception as e:
-                # Логируем только критичные ошибки (не связанные с парсингом JSON)
-                # Ошибки парсинга JSON уже обработаны выше
-                if 'JSON' not in str(e) and 'mimetype' not in str(e).lower():
-                    import logging
-                    logger = logging.getLogger(__name__)
-                    logger.warning(f"⚠️ Error in get_payment_settings (non-JSON error): {e}")
-                return {}
+                        result = await APIClient._read_json_or_error(response, APIClient.DEFAULT_RETRY_MESSAGE)
+                        return {**result, 'status': response.status}
+                except Exception:
+                    # Если локальный недоступен, используем продакшн
+                    api_url = Config.API_FALLBACK_URL
+            
+            async with session.post(
+                f'{api_url}/public/request-writes',
+                json={'writes': writes},
+                headers={'X-Bot-Token': Config.BOT_SERVICE_TOKEN},
+                timeout=aiohttp.ClientTimeout(total=15)
+            ) as response:
+                result = await APIClient._read_json_or_error(response, APIClient.DEFAULT_RETRY_MESSAGE)
+                return {**result, 'status': response.status}
+    
+    @staticmethod
+    async def get_payment_settings() -> PaymentSettings:
+        """Получить настройки платежей из админки (при ошибке - настройки по умолчанию, success=False)"""
+        try:
+            # Не 200 и не JSON - ответ не годится, ждем второй endpoint
+            return await APIClient._hedged_read(
+                'payment-settings', 'GET', '/public/payment-settings',
+                lambda response: read_model(response, PaymentSettings, require_ok=True), 5,
+            )
+        except Exception as e:
+            # Логируем только критичные ошибки (не связанные с форматом ответа)
+            if not isinstance(e, DecodeError):
+                import logging
+                logger = logging.getLogger(__name__)
+                logger.warning(f"⚠️ Error in get_payment_settings (non-JSON error): {e}")
+            return PaymentSettings.failed(str(e) or type(e).__name__)
     
     @staticmethod
     def get_api_base_url() -> str:
@@ -470,74 +480,47 @@ class APIClient:
     async def check_blocked(telegram_user_id: str, account_id: Optional[str] = None) -> Dict[str, Any]:
         """Проверить, заблокирован ли пользователь или accountId"""
         default_response = {'success': True, 'data': {'blocked': False}}
-        connector = aiohttp.TCPConnector(ssl=ssl_context)
-        async with aiohttp.ClientSession(connector=connector) as session:
-            data = {
-                'userId': str(telegram_user_id),
-            }
-            
-            if account_id:
-                data['accountId'] = account_id
-            
-            # Пробуем сначала локальный API, если не доступен - используем продакшн
-            api_url = Config.API_BASE_URL
-            if api_url.startswith('http://localhost'):
-                try:
-                    async with session.post(
-                        f'{api_url}/public/check-blocked',
-                        json=data,
-                        timeout=aiohttp.ClientTimeout(total=2)
-                    ) as response:
-                        return await APIClient._read_json_or_default(response, default_response)
-                except Exception as e:
-                    # Если локальный недоступен, используем продакшн
-                    api_url = Config.API_FALLBACK_URL
-            
-            try:
-                async with session.post(
-                    f'{api_url}/public/check-blocked',
-                    json=data,
-                    timeout=aiohttp.ClientTimeout(total=5)
-                ) as response:
-                    return await APIClient._read_json_or_default(response, default_response)
-            except Exception as e:
-                # При любой ошибке считаем, что пользователь не заблокирован
-                return default_response
+        data = {
+            'userId': str(telegram_user_id),
+        }
+        
+        if account_id:
+            data['accountId'] = account_id
+        
+        async def parse(response):
+            return await APIClient._read_json_or_default(response, default_response)
+        
+        try:
+            return await APIClient._hedged_read('check-blocked', 'POST', '/public/check-blocked', parse, 2, json=data)
+        except Exception:
+            # При любой ошибке считаем, что пользователь не заблокирован
+            return default_response
     
     @staticmethod
-    async def check_player(bookmaker: str, account_id: str) -> Dict[str, Any]:
+    async def check_player(bookmaker: str, account_id: str) -> PlayerCheck:
         """Проверить существование игрока в казино"""
-        connector = aiohttp.TCPConnector(ssl=ssl_context)
-        async with aiohttp.ClientSession(connector=connector) as session:
-            data = {
-                'bookmaker': bookmaker,
-                'accountId': account_id,
-            }
-            
-            # Пробуем сначала локальный API, если не доступен - используем продакшн
-            api_url = Config.API_BASE_URL
-            if api_url.startswith('http://localhost'):
-                try:
-                    async with session.post(
-                        f'{api_url}/public/check-player',
-                        json=data,
-                        timeout=aiohttp.ClientTimeout(total=5)
-                    ) as response:
-                        return await response.json()
-                except:
-                    # Если локальный недоступен, используем продакшн
-                    api_url = Config.API_FALLBACK_URL
-            
-            async with session.post(
-                f'{api_url}/public/check-player',
-                json=data,
-                timeout=aiohttp.ClientTimeout(total=10)
-            ) as response:
-                return await response.json()
+        data = {
+            'bookmaker': bookmaker,
+            'accountId': account_id,
+        }
+        try:
+            async with bulkhead.guard(bookmaker):
+                return await APIClient._post_model('/public/check-player', data, PlayerCheck)
+        except bulkhead.BulkheadFull as e:
+            # Касса казино перегружена - проверку пропускаем, как при ошибке API
+            return PlayerCheck.failed(str(e))
     
     @staticmethod
     async def check_withdraw_amount(bookmaker: str, user_id: str, code: str) -> Dict[str, Any]:
-        """Проверить сумму вывода по коду"""
+        """Проверить сумму вывода по коду (не больше BULKHEAD_MAX_CONCURRENT запросов на букмекера)"""
+        try:
+            async with bulkhead.guard(bookmaker):
+                return await APIClient._check_withdraw_amount(bookmaker, user_id, code)
+        except bulkhead.BulkheadFull:
+            return {'success': False, 'error': 'Касса казино сейчас перегружена. Попробуйте через минуту.'}
+    
+    @staticmethod
+    async def _check_withdraw_amount(bookmaker: str, user_id: str, code: str) -> Dict[str, Any]:
         connector = aiohttp.TCPConnector(ssl=ssl_context)
         async with aiohttp.ClientSession(connector=connector) as session:
             data = {
@@ -713,6 +696,36 @@ class APIClient:
             ) as response:
                 return await APIClient._read_json_or_default(response, default_response)
 
-
-
-
+    @staticmethod
+    async def get_replica(since_ms: int = 0, settings_version: Optional[str] = None) -> Dict[str, Any]:
+        """Снимок (since_ms=0) или изменения настроек и блокировок для реплики (replica.py)"""
+        default_response = {'success': False, 'data': None}
+        params = {'since': str(since_ms)}
+        if settings_version:
+            params['settingsVersion'] = settings_version
+        # Полный снимок больше и собирается дольше, чем изменения
+        timeout = 30 if not since_ms else 5
+        connector = aiohttp.TCPConnector(ssl=ssl_context)
+        async with aiohttp.ClientSession(connector=connector) as session:
+            # Пробуем сначала локальный API, если не доступен - используем продакшн
+            api_url = Config.API_BASE_URL
+            if api_url.startswith('http://localhost'):
+                try:
+                    async with session.get(
+                        f'{api_url}/public/replica',
+                        params=params,
+                        timeout=aiohttp.ClientTimeout(total=timeout)
+                    ) as response:
+                        return await APIClient._read_json_or_default(response, default_response)
+                except Exception:
+                    api_url = Config.API_FALLBACK_URL
+            
+            try:
+                async with session.get(
+                    f'{api_url}/public/replica',
+                    params=params,
+                    timeout=aiohttp.ClientTimeout(total=timeout)
+                ) as response:
+                    return await APIClient._read_json_or_default(response, default_response)
+            except Exception as e:
+                return {'success': False, 'data': None, 'error': str(e)}
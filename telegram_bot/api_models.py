@@ -0,0 +1,323 @@
+"""
+Типизированные ответы API админки
+
+Раньше методы APIClient возвращали сырой dict из response.json(), каждый сам проверял
+Content-Type, а обработчики разбирали ответ цепочками .get(). Для основных endpoint'ов
+(настройки платежей, QR, уникальная сумма, pending заявка, проверка игрока) ответ
+теперь проходит один путь: тело -> JSON (orjson, если установлен) -> проверка формы ->
+объект со __slots__. Любая ошибка на этом пути дает объект с success=False и error,
+исключения наружу не выходят.
+"""
+
+import json
+from abc import ABC, abstractmethod
+from typing import Optional
+
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:  # без orjson - стандартный json
+    _loads = json.loads
+
+
+class DecodeError(ValueError):
+    """Ответ не JSON или не той формы"""
+
+
+def _dict(value, field: str) -> dict:
+    if value is None:
+        return {}
+    if not isinstance(value, dict):
+        raise DecodeError(f'{field}: expected object, got {type(value).__name__}')
+    return value
+
+
+def _str(value) -> Optional[str]:
+    if value is None or value == '':
+        return None
+    return str(value)
+
+
+class _Model(ABC):
+    """
+    База моделей. Публичная модель (имя без _) без from_payload / _from_data
+    не объявится вовсе, а не упадет на первом ответе API
+    """
+    __slots__ = ('success', 'error')
+
+    def __init__(self, success: bool = False, error: Optional[str] = None):
+        self.success = success
+        self.error = error
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if cls.__name__.startswith('_'):
+            return
+        missing = [name for name in dir(cls) if getattr(getattr(cls, name, None), '__isabstractmethod__', False)]
+        if missing:
+            raise TypeError(f'{cls.__name__} must implement {", ".join(missing)}')
+
+    @classmethod
+    def failed(cls, error: str):
+        return cls(success=False, error=error)
+
+    @classmethod
+    @abstractmethod
+    def from_payload(cls, payload: dict):
+        """JSON ответа (dict) -> модель. Бросает DecodeError"""
+
+    def __repr__(self):
+        fields = ', '.join(f'{name}={getattr(self, name)!r}' for name in self._fields())
+        return f'{type(self).__name__}({fields})'
+
+    @classmethod
+    def _fields(cls):
+        for klass in reversed(cls.__mro__):
+            yield from getattr(klass, '__slots__', ())
+
+
+class _DataModel(_Model):
+    """Ответ в формате createApiResponse: {success, data, error, message}"""
+    __slots__ = ()
+
+    @classmethod
+    def from_payload(cls, payload: dict):
+        if not payload.get('success'):
+            return cls.failed(payload.get('error') or payload.get('message') or 'Unknown error')
+        return cls._from_data(_dict(payload.get('data'), 'data'))
+
+    @classmethod
+    @abstractmethod
+    def _from_data(cls, data: dict):
+        """payload['data'] успешного ответа -> модель"""
+
+
+def decode(body: bytes, content_type: str, model):
+    """Тело ответа -> модель. Бросает DecodeError"""
+    if 'application/json' not in content_type:
+        raise DecodeError(f'Non-JSON response: {body[:200].decode("utf-8", "replace")}')
+    try:
+        payload = _loads(body)
+    except ValueError as e:
+        raise DecodeError(f'Invalid JSON: {e}') from e
+    return model.from_payload(_dict(payload, 'response'))
+
+
+async def read(response, model, require_ok: bool = False):
+    """
+    Прочитать aiohttp ответ в модель. Бросает DecodeError.
+
+    Статус не проверяется (check-player отвечает 404 с JSON), кроме require_ok=True.
+    """
+    body = await response.read()
+    if require_ok and response.status != 200:
+        raise DecodeError(f'Server error: {response.status}')
+    return decode(body, response.headers.get('Content-Type', ''), model)
+
+
+class PaymentSettings(_Model):
+    """/public/payment-settings (поля в корне ответа, без data)"""
+    __slots__ = (
+        'pause', 'maintenance_message', 'deposits_enabled', 'deposit_banks',
+        'withdrawals_enabled', 'withdrawal_banks', 'casinos', 'channel', 'channel_id',
+        'require_channel_subscription', 'require_receipt_photo',
+    )
+
+    def __init__(
+        self,
+        success: bool = False,
+        error: Optional[str] = None,
+        pause: bool = False,
+        maintenance_message: Optional[str] = None,
+        deposits_enabled: bool = True,
+        deposit_banks: Optional[tuple] = None,
+        withdrawals_enabled: bool = True,
+        withdrawal_banks: Optional[tuple] = None,
+        casinos: Optional[dict] = None,
+        channel: Optional[str] = None,
+        channel_id: Optional[str] = None,
+        require_channel_subscription: bool = True,
+        require_receipt_photo: bool = False,
+    ):
+        super().__init__(success, error)
+        self.pause = pause
+        self.maintenance_message = maintenance_message
+        self.deposits_enabled = deposits_enabled
+        # None - админка не прислала список, обработчик берет свой по умолчанию
+        self.deposit_banks = deposit_banks
+        self.withdrawals_enabled = withdrawals_enabled
+        self.withdrawal_banks = withdrawal_banks
+        self.casinos = casinos or {}
+        self.channel = channel
+        self.channel_id = channel_id
+        self.require_channel_subscription = require_channel_subscription
+        self.require_receipt_photo = require_receipt_photo
+
+    @staticmethod
+    def _section(value, field: str):
+        """deposits/withdrawals: {enabled, banks} -> (включено, банки или None)"""
+        if not isinstance(value, dict):
+            # Старый формат - просто флаг; как и раньше, отсутствие настройки не отключает
+            return value is not False, None
+        banks = value.get('banks')
+        if banks is not None and not isinstance(banks, list):
+            raise DecodeError(f'{field}.banks: expected list')
+        return value.get('enabled', True) is not False, tuple(banks) if banks is not None else None
+
+    @classmethod
+    def from_payload(cls, payload: dict):
+        if not payload.get('success'):
+            return cls.failed(payload.get('error') or 'Unknown error')
+        deposits_enabled, deposit_banks = cls._section(payload.get('deposits', {}), 'deposits')
+        withdrawals_enabled, withdrawal_banks = cls._section(payload.get('withdrawals', {}), 'withdrawals')
+        return cls(
+            success=True,
+            pause=bool(payload.get('pause', False)),
+            maintenance_message=_str(payload.get('maintenance_message')),
+            deposits_enabled=deposits_enabled,
+            deposit_banks=deposit_banks,
+            withdrawals_enabled=withdrawals_enabled,
+            withdrawal_banks=withdrawal_banks,
+            casinos=_dict(payload.get('casinos'), 'casinos'),
+            channel=_str(payload.get('channel')),
+            channel_id=_str(payload.get('channel_id')),
+            require_channel_subscription=bool(payload.get('require_channel_subscription', True)),
+            require_receipt_photo=bool(payload.get('require_receipt_photo', False)),
+        )
+
+    def casino_enabled(self, casino_id: str) -> bool:
+        """Казино включено (по умолчанию да, если в настройках его нет)"""
+        return self.casinos.get(casino_id, True) is not False
+
+
+class QRResult(_Model):
+    """/public/generate-qr"""
+    __slots__ = ('qr_hash', 'primary_url', 'all_bank_urls')
+
+    def __init__(
+        self,
+        success: bool = False,
+        error: Optional[str] = None,
+        qr_hash: Optional[str] = None,
+        primary_url: Optional[str] = None,
+        all_bank_urls: Optional[dict] = None,
+    ):
+        super().__init__(success, error)
+        self.qr_hash = qr_hash
+        self.primary_url = primary_url
+        self.all_bank_urls = all_bank_urls or {}
+
+    @classmethod
+    def from_payload(cls, payload: dict):
+        if not payload.get('success'):
+            return cls.failed(payload.get('error') or 'Failed to generate QR code')
+        return cls(
+            success=True,
+            qr_hash=_str(payload.get('qr_hash')),
+            primary_url=_str(payload.get('primary_url')),
+            all_bank_urls=_dict(payload.get('all_bank_urls'), 'all_bank_urls'),
+        )
+
+    def bank_url(self, *names) -> Optional[str]:
+        """Первая найденная ссылка по названию банка или его id"""
+        for name in names:
+            url = self.all_bank_urls.get(name)
+            if url:
+                return url
+        return None
+
+
+class UniqueAmount(_DataModel):
+    """/public/unique-amount: сумма строкой (копейки проверяются по строке) и id резервации"""
+    __slots__ = ('amount', 'reservation_id')
+
+    def __init__(
+        self,
+        success: bool = False,
+        error: Optional[str] = None,
+        amount: Optional[str] = None,
+        reservation_id: Optional[str] = None,
+    ):
+        super().__init__(success, error)
+        self.amount = amount
+        self.reservation_id = reservation_id
+
+    @classmethod
+    def _from_data(cls, data: dict):
+        amount = _str(data.get('amount'))
+        if amount is not None:
+            try:
+                float(amount)
+            except ValueError:
+                raise DecodeError(f'amount: not a number: {amount!r}')
+        return cls(success=True, amount=amount, reservation_id=_str(data.get('reservationId')))
+
+
+class PendingRequest(_DataModel):
+    """/public/pending-request: success=True и id=None - pending заявки нет"""
+    __slots__ = ('id', 'status', 'amount', 'bookmaker', 'account_id', 'created_at')
+
+    def __init__(
+        self,
+        success: bool = False,
+        error: Optional[str] = None,
+        id: Optional[int] = None,
+        status: Optional[str] = None,
+        amount: Optional[str] = None,
+        bookmaker: Optional[str] = None,
+        account_id: Optional[str] = None,
+        created_at: Optional[str] = None,
+    ):
+        super().__init__(success, error)
+        self.id = id
+        self.status = status
+        self.amount = amount
+        self.bookmaker = bookmaker
+        self.account_id = account_id
+        self.created_at = created_at
+
+    @classmethod
+    def _from_data(cls, data: dict):
+        return cls(
+            success=True,
+            id=data.get('id'),
+            status=_str(data.get('status')),
+            amount=_str(data.get('amount')),
+            bookmaker=_str(data.get('bookmaker')),
+            account_id=_str(data.get('accountId')),
+            created_at=_str(data.get('createdAt')),
+        )
+
+    @property
+    def found(self) -> bool:
+        return self.success and self.id is not None
+
+
+class PlayerCheck(_DataModel):
+    """/public/check-player: exists=None - проверить не удалось"""
+    __slots__ = ('exists', 'player', 'skip_check')
+
+    def __init__(
+        self,
+        success: bool = False,
+        error: Optional[str] = None,
+        exists: Optional[bool] = None,
+        player: Optional[dict] = None,
+        skip_check: bool = False,
+    ):
+        super().__init__(success, error)
+        self.exists = exists
+        self.player = player or {}
+        self.skip_check = skip_check
+
+    @classmethod
+    def _from_data(cls, data: dict):
+        exists = data.get('exists')
+        if exists is not None and not isinstance(exists, bool):
+            raise DecodeError('exists: expected bool')
+        return cls(
+            success=True,
+            exists=exists,
+            player=_dict(data.get('player'), 'player'),
+            skip_check=bool(data.get('skipCheck', False)),
+        )
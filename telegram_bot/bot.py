@@ -4,13 +4,17 @@ import aiohttp
 from aiogram import Bot, Dispatcher
 from aiogram.fsm.storage.memory import MemoryStorage
 from config import Config, print_logo
+from logging_setup import setup_logging
+from metrics import start_metrics
+from loop_monitor import start_loop_monitor
+from tasks import InFlightMiddleware, drain, register_snapshot
+from state_snapshot import load_snapshot, save_snapshot
+from replica import start_replica
+from events import start_events
 from handlers import start, deposit, withdraw, language, instruction, chat
 
-# Настройка логирования
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+# Настройка логирования (очередь + фоновый поток, JSON строки)
+setup_logging()
 logger = logging.getLogger(__name__)
 
 # Выводим логотип при запуске
@@ -82,8 +86,28 @@ async def main():
     dp.include_router(instruction.router)
     dp.include_router(chat.router)
     
+    # Учет выполняемых обработчиков, чтобы при остановке дождаться их
+    dp.update.outer_middleware(InFlightMiddleware())
+    
+    # FSM и таймеры QR из снимка предыдущего процесса (если он остановился штатно)
+    deposit.restore_timers(bot, dp.storage, load_snapshot(dp.storage))
+    
+    async def save_state():
+        save_snapshot(dp.storage, deposit.export_timers())
+    
+    register_snapshot(save_state)
+    
     logger.info("Бот запущен!")
     
+    # Heartbeat и задержка event loop для server_monitor.py
+    start_metrics()
+    # Кто блокирует event loop (стеки в лог, худшие места в метрики)
+    start_loop_monitor()
+    # Реплика настроек платежей и блокировок (снимок при старте, дальше изменения)
+    start_replica()
+    # События из админки: изменения настроек, блокировок и статусов заявок сразу
+    start_events()
+    
     # Удаляем webhook перед запуском polling (если он был установлен)
     # Делаем несколько попыток, так как webhook может быть установлен извне
     max_webhook_retries = 3
@@ -105,27 +129,34 @@ async def main():
     max_retries = 5
     retry_delay = 5  # секунд
     
-    for attempt in range(max_retries):
-        try:
-            # Используем request_timeout как число, а не ClientTimeout объект
-            # Увеличиваем до 60 секунд для отправки больших файлов (QR коды)
-            await dp.start_polling(
-                bot, 
-                allowed_updates=["message", "callback_query", "chat_member"],
-                request_timeout=60.0  # 60 секунд для отправки больших файлов
-            )
-            break  # Успешный запуск
-        except TelegramNetworkError as e:
-            if attempt < max_retries - 1:
-                logger.warning(f"Ошибка подключения к Telegram API (попытка {attempt + 1}/{max_retries}): {e}")
-                logger.info(f"Повторная попытка через {retry_delay} секунд...")
-                await asyncio.sleep(retry_delay)
-            else:
-                logger.error(f"Не удалось подключиться к Telegram API после {max_retries} попыток")
+    try:
+        for attempt in range(max_retries):
+            try:
+                # Используем request_timeout как число, а не ClientTimeout объект
+                # Увеличиваем до 60 секунд для отправки больших файлов (QR коды)
+                await dp.start_polling(
+                    bot, 
+                    allowed_updates=["message", "callback_query", "chat_member"],
+                    request_timeout=60.0,  # 60 секунд для отправки больших файлов
+                    close_bot_session=False  # сессию закрываем сами после дренажа
+                )
+                break  # Успешный запуск
+            except TelegramNetworkError as e:
+                if attempt < max_retries - 1:
+                    logger.warning(f"Ошибка подключения к Telegram API (попытка {attempt + 1}/{max_retries}): {e}")
+                    logger.info(f"Повторная попытка через {retry_delay} секунд...")
+                    await asyncio.sleep(retry_delay)
+                else:
+                    logger.error(f"Не удалось подключиться к Telegram API после {max_retries} попыток")
+                    raise
+            except Exception as e:
+                logger.error(f"Неожиданная ошибка при запуске бота: {e}")
                 raise
-        except Exception as e:
-            logger.error(f"Неожиданная ошибка при запуске бота: {e}")
-            raise
+    finally:
+        # Polling остановлен (SIGTERM/SIGINT от PM2 или ошибка): дорабатываем начатое,
+        # сохраняем состояние и только потом закрываем сессию Telegram
+        await drain(Config.SHUTDOWN_TIMEOUT)
+        await bot.session.close()
 
 if __name__ == '__main__':
     try:
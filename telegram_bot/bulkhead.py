@@ -0,0 +1,97 @@
+"""
+Ограничение одновременных запросов к кассам казино (bulkhead)
+
+check_player и check_withdraw_amount через админку идут в cashdesk API конкретного
+казино. Когда API одного казино тормозит, запросы к нему копились и занимали бота,
+из-за чего тормозили и пополнения в другие казино. Теперь у каждого букмекера свой
+лимит:
+
+- одновременно не больше BULKHEAD_MAX_CONCURRENT запросов;
+- в очереди не больше BULKHEAD_MAX_QUEUE ожидающих, сверх - сразу BulkheadFull;
+- ожидание в очереди не дольше BULKHEAD_QUEUE_TIMEOUT секунд, потом BulkheadFull.
+
+Метрики по каждому букмекеру: bulkhead.<букмекер>.active / .queued (gauges),
+.rejected (counter), .wait (время в очереди).
+"""
+
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+
+from config import Config
+from metrics import inc, observe, set_gauge
+
+logger = logging.getLogger(__name__)
+
+# букмекер -> {'semaphore', 'active', 'queued'}
+_bulkheads = {}
+
+
+class BulkheadFull(Exception):
+    """Лимит запросов к кассе казино исчерпан"""
+
+    def __init__(self, name: str, reason: str):
+        super().__init__(f'{name}: {reason}')
+        self.name = name
+        self.reason = reason
+
+
+def _get(name: str) -> dict:
+    bulkhead = _bulkheads.get(name)
+    if bulkhead is None:
+        bulkhead = _bulkheads[name] = {
+            'semaphore': asyncio.Semaphore(Config.BULKHEAD_MAX_CONCURRENT),
+            'active': 0,
+            'queued': 0,
+        }
+    return bulkhead
+
+
+def _report(name: str, bulkhead: dict):
+    set_gauge(f'bulkhead.{name}.active', bulkhead['active'])
+    set_gauge(f'bulkhead.{name}.queued', bulkhead['queued'])
+
+
+def _reject(name: str, bulkhead: dict, reason: str):
+    inc(f'bulkhead.{name}.rejected')
+    logger.warning(
+        "[Bulkhead] %s rejected (%s): %s active, %s queued",
+        name, reason, bulkhead['active'], bulkhead['queued'],
+    )
+    raise BulkheadFull(name, reason)
+
+
+@asynccontextmanager
+async def guard(bookmaker: str):
+    """async with bulkhead.guard(bookmaker): ... - запрос к кассе в пределах лимита"""
+    name = (bookmaker or 'unknown').lower()
+    bulkhead = _get(name)
+    semaphore = bulkhead['semaphore']
+
+    if semaphore.locked():
+        if bulkhead['queued'] >= Config.BULKHEAD_MAX_QUEUE:
+            _reject(name, bulkhead, 'queue full')
+        bulkhead['queued'] += 1
+        _report(name, bulkhead)
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(semaphore.acquire(), timeout=Config.BULKHEAD_QUEUE_TIMEOUT)
+        except asyncio.TimeoutError:
+            _reject(name, bulkhead, 'queue timeout')
+        finally:
+            bulkhead['queued'] -= 1
+            _report(name, bulkhead)
+            observe(f'bulkhead.{name}.wait', (time.monotonic() - started) * 1000)
+    else:
+        await semaphore.acquire()
+
+    bulkhead['active'] += 1
+    _report(name, bulkhead)
+    try:
+        yield
+    finally:
+        bulkhead['active'] -= 1
+        semaphore.release()
+        _report(name, bulkhead)
+
@@ -135,6 +135,8 @@ class Config:
     # Лимиты
     DEPOSIT_MIN = 100
     DEPOSIT_MAX = 100000
+    # Сек от суммы до отправленного QR (резерв суммы, QR, картинка, загрузка в Telegram)
+    DEPOSIT_QR_DEADLINE = float(os.getenv('DEPOSIT_QR_DEADLINE', '60'))
     
     # Канал и поддержка
     CHANNEL = '@bingokg_news'
@@ -146,4 +148,88 @@ class Config:
         {'code': 'ky', 'name': '🇰🇬 Кыргызча'},
         {'code': 'uz', 'name': '🇺🇿 O\'zbekcha'},
     ]
-
+    
+    # Логирование (см. logging_setup.py)
+    LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+    LOG_FORMAT = os.getenv('LOG_FORMAT', 'json')  # json | text
+    LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '10000'))
+    LOG_RATE_PER_LOGGER = float(os.getenv('LOG_RATE_PER_LOGGER', '50'))  # записей/сек на логгер, 0 - без лимита
+    LOG_RATE_BURST = int(os.getenv('LOG_RATE_BURST', '200'))
+    LOG_SAMPLE_AFTER = int(os.getenv('LOG_SAMPLE_AFTER', '5'))  # одинаковых сообщений за минуту без сэмплирования
+    LOG_SAMPLE_EVERY = int(os.getenv('LOG_SAMPLE_EVERY', '50'))  # дальше пропускаем каждое N-е
+    
+    # Чеки (см. receipts.py): берем наименьший PhotoSize, у которого длинная
+    # сторона >= RECEIPT_MIN_SIDE, и пережимаем в JPEG, если он больше RECEIPT_MAX_BYTES
+    RECEIPT_MIN_SIDE = int(os.getenv('RECEIPT_MIN_SIDE', '1280'))
+    RECEIPT_MAX_SIDE = int(os.getenv('RECEIPT_MAX_SIDE', '1600'))
+    RECEIPT_MAX_BYTES = int(os.getenv('RECEIPT_MAX_BYTES', '350000'))
+    RECEIPT_JPEG_QUALITY = int(os.getenv('RECEIPT_JPEG_QUALITY', '80'))
+    RECEIPT_CACHE_SIZE = int(os.getenv('RECEIPT_CACHE_SIZE', '5000'))  # file_unique_id/sha256 уже загруженных чеков
+    
+    # Метрики процесса (см. metrics.py), файл читает server_monitor.py
+    METRICS_DIR = os.getenv('METRICS_DIR', str(Path(__file__).parent / 'metrics'))
+    METRICS_INTERVAL = float(os.getenv('METRICS_INTERVAL', '15'))  # как часто писать файл, сек
+    METRICS_LAG_INTERVAL = float(os.getenv('METRICS_LAG_INTERVAL', '0.5'))  # шаг измерения задержки loop, сек
+    
+    # Детектор блокировок event loop (см. loop_monitor.py)
+    LOOP_MONITOR_ENABLED = os.getenv('LOOP_MONITOR_ENABLED', 'true').lower() == 'true'
+    LOOP_MONITOR_INTERVAL = float(os.getenv('LOOP_MONITOR_INTERVAL', '0.05'))  # шаг heartbeat, сек
+    LOOP_MONITOR_THRESHOLD_MS = float(os.getenv('LOOP_MONITOR_THRESHOLD_MS', '200'))  # блокировка дольше - записываем со стеком
+    LOOP_MONITOR_REPORT_INTERVAL = float(os.getenv('LOOP_MONITOR_REPORT_INTERVAL', '300'))  # сводка худших мест в лог, сек
+    LOOP_MONITOR_TOP = int(os.getenv('LOOP_MONITOR_TOP', '5'))
+    
+    # Остановка бота (см. tasks.py): PM2 дает kill_timeout 30 с, дренаж должен уложиться раньше
+    SHUTDOWN_TIMEOUT = float(os.getenv('SHUTDOWN_TIMEOUT', '20'))
+    # Группы фоновых записей в API (tasks.submit), по умолчанию для каждой группы
+    TASK_GROUP_CONCURRENCY = int(os.getenv('TASK_GROUP_CONCURRENCY', '4'))
+    TASK_GROUP_MAX_QUEUE = int(os.getenv('TASK_GROUP_MAX_QUEUE', '1000'))
+    TASK_GROUP_RETRIES = int(os.getenv('TASK_GROUP_RETRIES', '2'))  # повторов после первой попытки
+    TASK_GROUP_TIMEOUT = float(os.getenv('TASK_GROUP_TIMEOUT', '15'))  # сек на попытку
+    TASK_GROUP_BACKOFF = float(os.getenv('TASK_GROUP_BACKOFF', '1'))  # сек, удваивается с каждой попыткой
+    # Пачки мелких записей по заявкам (см. write_batcher.py)
+    WRITE_BATCH_DELAY_MS = float(os.getenv('WRITE_BATCH_DELAY_MS', '20'))  # сколько ждать соседние записи
+    WRITE_BATCH_MAX_SIZE = int(os.getenv('WRITE_BATCH_MAX_SIZE', '50'))  # не больше 200 (лимит админки)
+    BOT_SERVICE_TOKEN = os.getenv('BOT_SERVICE_TOKEN', '')  # X-Bot-Token, тот же, что BOT_SERVICE_TOKEN админки
+    # Снимок FSM и таймеров QR между перезапусками (см. state_snapshot.py)
+    STATE_DIR = os.getenv('STATE_DIR', str(Path(__file__).parent / 'state'))
+    STATE_SNAPSHOT_MAX_AGE = int(os.getenv('STATE_SNAPSHOT_MAX_AGE', '600'))  # сек, старый снимок не поднимаем
+    
+    # Кэш подписки на канал (см. subscriptions.py)
+    SUBSCRIPTION_EVENT_TTL = int(os.getenv('SUBSCRIPTION_EVENT_TTL', '86400'))  # сек, статус из chat_member апдейта
+    SUBSCRIPTION_CACHE_TTL = int(os.getenv('SUBSCRIPTION_CACHE_TTL', '3600'))  # сек, "подписан" из get_chat_member
+    SUBSCRIPTION_NEGATIVE_TTL = int(os.getenv('SUBSCRIPTION_NEGATIVE_TTL', '60'))  # сек, "не подписан"
+    SUBSCRIPTION_CACHE_SIZE = int(os.getenv('SUBSCRIPTION_CACHE_SIZE', '100000'))
+    
+    # Кэш профиля пользователя (см. profiles.py)
+    PROFILE_TTL = int(os.getenv('PROFILE_TTL', '600'))  # сек, профиль грузится заново
+    PROFILE_CACHE_SIZE = int(os.getenv('PROFILE_CACHE_SIZE', '20000'))
+    PROFILE_BLOCK_TTL = int(os.getenv('PROFILE_BLOCK_TTL', '300'))  # сек, результат check_blocked, пока реплика устарела
+    
+    # Реплика настроек и блокировок (см. replica.py)
+    REPLICA_SYNC_INTERVAL = float(os.getenv('REPLICA_SYNC_INTERVAL', '10'))  # сек, изменения из админки
+    REPLICA_FULL_SYNC_INTERVAL = int(os.getenv('REPLICA_FULL_SYNC_INTERVAL', '3600'))  # сек, полный снимок заново
+    REPLICA_MAX_STALENESS = int(os.getenv('REPLICA_MAX_STALENESS', '60'))  # сек без синхронизации - читаем из API
+    
+    # Поток событий из админки (см. events.py)
+    EVENTS_ENABLED = os.getenv('EVENTS_ENABLED', 'true').lower() == 'true'
+    EVENTS_URL = os.getenv('EVENTS_URL', '')  # пусто - {API_BASE_URL}/public/bot-events
+    EVENTS_CONNECT_TIMEOUT = float(os.getenv('EVENTS_CONNECT_TIMEOUT', '5'))  # сек
+    EVENTS_READ_TIMEOUT = float(os.getenv('EVENTS_READ_TIMEOUT', '45'))  # сек без данных (keepalive раз в 15) - переподключение
+    EVENTS_RECONNECT_MIN = float(os.getenv('EVENTS_RECONNECT_MIN', '1'))  # сек
+    EVENTS_RECONNECT_MAX = float(os.getenv('EVENTS_RECONNECT_MAX', '60'))  # сек
+    EVENTS_QUEUE_SIZE = int(os.getenv('EVENTS_QUEUE_SIZE', '1000'))
+    EVENTS_QUEUE_TIMEOUT = float(os.getenv('EVENTS_QUEUE_TIMEOUT', '5'))  # сек ожидания места в очереди
+    
+    # Задержки API админки (см. latency.py)
+    LATENCY_WINDOW = int(os.getenv('LATENCY_WINDOW', '200'))  # замеров на endpoint
+    LATENCY_MIN_SAMPLES = int(os.getenv('LATENCY_MIN_SAMPLES', '20'))  # до этого - прежние таймауты
+    LATENCY_TIMEOUT_MULTIPLIER = float(os.getenv('LATENCY_TIMEOUT_MULTIPLIER', '3'))  # таймаут = p99 * N
+    LATENCY_TIMEOUT_FLOOR = float(os.getenv('LATENCY_TIMEOUT_FLOOR', '0.5'))  # сек
+    LATENCY_HEDGE_MIN_DELAY = float(os.getenv('LATENCY_HEDGE_MIN_DELAY', '0.05'))  # сек, не дублировать сразу
+    LATENCY_HEDGE_DEFAULT_DELAY = float(os.getenv('LATENCY_HEDGE_DEFAULT_DELAY', '1'))  # сек, пока замеров мало
+    API_CREATE_REQUEST_TIMEOUT = float(os.getenv('API_CREATE_REQUEST_TIMEOUT', '30'))  # сек, создание заявки на fallback URL
+    
+    # Лимиты запросов к кассам казино на букмекера (см. bulkhead.py)
+    BULKHEAD_MAX_CONCURRENT = int(os.getenv('BULKHEAD_MAX_CONCURRENT', '4'))  # одновременных запросов
+    BULKHEAD_MAX_QUEUE = int(os.getenv('BULKHEAD_MAX_QUEUE', '8'))  # ожидающих, сверх - отказ сразу
+    BULKHEAD_QUEUE_TIMEOUT = float(os.getenv('BULKHEAD_QUEUE_TIMEOUT', '3'))  # сек ожидания в очереди
@@ -0,0 +1,215 @@
+"""
+Поток событий из админки (SSE /public/bot-events)
+
+Об изменении настроек и блокировок бот узнавал только из опроса реплики (раз в
+REPLICA_SYNC_INTERVAL секунд). Теперь бот держит постоянное соединение с админкой и
+получает события сразу:
+
+- settings.changed, user.blocked - внеочередная синхронизация реплики (replica.sync),
+  профиль заблокированного пользователя сбрасывается;
+- request.status - передается подписчикам (subscribe), например таймеру QR;
+- reset - админка уже не хранит пропущенные события, реплика загружается целиком.
+
+Соединение переподключается с экспоненциальной задержкой (EVENTS_RECONNECT_MIN ..
+EVENTS_RECONNECT_MAX), при переподключении передается Last-Event-ID, и пропущенные
+события досылаются. События идут через очередь на EVENTS_QUEUE_SIZE: если обработка
+не успевает, чтение потока ждет (до EVENTS_QUEUE_TIMEOUT секунд), потом событие
+отбрасывается, а после очереди реплика загружается целиком.
+
+Уведомления пользователям о заявках по-прежнему шлет админка, здесь их не дублируем.
+Для локальной проверки - fake_event_server.py (EVENTS_URL на него).
+"""
+
+import asyncio
+import inspect
+import json
+import logging
+import random
+import time
+
+import aiohttp
+
+import profiles
+import replica
+from api_client import ssl_context
+from config import Config
+from metrics import inc, set_gauge
+from tasks import spawn
+
+logger = logging.getLogger(__name__)
+
+_state = {
+    'last_event_id': None,
+    'connected': False,
+    'resync_full': False,    # события терялись - реплику загрузить целиком
+    'retry': None,           # сек, из поля retry: сервера
+}
+# тип события -> список обработчиков payload (обычные или корутинные функции)
+_subscribers = {}
+_queue = None
+_tasks = []
+
+
+def subscribe(event_type: str, handler):
+    """Вызывать handler(payload) на каждое событие event_type"""
+    _subscribers.setdefault(event_type, []).append(handler)
+
+
+def is_connected() -> bool:
+    return _state['connected']
+
+
+def _urls() -> list:
+    if Config.EVENTS_URL:
+        return [Config.EVENTS_URL]
+    urls = [f'{Config.API_BASE_URL}/public/bot-events']
+    if Config.API_BASE_URL.startswith('http://localhost'):
+        urls.append(f'{Config.API_FALLBACK_URL}/public/bot-events')
+    return urls
+
+
+async def _enqueue(event: dict):
+    set_gauge('events.queue', _queue.qsize())
+    try:
+        await asyncio.wait_for(_queue.put(event), timeout=Config.EVENTS_QUEUE_TIMEOUT)
+    except asyncio.TimeoutError:
+        inc('events.dropped')
+        _state['resync_full'] = True
+        logger.warning("[Events] Queue is full, dropped %s #%s", event['type'], event['id'])
+
+
+async def _read_stream(response: aiohttp.ClientResponse):
+    """Разбор text/event-stream: события кладутся в очередь"""
+    event_id, event_type, data = None, 'message', []
+    async for raw in response.content:
+        line = raw.decode('utf-8').rstrip('\r\n')
+        if line:
+            if line.startswith(':'):
+                continue
+            field, _, value = line.partition(':')
+            value = value[1:] if value.startswith(' ') else value
+            if field == 'id':
+                event_id = value
+            elif field == 'event':
+                event_type = value
+            elif field == 'data':
+                data.append(value)
+            elif field == 'retry' and value.isdigit():
+                _state['retry'] = int(value) / 1000
+            continue
+
+        # пустая строка - конец события
+        if event_id is not None:
+            _state['last_event_id'] = event_id
+        if event_type == 'hello':
+            _state['connected'] = True
+            set_gauge('events.connected', 1)
+            logger.info("[Events] Connected to %s (last event %s)", response.url, _state['last_event_id'])
+        elif data or event_type == 'reset':
+            try:
+                payload = json.loads('\n'.join(data)) if data else {}
+            except ValueError:
+                logger.warning("[Events] Bad payload for %s #%s", event_type, event_id)
+            else:
+                inc('events.received')
+                await _enqueue({'id': event_id, 'type': event_type, 'payload': payload})
+        event_id, event_type, data = None, 'message', []
+
+
+async def _reader_loop():
+    urls = _urls()
+    attempt = 0
+    timeout = aiohttp.ClientTimeout(
+        total=None, sock_connect=Config.EVENTS_CONNECT_TIMEOUT, sock_read=Config.EVENTS_READ_TIMEOUT
+    )
+    while True:
+        url = urls[attempt % len(urls)]
+        headers = {'Accept': 'text/event-stream'}
+        if _state['last_event_id'] is not None:
+            headers['Last-Event-ID'] = _state['last_event_id']
+        try:
+            connector = aiohttp.TCPConnector(ssl=ssl_context)
+            async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+                async with session.get(url, headers=headers) as response:
+                    if response.status != 200:
+                        raise aiohttp.ClientResponseError(
+                            response.request_info, response.history,
+                            status=response.status, message=response.reason or '',
+                        )
+                    await _read_stream(response)
+            logger.info("[Events] Stream closed by server")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning("[Events] Stream %s failed: %s", url, e)
+
+        if _state['connected']:
+            attempt = 0
+        else:
+            attempt += 1
+        _state['connected'] = False
+        set_gauge('events.connected', 0)
+        inc('events.reconnects')
+
+        base = max(Config.EVENTS_RECONNECT_MIN, _state['retry'] or 0)
+        delay = min(Config.EVENTS_RECONNECT_MAX, base * 2 ** min(attempt, 10))
+        await asyncio.sleep(delay * random.uniform(0.5, 1))
+
+
+async def _notify(event: dict):
+    for handler in _subscribers.get(event['type'], ()):
+        try:
+            result = handler(event['payload'])
+            if inspect.isawaitable(result):
+                await result
+        except Exception as e:
+            logger.error("[Events] Handler %s for %s failed: %s", getattr(handler, '__name__', handler), event['type'], e)
+
+
+async def _dispatch_loop():
+    while True:
+        # Все, что накопилось, обрабатываем пачкой: одна синхронизация реплики на пачку
+        batch = [await _queue.get()]
+        while not _queue.empty():
+            batch.append(_queue.get_nowait())
+        set_gauge('events.queue', _queue.qsize())
+
+        sync_needed = False
+        for event in batch:
+            if event['type'] == 'reset':
+                _state['resync_full'] = True
+            elif event['type'] in ('settings.changed', 'user.blocked'):
+                sync_needed = True
+                if event['type'] == 'user.blocked' and event['payload'].get('userId'):
+                    profiles.invalidate(event['payload']['userId'])
+            await _notify(event)
+
+        full = _state['resync_full']
+        if sync_needed or full:
+            _state['resync_full'] = False
+            started = time.monotonic()
+            try:
+                synced = await replica.sync(full=full)
+            except Exception as e:
+                synced = False
+                logger.warning("[Events] Replica sync failed: %s", e)
+            if not synced and full:
+                _state['resync_full'] = True
+            logger.info(
+                "[Events] %s events applied, replica %s sync in %.0f ms",
+                len(batch), 'full' if full else 'delta', (time.monotonic() - started) * 1000,
+            )
+
+
+def start_events() -> list:
+    """Запустить чтение потока событий (вызывать из main() бота после start_replica)"""
+    global _queue
+    if not Config.EVENTS_ENABLED:
+        logger.info("[Events] Event stream disabled")
+        return []
+    _queue = asyncio.Queue(maxsize=Config.EVENTS_QUEUE_SIZE)
+    _tasks[:] = [
+        spawn(_reader_loop(), name='events-reader', cancel_on_shutdown=True),
+        spawn(_dispatch_loop(), name='events-dispatch', cancel_on_shutdown=True),
+    ]
+    return list(_tasks)
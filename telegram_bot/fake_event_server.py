@@ -0,0 +1,99 @@
+"""
+Фейковый сервер событий админки для локальной проверки events.py
+
+    python fake_event_server.py --port 3099
+    EVENTS_URL=http://localhost:3099/api/public/bot-events python bot.py
+
+Отправить событие:
+    curl -X POST localhost:3099/emit -d '{"type": "request.status", "payload": {"requestId": 1, "status": "completed"}}'
+
+Как и админка, поддерживает Last-Event-ID и отвечает reset, если событий уже нет
+(POST /forget удаляет все события из памяти). POST /drop обрывает открытые соединения.
+"""
+
+import argparse
+import asyncio
+import json
+
+from aiohttp import web
+
+_events = []      # (id, type, payload)
+_next_id = [1]
+_streams = set()  # транспорты открытых потоков
+
+
+async def emit(request: web.Request) -> web.Response:
+    body = await request.json()
+    event = (_next_id[0], body['type'], body.get('payload') or {})
+    _next_id[0] += 1
+    _events.append(event)
+    return web.json_response({'id': event[0]})
+
+
+async def forget(request: web.Request) -> web.Response:
+    _events.clear()
+    return web.json_response({'ok': True})
+
+
+async def drop(request: web.Request) -> web.Response:
+    dropped = len(_streams)
+    for transport in list(_streams):
+        transport.close()
+    return web.json_response({'dropped': dropped})
+
+
+async def stream(request: web.Request) -> web.StreamResponse:
+    last_id = _next_id[0] - 1
+    requested = request.headers.get('Last-Event-ID')
+    reset = False
+    if requested is not None:
+        resume_from = int(requested) if requested.isdigit() else -1
+        oldest = _events[0][0] if _events else _next_id[0]
+        reset = resume_from < 0 or resume_from > last_id or oldest > resume_from + 1
+        if not reset:
+            last_id = resume_from
+
+    response = web.StreamResponse(headers={'Content-Type': 'text/event-stream', 'Cache-Control': 'no-cache'})
+    await response.prepare(request)
+    transport = request.transport
+    _streams.add(transport)
+    print(f"[FakeEvents] Client connected, Last-Event-ID={requested}, reset={reset}")
+    try:
+        await response.write(b'retry: 1000\n\n')
+        if reset:
+            await response.write(f'id: {last_id}\nevent: reset\ndata: {{}}\n\n'.encode())
+        await response.write(f'id: {last_id}\nevent: hello\ndata: {{}}\n\n'.encode())
+        idle = 0.0
+        while True:
+            for event_id, event_type, payload in [e for e in _events if e[0] > last_id]:
+                await response.write(f'id: {event_id}\nevent: {event_type}\ndata: {json.dumps(payload)}\n\n'.encode())
+                last_id = event_id
+                idle = 0.0
+            await asyncio.sleep(0.2)
+            idle += 0.2
+            if idle >= 15:
+                await response.write(b': keepalive\n\n')
+                idle = 0.0
+    except (ConnectionResetError, asyncio.CancelledError):
+        pass
+    finally:
+        _streams.discard(transport)
+        print("[FakeEvents] Client disconnected")
+    return response
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Фейковый поток событий админки')
+    parser.add_argument('--port', type=int, default=3099)
+    args = parser.parse_args()
+
+    app = web.Application()
+    app.router.add_get('/api/public/bot-events', stream)
+    app.router.add_post('/emit', emit)
+    app.router.add_post('/forget', forget)
+    app.router.add_post('/drop', drop)
+    web.run_app(app, port=args.port)
+
+
+if __name__ == '__main__':
+    main()
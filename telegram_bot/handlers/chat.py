@@ -3,6 +3,8 @@ from aiogram.types import Message
 from aiogram.fsm.context import FSMContext
 from translations import get_text
 from api_client import APIClient
+import profiles
+from receipts import select_photo_size
 import aiohttp
 import ssl
 
@@ -214,7 +216,7 @@ async def chat_message_text(message: Message, state: FSMContext, bot: Bot):
     
     # Проверяем блокировку пользователя
     try:
-        blocked_check = await APIClient.check_blocked(str(user_id))
+        blocked_check = await profiles.check_blocked(str(user_id))
         if blocked_check.get('success') and blocked_check.get('data', {}).get('blocked'):
             blocked_data = blocked_check.get('data', {})
             blocked_message = blocked_data.get('message', 'Вы заблокированы')
@@ -256,7 +258,7 @@ async def chat_message_photo(message: Message, state: FSMContext, bot: Bot):
     user_id = message.from_user.id
     
     # Получаем URL фото
-    photo = message.photo[-1]  # Берем фото наибольшего размера
+    photo = select_photo_size(message.photo)  # Наименьший размер, достаточный для оператора
     file = await bot.get_file(photo.file_id)
     media_url = f"https://api.telegram.org/file/bot{bot.token}/{file.file_path}"
     
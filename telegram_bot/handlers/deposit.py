@@ -6,18 +6,27 @@ from aiogram.exceptions import TelegramNetworkError, TelegramRetryAfter
 from states import DepositStates
 from config import Config
 from api_client import APIClient
+import events
+import profiles
+import replica
+from receipts import load_receipt, upload_receipt
+from metrics import inc, observe
+import write_batcher
+from tasks import spawn, submit
 from translations import get_text
 import re
 import os
-import base64
 import asyncio
 import time
+from dataclasses import asdict
 from pathlib import Path
 
 router = Router()
 
 # Словарь для отслеживания активных таймеров (чтобы можно было их остановить)
 active_timers = {}
+# Параметры активных таймеров для снимка при остановке бота (см. state_snapshot.py)
+timer_params = {}
 
 async def retry_telegram_api_call(call_func, max_retries=3, initial_delay=1.0, max_delay=10.0, backoff_factor=2.0):
     """
@@ -71,10 +80,69 @@ async def retry_telegram_api_call(call_func, max_retries=3, initial_delay=1.0, m
         raise last_exception
     raise Exception("All retry attempts failed")
 
+
+class QRStageFailed(Exception):
+    """Этап подготовки QR не удался; text - что показать пользователю"""
+
+    def __init__(self, text: str):
+        super().__init__(text)
+        self.text = text
+
+
+async def run_stages(deadline: float, **stages) -> dict:
+    """
+    Запустить независимые этапы (корутины) параллельно и дождаться всех до deadline
+    (время loop.time()). Первая ошибка или дедлайн отменяет незавершенные этапы.
+    
+    Returns:
+        {имя этапа: результат}
+    
+    Raises:
+        Исключение первого упавшего этапа или asyncio.TimeoutError
+    """
+    tasks = {name: asyncio.ensure_future(coro) for name, coro in stages.items()}
+    try:
+        timeout = max(0.0, deadline - asyncio.get_running_loop().time())
+        done, pending = await asyncio.wait(tasks.values(), timeout=timeout, return_when=asyncio.FIRST_EXCEPTION)
+        for task in done:
+            if task.exception() is not None:
+                raise task.exception()
+        if pending:
+            raise asyncio.TimeoutError(f"stages not finished: {', '.join(n for n, t in tasks.items() if t in pending)}")
+        return {name: task.result() for name, task in tasks.items()}
+    finally:
+        for task in tasks.values():
+            if not task.done():
+                task.cancel()
+
+
+async def delete_notice(notice_task: asyncio.Task):
+    """Удалить сообщение "Генерирую QR код...", отправленное фоновой задачей (None - не отправлялось)"""
+    if notice_task is None:
+        return
+    try:
+        notice = await asyncio.wait_for(notice_task, timeout=5)
+        await notice.delete()
+    except Exception:
+        pass
+
 async def update_qr_timer(bot: Bot, chat_id: int, message_id: int, created_at: int, duration: int, lang: str, amount: float, casino: str, account_id: str, keyboard, state: FSMContext = None, request_id: str = None):
     """Фоновая задача для обновления таймера в сообщении с QR кодом"""
     timer_key = f"{chat_id}_{message_id}"
     active_timers[timer_key] = True
+    timer_params[timer_key] = {
+        'chat_id': chat_id,
+        'message_id': message_id,
+        'created_at': created_at,
+        'duration': duration,
+        'lang': lang,
+        'amount': amount,
+        'casino': casino,
+        'account_id': account_id,
+        'keyboard': keyboard.model_dump(mode='json', exclude_none=True) if keyboard else None,
+        'state_key': asdict(state.key) if state else None,
+        'request_id': request_id,
+    }
     
     import logging
     logger = logging.getLogger(__name__)
@@ -94,11 +162,8 @@ async def update_qr_timer(bot: Bot, chat_id: int, message_id: int, created_at: i
                 # ВАЖНО: Отклоняем заявку при истечении таймера
                 if request_id:
                     try:
-                        from api_client import APIClient
-                        reject_result = await APIClient.update_request(
-                            request_id=request_id,
-                            status='rejected',
-                            status_detail='Таймер истек'
+                        reject_result = await write_batcher.update_status(
+                            request_id, 'rejected', 'Таймер истек'
                         )
                         if reject_result.get('success'):
                             logger.info(f"[Timer] Auto-rejected request {request_id} due to timer expiration")
@@ -112,11 +177,8 @@ async def update_qr_timer(bot: Bot, chat_id: int, message_id: int, created_at: i
                         data = await state.get_data()
                         pending_request_id = data.get('pending_request_id') or data.get('request_id')
                         if pending_request_id:
-                            from api_client import APIClient
-                            reject_result = await APIClient.update_request(
-                                request_id=str(pending_request_id),
-                                status='rejected',
-                                status_detail='Таймер истек'
+                            reject_result = await write_batcher.update_status(
+                                str(pending_request_id), 'rejected', 'Таймер истек'
                             )
                             if reject_result.get('success'):
                                 logger.info(f"[Timer] Auto-rejected request {pending_request_id} due to timer expiration")
@@ -207,21 +269,21 @@ async def update_qr_timer(bot: Bot, chat_id: int, message_id: int, created_at: i
                     caption=payment_text,
                     reply_markup=keyboard if keyboard else None
                 )
-                logger.debug(f"[Timer] Updated message {message_id} to {timer_text}")
+                logger.debug("[Timer] Updated message %s to %s", message_id, timer_text)
             except Exception as e:
                 error_str = str(e).lower()
                 # Если сообщение было удалено или не найдено, останавливаем таймер
                 if 'not found' in error_str or 'message to edit not found' in error_str or 'message can\'t be edited' in error_str:
-                    logger.info(f"[Timer] Message {message_id} not found or can't be edited, stopping timer: {e}")
+                    logger.info("[Timer] Message %s not found or can't be edited, stopping timer: %s", message_id, e)
                     active_timers[timer_key] = False
                     break
                 # Если сообщение не изменено (то же содержимое) - это нормально, просто продолжаем
                 elif 'message is not modified' in error_str or 'not modified' in error_str:
-                    logger.debug(f"[Timer] Message {message_id} not modified (same content), continuing...")
+                    logger.debug("[Timer] Message %s not modified (same content), continuing...", message_id)
                     # Продолжаем работу, это нормальная ситуация
                 else:
                     # Для других ошибок логируем предупреждение и продолжаем
-                    logger.warning(f"[Timer] Could not update message {message_id}: {e}")
+                    logger.warning("[Timer] Could not update message %s: %s", message_id, e)
                     await asyncio.sleep(1)
                     continue
             
@@ -236,8 +298,49 @@ async def update_qr_timer(bot: Bot, chat_id: int, message_id: int, created_at: i
     finally:
         # Удаляем таймер из активных
         active_timers.pop(timer_key, None)
+        timer_params.pop(timer_key, None)
         logger.info(f"[Timer] Stopped for message {message_id}")
 
+def start_qr_timer(bot: Bot, chat_id: int, message_id: int, created_at: int, duration: int, lang: str, amount: float, casino: str, account_id: str, keyboard, state: FSMContext = None, request_id: str = None) -> asyncio.Task:
+    """Запустить таймер QR как фоновую задачу (при остановке бота сохраняется в снимок и отменяется)"""
+    return spawn(
+        update_qr_timer(bot, chat_id, message_id, created_at, duration, lang, amount, casino, account_id, keyboard, state, request_id),
+        name=f"qr-timer-{chat_id}-{message_id}",
+        cancel_on_shutdown=True,
+    )
+
+def export_timers() -> list:
+    """Параметры активных таймеров для снимка"""
+    return [dict(params) for key, params in timer_params.items() if active_timers.get(key)]
+
+def restore_timers(bot: Bot, storage, timers: list):
+    """Запустить таймеры из снимка после перезапуска бота"""
+    from aiogram.fsm.storage.base import StorageKey
+    from aiogram.types import InlineKeyboardMarkup
+    for params in timers:
+        keyboard = InlineKeyboardMarkup.model_validate(params['keyboard']) if params.get('keyboard') else None
+        state = FSMContext(storage=storage, key=StorageKey(**params['state_key'])) if params.get('state_key') else None
+        start_qr_timer(
+            bot, params['chat_id'], params['message_id'], params['created_at'], params['duration'],
+            params['lang'], params['amount'], params['casino'], params['account_id'],
+            keyboard, state, params.get('request_id'),
+        )
+
+def stop_timers_for_request(payload: dict):
+    """Заявку обработали в админке - таймер оплаты по ней больше не нужен (событие request.status)"""
+    import logging
+    logger = logging.getLogger(__name__)
+    
+    request_id = str(payload.get('requestId') or '')
+    if not request_id or payload.get('status') == 'pending':
+        return
+    for timer_key, params in list(timer_params.items()):
+        if str(params.get('request_id') or '') == request_id and active_timers.get(timer_key):
+            active_timers[timer_key] = False
+            logger.info("[Timer] Request %s is %s, stopping timer %s", request_id, payload.get('status'), timer_key)
+
+events.subscribe('request.status', stop_timers_for_request)
+
 async def get_lang_from_state(state: FSMContext) -> str:
     """Получить язык из состояния"""
     data = await state.get_data()
@@ -257,7 +360,7 @@ async def deposit_start(message: Message, state: FSMContext):
     # ВАЖНО: Проверяем блокировку пользователя СРАЗУ, до начала процесса
     try:
         blocked_check = await asyncio.wait_for(
-            APIClient.check_blocked(str(message.from_user.id)),
+            profiles.check_blocked(str(message.from_user.id)),
             timeout=2.0  # Максимум 2 секунды на проверку
         )
         if blocked_check.get('success') and blocked_check.get('data', {}).get('blocked'):
@@ -313,27 +416,19 @@ async def deposit_start(message: Message, state: FSMContext):
         logger.warning(f"Failed to check active deposit: {e}, continuing with deposit process")
     
     # Получаем настройки из админки
-    settings = await APIClient.get_payment_settings()
+    settings = await replica.get_payment_settings()
     
     # Проверяем pause режим
-    if settings.get('pause', False):
-        maintenance_message = settings.get('maintenance_message', get_text(lang, 'start', 'bot_paused'))
+    if settings.pause:
+        maintenance_message = settings.maintenance_message or get_text(lang, 'start', 'bot_paused')
         await message.answer(maintenance_message)
         return
     
     # Проверяем, включены ли депозиты
-    deposits = settings.get('deposits', {})
-    if isinstance(deposits, dict):
-        deposits_enabled = deposits.get('enabled', True)
-    else:
-        deposits_enabled = deposits if deposits is not False else True
-    
-    if not deposits_enabled:
+    if not settings.deposits_enabled:
         await message.answer(get_text(lang, 'deposit', 'deposits_disabled'))
         return
     
-    enabled_casinos = settings.get('casinos', {})
-    
     # Фильтруем казино по настройкам (показываем только включенные)
     # 1xbet - одна кнопка в строке, остальные - по 2 в строке
     keyboard = InlineKeyboardMarkup(inline_keyboard=[])
@@ -341,7 +436,7 @@ async def deposit_start(message: Message, state: FSMContext):
     for casino in Config.CASINOS:
         # Проверяем, включено ли казино (по умолчанию true, если не указано)
         casino_id = casino['id']
-        if enabled_casinos.get(casino_id, True):
+        if settings.casino_enabled(casino_id):
             # 1xbet - отдельная строка (одна кнопка)
             if casino_id == '1xbet':
                 keyboard.inline_keyboard.append([InlineKeyboardButton(
@@ -379,9 +474,8 @@ async def deposit_casino_selected(callback: CallbackQuery, state: FSMContext, bo
     casino_id = callback.data.replace('casino_', '')
     
     # Проверяем, включено ли казино
-    settings = await APIClient.get_payment_settings()
-    enabled_casinos = settings.get('casinos', {})
-    if enabled_casinos.get(casino_id, True) is False:
+    settings = await replica.get_payment_settings()
+    if not settings.casino_enabled(casino_id):
         await callback.answer(get_text(lang, 'deposit', 'casino_disabled', default='❌ Это казино временно отключено'), show_alert=True)
         return
     
@@ -401,7 +495,7 @@ async def deposit_casino_selected(callback: CallbackQuery, state: FSMContext, bo
     # Получаем сохраненный ID казино для этого пользователя
     saved_account_id = None
     try:
-        saved_id_result = await APIClient.get_saved_casino_account_id(str(callback.from_user.id), casino_id)
+        saved_id_result = await profiles.get_saved_casino_account_id(str(callback.from_user.id), casino_id)
         if saved_id_result.get('success') and saved_id_result.get('data', {}).get('accountId'):
             saved_account_id = saved_id_result.get('data', {}).get('accountId')
     except Exception:
@@ -482,7 +576,7 @@ async def deposit_account_id_received(message: Message, state: FSMContext, bot:
     # ВАЖНО: Проверяем блокировку accountId ПЕРЕД сохранением
     try:
         blocked_check = await asyncio.wait_for(
-            APIClient.check_blocked(str(message.from_user.id), account_id),
+            profiles.check_blocked(str(message.from_user.id), account_id),
             timeout=2.0  # Максимум 2 секунды на проверку
         )
         if blocked_check.get('success') and blocked_check.get('data', {}).get('blocked'):
@@ -504,7 +598,7 @@ async def deposit_account_id_received(message: Message, state: FSMContext, bot:
     # Сохраняем ID казино для этого пользователя
     if casino_id:
         try:
-            await APIClient.save_casino_account_id(str(message.from_user.id), casino_id, account_id)
+            await profiles.save_casino_account_id(str(message.from_user.id), casino_id, account_id)
         except Exception:
             pass  # Игнорируем ошибки сохранения
 
@@ -516,13 +610,10 @@ async def deposit_account_id_received(message: Message, state: FSMContext, bot:
         try:
             check_result = await APIClient.check_player(casino_id, account_id)
             
-            check_success = check_result.get('success')
-            check_data = check_result.get('data') or {}
-            player_exists = check_data.get('exists')
-            player_info = check_data.get('player') or {}
+            player_info = check_result.player
             
             # Если проверка явно показала что игрок не существует - отклоняем
-            if check_success and player_exists is False:
+            if check_result.success and check_result.exists is False:
                 try:
                     await checking_msg.delete()
                 except:
@@ -530,9 +621,6 @@ async def deposit_account_id_received(message: Message, state: FSMContext, bot:
                 await message.answer(get_text(lang, 'deposit', 'player_not_found'))
                 return
                 
-            # Если проверка успешна и игрок существует - используем данные
-            if check_success and (player_exists is True or player_info):
-                player_info = check_data.get('player') or {}
             # Если проверка не удалась (ошибка API, таймаут и т.д.) - пропускаем проверку
             # и продолжаем процесс пополнения
         except Exception as e:
@@ -589,6 +677,9 @@ async def deposit_amount_received(message: Message, state: FSMContext, bot: Bot)
     import logging
     logger = logging.getLogger(__name__)
     
+    # Задача отправки "Генерирую QR код..." (создается после проверки суммы)
+    notice_task = None
+    
     lang = await get_lang_from_state(state)
     
     # Игнорируем невидимые символы (например, неразрывный пробел)
@@ -650,6 +741,17 @@ async def deposit_amount_received(message: Message, state: FSMContext, bot: Bot)
             await cmd_start(message, state, bot)
             return
         
+        # Время до QR считаем от сообщения с суммой, весь путь до QR - не дольше DEPOSIT_QR_DEADLINE
+        loop = asyncio.get_running_loop()
+        started_at = loop.time()
+        deadline = started_at + Config.DEPOSIT_QR_DEADLINE
+        
+        # Сообщение о генерации QR (и очистка клавиатуры) уходит параллельно с резервированием суммы
+        notice_task = asyncio.create_task(message.answer(
+            get_text(lang, 'deposit', 'generating_qr'),
+            reply_markup=ReplyKeyboardRemove()
+        ))
+        
         # Получаем уникальную сумму с копейками (резервация на 10 минут)
         amount_with_cents = None
         try:
@@ -662,8 +764,8 @@ async def deposit_amount_received(message: Message, state: FSMContext, bot: Bot)
                 bot_type=Config.BOT_TYPE
             )
             # КРИТИЧНО: Проверяем, что админка вернула валидные данные
-            if unique_result.get('success') and unique_result.get('data', {}).get('amount'):
-                amount_str = str(unique_result.get('data', {}).get('amount'))
+            if unique_result.success and unique_result.amount:
+                amount_str = unique_result.amount
                 amount_with_cents = float(amount_str)
                 
                 # Проверяем, что копейки не равны 00 (проверяем и числовое, и строковое представление)
@@ -682,12 +784,11 @@ async def deposit_amount_received(message: Message, state: FSMContext, bot: Bot)
                     logger.error(f"[Deposit] ❌ КРИТИЧНО: Unique amount returned with zero cents ({amount_str}), fallback to random. This should NEVER happen!")
                     amount_with_cents = None
                 else:
-                    reservation_id = unique_result.get('data', {}).get('reservationId')
-                    if reservation_id:
-                        await state.update_data(uncreated_request_id=str(reservation_id))
+                    if unique_result.reservation_id:
+                        await state.update_data(uncreated_request_id=unique_result.reservation_id)
             else:
-                # Если админка вернула успешный ответ, но без данных - это ошибка
-                logger.warning(f"[Deposit] Admin returned success but no amount data: {unique_result}")
+                # Ошибка админки или успешный ответ без суммы
+                logger.warning(f"[Deposit] Admin returned no amount data: {unique_result}")
                 amount_with_cents = None
         except Exception as e:
             logger.error(f"[Deposit] ❌ Failed to get unique amount from admin, fallback to random: {e}")
@@ -712,79 +813,60 @@ async def deposit_amount_received(message: Message, state: FSMContext, bot: Bot)
         # Сохраняем сумму в состояние
         await state.update_data(amount=amount_with_cents)
         
-        # Показываем сообщение о генерации QR и очищаем клавиатуру
-        generating_msg = await message.answer(
-            get_text(lang, 'deposit', 'generating_qr'),
-            reply_markup=ReplyKeyboardRemove()
-        )
-        
-        try:
-            # Генерируем QR hash и получаем ссылки банков
+        async def qr_stage():
+            # QR hash и ссылки банков (админка)
             logger.info(f"[Deposit] Generating QR hash for amount: {amount_with_cents}, casino: {casino_id}")
             qr_result = await APIClient.generate_qr(amount_with_cents, 'omoney')
-            
-            logger.info(f"[Deposit] QR hash result: success={qr_result.get('success')}, error={qr_result.get('error')}")
-            
-            if not qr_result.get('success'):
-                error_msg = qr_result.get('error', 'Unknown error')
+            logger.info(f"[Deposit] QR hash result: success={qr_result.success}, error={qr_result.error}")
+            if not qr_result.success:
+                error_msg = qr_result.error or 'Unknown error'
                 logger.error(f"[Deposit] QR hash generation failed: {error_msg}")
-                await generating_msg.delete()
                 # Более детальное сообщение об ошибке
                 if 'No active wallet' in error_msg or 'requisite' in error_msg.lower():
-                    await message.answer("❌ Ошибка: не настроен активный кошелек для приема платежей. Обратитесь к администратору.")
-                else:
-                    await message.answer(get_text(lang, 'deposit', 'qr_error'))
-                return
-            
-            qr_hash = qr_result.get('qr_hash')
-            all_bank_urls = qr_result.get('all_bank_urls', {})
-            
-            if not qr_hash:
+                    raise QRStageFailed("❌ Ошибка: не настроен активный кошелек для приема платежей. Обратитесь к администратору.")
+                raise QRStageFailed(get_text(lang, 'deposit', 'qr_error'))
+            if not qr_result.qr_hash:
                 logger.error(f"[Deposit] QR hash is empty in response: {qr_result}")
-                await generating_msg.delete()
-                await message.answer(get_text(lang, 'deposit', 'qr_error'))
-                return
-            
-            logger.info(f"[Deposit] QR hash generated successfully: {qr_hash[:20]}...")
-            
-            # Генерируем QR изображение через payment_site API
+                raise QRStageFailed(get_text(lang, 'deposit', 'qr_error'))
+            logger.info(f"[Deposit] QR hash generated successfully: {qr_result.qr_hash[:20]}...")
+            return qr_result
+        
+        async def image_stage():
+            # Картинка QR (payment_site)
             logger.info(f"[Deposit] Generating QR image for amount: {amount_with_cents}")
             qr_image_result = await APIClient.generate_qr_image(amount_with_cents, 'omoney')
-            qr_image_base64 = qr_image_result.get('qr_image', '')
-            
-            logger.info(f"[Deposit] QR image result: has_image={bool(qr_image_base64)}, error={qr_image_result.get('error')}")
-            
-            if not qr_image_base64:
-                error_msg = qr_image_result.get('error', 'Unknown error')
+            qr_image_bytes = qr_image_result.get('qr_png')
+            logger.info(f"[Deposit] QR image result: has_image={bool(qr_image_bytes)}, error={qr_image_result.get('error')}")
+            if not qr_image_bytes:
+                error_msg = qr_image_result.get('error') or 'Unknown error'
                 logger.error(f"[Deposit] QR image generation failed: {error_msg}")
-                await generating_msg.delete()
                 # Более детальное сообщение об ошибке
                 if 'timeout' in error_msg.lower() or 'connection' in error_msg.lower():
-                    await message.answer("❌ Ошибка: не удалось подключиться к серверу генерации QR кода. Попробуйте позже.")
-                else:
-                    await message.answer(get_text(lang, 'deposit', 'qr_error'))
-                return
+                    raise QRStageFailed("❌ Ошибка: не удалось подключиться к серверу генерации QR кода. Попробуйте позже.")
+                raise QRStageFailed(get_text(lang, 'deposit', 'qr_error'))
+            return qr_image_bytes
+        
+        try:
+            # QR hash, картинка и настройки банков друг от друга не зависят - готовим параллельно,
+            # ошибка любого этапа отменяет остальные
+            stages = await run_stages(
+                deadline,
+                qr=qr_stage(),
+                image=image_stage(),
+                settings=replica.get_payment_settings(),
+            )
+            qr_result = stages['qr']
+            qr_image_bytes = stages['image']
+            settings = stages['settings']
             
             # Удаляем сообщение о генерации
-            try:
-                await generating_msg.delete()
-            except:
-                pass
-            
-            # Конвертируем base64 в bytes для отправки фото
-            # Убираем префикс data:image если есть
-            if qr_image_base64.startswith('data:image'):
-                qr_image_base64 = qr_image_base64.split(',', 1)[1]
-            
-            qr_image_bytes = base64.b64decode(qr_image_base64)
+            await delete_notice(notice_task)
             
             # Создаем inline кнопки банков со ссылками (URL кнопки)
             from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
             
-            # Получаем список банков из настроек или используем дефолтный
-            settings = await APIClient.get_payment_settings()
-            deposit_settings = settings.get('deposits', {})
-            enabled_banks = deposit_settings.get('banks', ['mbank', 'omoney', 'bakai', 'megapay', 'demir', 'balance']) if isinstance(deposit_settings, dict) else ['mbank', 'omoney', 'bakai', 'megapay', 'demir', 'balance']
+            # Список банков из настроек или дефолтный
+            enabled_banks = settings.deposit_banks if settings.deposit_banks is not None else ['mbank', 'omoney', 'bakai', 'megapay', 'demir', 'balance']
             
             # Маппинг ID банков на названия в all_bank_urls
             bank_name_map = {
@@ -801,7 +883,7 @@ async def deposit_amount_received(message: Message, state: FSMContext, bot: Bot)
             for bank in Config.DEPOSIT_BANKS:
                 if bank['id'] in enabled_banks:
                     bank_name_key = bank_name_map.get(bank['id'], bank['name'])
-                    bank_url = all_bank_urls.get(bank_name_key) or all_bank_urls.get(bank['id'])
+                    bank_url = qr_result.bank_url(bank_name_key, bank['id'])
                     if bank_url:
                         bank_buttons.append(InlineKeyboardButton(
                             text=bank['name'],
@@ -867,16 +949,18 @@ async def deposit_amount_received(message: Message, state: FSMContext, bot: Bot)
                     reply_markup=keyboard if keyboard else None  # Inline клавиатура с банками и отменой
                 )
             
-            try:
-                qr_message = await retry_telegram_api_call(
-                    send_qr_photo,
-                    max_retries=3,
-                    initial_delay=2.0,
-                    max_delay=15.0,
-                    backoff_factor=2.0
-                )
-            except TelegramNetworkError as e:
-                logger.error(f"[Deposit] Failed to send QR photo after retries: {e}")
+            async def send_qr_message():
+                """Фото QR, при сетевых ошибках - документом; None - не удалось"""
+                try:
+                    return await retry_telegram_api_call(
+                        send_qr_photo,
+                        max_retries=3,
+                        initial_delay=2.0,
+                        max_delay=15.0,
+                        backoff_factor=2.0
+                    )
+                except TelegramNetworkError as e:
+                    logger.error(f"[Deposit] Failed to send QR photo after retries: {e}")
                 # Fallback: пытаемся отправить как документ
                 try:
                     logger.info("[Deposit] Trying to send QR code as document as fallback...")
@@ -893,19 +977,28 @@ async def deposit_amount_received(message: Message, state: FSMContext, bot: Bot)
                         max_delay=10.0
                     )
                     logger.info("[Deposit] Successfully sent QR code as document")
+                    return qr_message
                 except Exception as fallback_error:
                     logger.error(f"[Deposit] Failed to send QR code as document: {fallback_error}")
-                    # Последний fallback: отправляем только текст с информацией
-                    await generating_msg.delete()
-                    await message.answer(
-                        f"{payment_text}\n\n⚠️ Не удалось отправить QR код. Пожалуйста, используйте кнопки банков выше для оплаты.",
-                        reply_markup=keyboard if keyboard else None
-                    )
-                    # Не можем продолжить без QR сообщения, возвращаемся в главное меню
-                    await state.clear()
-                    from handlers.start import cmd_start
-                    await cmd_start(message, state, bot)
-                    return
+                    return None
+            
+            # Отправка тоже укладывается в общий дедлайн
+            qr_message = await asyncio.wait_for(send_qr_message(), timeout=max(1.0, deadline - loop.time()))
+            if qr_message is None:
+                # Последний fallback: отправляем только текст с информацией
+                await message.answer(
+                    f"{payment_text}\n\n⚠️ Не удалось отправить QR код. Пожалуйста, используйте кнопки банков выше для оплаты.",
+                    reply_markup=keyboard if keyboard else None
+                )
+                # Не можем продолжить без QR сообщения, возвращаемся в главное меню
+                await state.clear()
+                from handlers.start import cmd_start
+                await cmd_start(message, state, bot)
+                return
+            
+            time_to_qr = (loop.time() - started_at) * 1000
+            observe('deposit.time_to_qr', time_to_qr)
+            logger.info(f"[Deposit] QR sent to user {message.from_user.id} in {time_to_qr:.0f} ms")
             
             # Сохраняем ID сообщения с QR-кодом для возможности удаления и обновления
             await state.update_data(qr_message_id=qr_message.message_id)
@@ -920,7 +1013,7 @@ async def deposit_amount_received(message: Message, state: FSMContext, bot: Bot)
             logger = logging.getLogger(__name__)
             # Таймер обновляет только текст, без клавиатуры
             # request_id не передаем, так как заявка еще не создана
-            timer_task = asyncio.create_task(update_qr_timer(bot, message.chat.id, qr_message.message_id, qr_created_at, timer_duration, lang, amount_with_cents, data.get("casino_name"), account_id, keyboard, state, None))
+            timer_task = start_qr_timer(bot, message.chat.id, qr_message.message_id, qr_created_at, timer_duration, lang, amount_with_cents, data.get("casino_name"), account_id, keyboard, state, None)
             logger.info(f"[Timer] Created timer task for message {qr_message.message_id}, chat {message.chat.id}")
             
             # Добавляем обработку ошибок для задачи
@@ -936,14 +1029,25 @@ async def deposit_amount_received(message: Message, state: FSMContext, bot: Bot)
             # Текст про отправку чека уже есть в caption сообщения с QR
             await state.set_state(DepositStates.waiting_for_receipt)
             
+        except QRStageFailed as stage_error:
+            inc('deposit.qr_failed')
+            await delete_notice(notice_task)
+            await message.answer(stage_error.text)
+            return
+        except asyncio.TimeoutError as deadline_error:
+            inc('deposit.qr_deadline_exceeded')
+            logger.error(f"[Deposit] QR not ready in {Config.DEPOSIT_QR_DEADLINE}s for user {message.from_user.id}: {deadline_error}")
+            await delete_notice(notice_task)
+            await message.answer(get_text(lang, 'deposit', 'qr_error'))
+            await state.clear()
+            from handlers.start import cmd_start
+            await cmd_start(message, state, bot)
+            return
         except TelegramNetworkError as network_error:
             import logging
             logger = logging.getLogger(__name__)
             logger.error(f"Telegram network error generating QR code: {network_error}", exc_info=True)
-            try:
-                await generating_msg.delete()
-            except:
-                pass
+            await delete_notice(notice_task)
             # Более детальное сообщение для сетевых ошибок
             if 'timeout' in str(network_error).lower():
                 await message.answer("❌ Ошибка: превышено время ожидания ответа от Telegram. Пожалуйста, попробуйте позже.")
@@ -957,10 +1061,7 @@ async def deposit_amount_received(message: Message, state: FSMContext, bot: Bot)
             import logging
             logger = logging.getLogger(__name__)
             logger.error(f"Error generating QR code: {qr_error}", exc_info=True)
-            try:
-                await generating_msg.delete()
-            except:
-                pass
+            await delete_notice(notice_task)
             await message.answer(get_text(lang, 'deposit', 'qr_error'))
             await state.clear()
             from handlers.start import cmd_start
@@ -984,6 +1085,7 @@ async def deposit_amount_received(message: Message, state: FSMContext, bot: Bot)
         import logging
         logger = logging.getLogger(__name__)
         logger.error(f"Error in deposit_amount_received: {e}", exc_info=True)
+        await delete_notice(notice_task)
         lang = await get_lang_from_state(state)
         
         # Проверяем, что данные есть в состоянии
@@ -1085,18 +1187,10 @@ async def deposit_receipt_received(message: Message, state: FSMContext, bot: Bot
             pass
     
     try:
-        # Получаем самое большое фото
-        photo = message.photo[-1]
-        
-        # Скачиваем фото
-        file = await bot.get_file(photo.file_id)
-        file_bytes = await bot.download_file(file.file_path)
-        
-        # Конвертируем в base64
-        photo_bytes = file_bytes.read()
-        photo_base64 = base64.b64encode(photo_bytes).decode('utf-8')
-        # Добавляем префикс для base64 изображения
-        photo_base64_with_prefix = f'data:image/jpeg;base64,{photo_base64}'
+        # Скачиваем наименьший подходящий размер фото (при необходимости пережимается)
+        # (повторно присланный чек не скачивается и уходит в API ссылкой по sha256)
+        receipt = await load_receipt(bot, message.photo)
+        reload_receipt = lambda: load_receipt(bot, message.photo, use_cache=False)
         
         # Получаем данные из состояния (уже проверили выше, но получаем еще раз для использования)
         data = await state.get_data()
@@ -1113,54 +1207,66 @@ async def deposit_receipt_received(message: Message, state: FSMContext, bot: Bot
             await cmd_start(message, state, bot)
             return
         
-        # КРИТИЧЕСКОЕ ИСПРАВЛЕНИЕ: Проверяем, есть ли уже pending заявка для этого пользователя
-        # Если есть - ОБНОВЛЯЕМ её, а не создаем новую (защита от двойного зачисления)
+        # Заявкой владеет сам диалог: ее ID хранится в FSM (pending_request_id), поэтому
+        # чек уходит одним запросом - в свою заявку или на создание новой. Поиск pending
+        # заявки нужен только при конфликте: админка ответила, что у пользователя уже есть
+        # активная заявка (например, ответ на прошлое создание не дошел до бота) - тогда
+        # чек дописывается в нее, а не создается вторая заявка (защита от двойного зачисления).
         import logging
         logger = logging.getLogger(__name__)
         
-        pending_request = None
-        request_id = None
-        
-        try:
-            pending_result = await APIClient.get_pending_request(
-                telegram_user_id=str(message.from_user.id),
-                request_type='deposit'
+        def update_with_receipt(pending_request_id):
+            logger.info(f"[Deposit] Updating request {pending_request_id} with receipt photo")
+            return upload_receipt(
+                lambda **photo: APIClient.update_request(request_id=str(pending_request_id), **photo),
+                receipt,
+                reload=reload_receipt,
             )
-            if pending_result.get('success') and pending_result.get('data'):
-                pending_request = pending_result.get('data')
-                logger.info(f"[Deposit] Found pending request {pending_request.get('id')} for user {message.from_user.id}")
-        except Exception as e:
-            logger.warning(f"[Deposit] Error checking pending request: {e}, will create new request")
         
-        # Если есть pending заявка - ОБНОВЛЯЕМ её, иначе создаем новую
-        if pending_request and pending_request.get('id'):
-            pending_request_id = pending_request.get('id')
-            logger.info(f"[Deposit] Updating existing request {pending_request_id} with receipt photo")
-            
-            result = await APIClient.update_request(
-                request_id=str(pending_request_id),
-                receipt_photo=photo_base64_with_prefix
-            )
-            request_id = pending_request_id
+        request_id = data.get('pending_request_id')
+        if request_id:
+            result = await update_with_receipt(request_id)
+            if not result.get('success'):
+                # Следующая попытка пойдет через создание и при конфликте найдет заявку заново
+                await state.update_data(pending_request_id=None)
         else:
-            # Создаем новую заявку только если нет pending заявки
             logger.info(f"[Deposit] Creating new request for user {message.from_user.id}")
-            result = await APIClient.create_request(
-                telegram_user_id=str(message.from_user.id),
-                request_type='deposit',
-                amount=amount,
-                bookmaker=casino_id,
-                bank=bank_id,
-                account_id=account_id,
-                telegram_username=message.from_user.username,
-                telegram_first_name=message.from_user.first_name,
-                telegram_last_name=message.from_user.last_name,
-                receipt_photo=photo_base64_with_prefix,
-                uncreated_request_id=data.get('uncreated_request_id'),
-                bot_type=Config.BOT_TYPE
+            result = await upload_receipt(
+                lambda **photo: APIClient.create_request(
+                    telegram_user_id=str(message.from_user.id),
+                    request_type='deposit',
+                    amount=amount,
+                    bookmaker=casino_id,
+                    bank=bank_id,
+                    account_id=account_id,
+                    telegram_username=message.from_user.username,
+                    telegram_first_name=message.from_user.first_name,
+                    telegram_last_name=message.from_user.last_name,
+                    uncreated_request_id=data.get('uncreated_request_id'),
+                    bot_type=Config.BOT_TYPE,
+                    **photo
+                ),
+                receipt,
+                reload=reload_receipt,
             )
             if result.get('success') and result.get('data'):
                 request_id = result.get('data', {}).get('id')
+            elif result.get('activeRequestId'):
+                # Конфликт: проверяем, что активная заявка действительно pending, и дописываем чек в нее
+                active_request_id = result['activeRequestId']
+                try:
+                    pending_result = await APIClient.get_pending_request(
+                        telegram_user_id=str(message.from_user.id),
+                        request_type='deposit'
+                    )
+                except Exception as e:
+                    logger.warning(f"[Deposit] Error checking pending request: {e}")
+                    pending_result = None
+                if pending_result is not None and pending_result.found and str(pending_result.id) == str(active_request_id):
+                    logger.info(f"[Deposit] Found pending request {active_request_id} for user {message.from_user.id}")
+                    request_id = active_request_id
+                    await state.update_data(pending_request_id=request_id)
+                    result = await update_with_receipt(request_id)
         
         if result.get('success'):
             # Заявка создана или обновлена успешно
@@ -1179,16 +1285,17 @@ async def deposit_receipt_received(message: Message, state: FSMContext, bot: Bot
             
             # Сохраняем ID сообщения в заявке через API (в фоне, не блокируя ответ пользователю)
             if request_id and request_created_msg.message_id:
+                message_id = request_created_msg.message_id
+                
                 async def save_message_id_background():
-                    try:
-                        await APIClient.update_request_message_id(request_id, request_created_msg.message_id)
-                    except Exception as e:
-                        import logging
-                        logger = logging.getLogger(__name__)
-                        logger.warning(f"Failed to save request message ID: {e}")
+                    result = await write_batcher.update_message_id(request_id, message_id)
+                    if not result.get('success'):
+                        raise RuntimeError(result.get('error') or 'Failed to save request message ID')
                 
-                # Запускаем в фоне, не ждем завершения
-                asyncio.create_task(save_message_id_background())
+                # В фоне, не ждем завершения: группа request-writes повторит при ошибке,
+                # при остановке бота задача дорабатывает
+                submit('request-writes', save_message_id_background,
+                       key=('message-id', request_id), name=f"save-message-id-{request_id}")
             # ВАЖНО: Очищаем state после успешной обработки фото чека
             # Это закрывает стейт и предотвращает прием новых сообщений
             await state.clear()
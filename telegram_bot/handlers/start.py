@@ -1,11 +1,15 @@
 import asyncio
 from aiogram import Router, F, Bot
-from aiogram.types import Message, ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery
+from aiogram.types import Message, ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery, ChatMemberUpdated
 from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
 from config import Config
 from translations import get_text
 from api_client import APIClient
+from api_models import PaymentSettings
+import profiles
+import replica
+import subscriptions
 
 router = Router()
 
@@ -20,13 +24,21 @@ async def get_lang_from_state(state: FSMContext) -> str:
     data = await state.get_data()
     return data.get('language', 'ru')
 
-async def check_channel_subscription(bot: Bot, user_id: int, channel: str) -> bool:
+async def check_channel_subscription(bot: Bot, user_id: int, channel: str, recheck_negative: bool = False) -> bool:
     """Проверить подписку пользователя на канал
     
     Поддерживает:
     - ID канала (например, -1002450771165)
     - Username канала (например, @bingokg_news)
+    
+    Сначала смотрим кэш (subscriptions.py, обновляется chat_member апдейтами),
+    в Telegram идем только при промахе. recheck_negative=True - не верить
+    закэшированному "не подписан" (кнопка "Я подписался").
     """
+    cached = subscriptions.get_cached(channel, user_id)
+    if cached is True or (cached is False and not recheck_negative):
+        return cached
+    
     try:
         # Определяем формат канала
         # Если начинается с минуса или это число - это ID канала
@@ -50,7 +62,9 @@ async def check_channel_subscription(bot: Bot, user_id: int, channel: str) -> bo
         # Проверяем статус подписки
         # member, administrator, creator - подписан
         # left, kicked - не подписан
-        return chat_member.status in ['member', 'administrator', 'creator']
+        is_subscribed = chat_member.status in subscriptions.SUBSCRIBED_STATUSES
+        subscriptions.remember(channel, user_id, is_subscribed)
+        return is_subscribed
     except asyncio.TimeoutError:
         # Таймаут - считаем что подписан, чтобы не блокировать бота
         print(f"Error checking channel subscription: Request timeout")
@@ -60,6 +74,11 @@ async def check_channel_subscription(bot: Bot, user_id: int, channel: str) -> bo
         print(f"Error checking channel subscription: {e}")
         return True
 
+@router.chat_member()
+async def on_channel_member_update(event: ChatMemberUpdated):
+    """Вступление/выход пользователя из канала - обновляем кэш подписки"""
+    subscriptions.record_chat_member(event)
+
 @router.message(Command("start"))
 async def cmd_start(message: Message, state: FSMContext, bot: Bot):
     import logging
@@ -86,7 +105,7 @@ async def cmd_start(message: Message, state: FSMContext, bot: Bot):
         # Проверяем блокировку пользователя (с таймаутом)
         try:
             blocked_check = await asyncio.wait_for(
-                APIClient.check_blocked(str(message.from_user.id)),
+                profiles.check_blocked(str(message.from_user.id)),
                 timeout=3.0  # 3 секунды таймаут
             )
             if blocked_check.get('success') and blocked_check.get('data', {}).get('blocked'):
@@ -106,14 +125,14 @@ async def cmd_start(message: Message, state: FSMContext, bot: Bot):
             # Продолжаем работу, если проверка не удалась
         
         # Проверяем pause режим (с таймаутом)
-        settings = {}
+        settings = PaymentSettings()
         try:
             settings = await asyncio.wait_for(
-                APIClient.get_payment_settings(),
+                replica.get_payment_settings(),
                 timeout=3.0  # 3 секунды таймаут
             )
-            if settings.get('pause', False):
-                maintenance_message = settings.get('maintenance_message', get_text(lang, 'start', 'bot_paused'))
+            if settings.pause:
+                maintenance_message = settings.maintenance_message or get_text(lang, 'start', 'bot_paused')
                 try:
                     await message.answer(maintenance_message)
                     logger.info(f"[Start] Bot is paused, sent maintenance message to user {message.from_user.id}")
@@ -128,10 +147,10 @@ async def cmd_start(message: Message, state: FSMContext, bot: Bot):
             # Если не удалось получить настройки, продолжаем работу
     
         # Проверяем подписку на канал (только если включена)
-        require_subscription = settings.get('require_channel_subscription', True)
+        require_subscription = settings.require_channel_subscription
         # Используем channel_id если есть, иначе channel
-        channel_id = settings.get('channel_id')
-        channel = settings.get('channel') or Config.CHANNEL
+        channel_id = settings.channel_id
+        channel = settings.channel or Config.CHANNEL
         # Определяем какой идентификатор использовать для проверки
         channel_to_check = channel_id if channel_id else channel
         
@@ -224,10 +243,10 @@ async def check_subscription_callback(callback: CallbackQuery, state: FSMContext
     lang = await get_lang_from_state(state)
     
     # Получаем настройки для канала (с таймаутом)
-    settings = {}
+    settings = PaymentSettings()
     try:
         settings = await asyncio.wait_for(
-            APIClient.get_payment_settings(),
+            replica.get_payment_settings(),
             timeout=3.0  # 3 секунды таймаут
         )
     except asyncio.TimeoutError:
@@ -236,8 +255,8 @@ async def check_subscription_callback(callback: CallbackQuery, state: FSMContext
         pass
     
     # Используем channel_id если есть, иначе channel
-    channel_id = settings.get('channel_id')
-    channel = settings.get('channel') or Config.CHANNEL
+    channel_id = settings.channel_id
+    channel = settings.channel or Config.CHANNEL
     # Определяем какой идентификатор использовать для проверки
     channel_to_check = channel_id if channel_id else channel
     
@@ -250,8 +269,8 @@ async def check_subscription_callback(callback: CallbackQuery, state: FSMContext
             logger.warning(f"[CheckSubscription] Failed to answer callback: {e}")
         return
     
-    # Проверяем подписку
-    is_subscribed = await check_channel_subscription(bot, callback.from_user.id, channel_to_check)
+    # Проверяем подписку (отрицательный ответ из кэша перепроверяем - пользователь только что подписался)
+    is_subscribed = await check_channel_subscription(bot, callback.from_user.id, channel_to_check, recheck_negative=True)
     
     if is_subscribed:
         # ВАЖНО: Отвечаем на callback сразу, чтобы избежать ошибки "query is too old"
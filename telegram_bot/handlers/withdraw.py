@@ -5,8 +5,12 @@ from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, ReplyKeybo
 from states import WithdrawStates
 from config import Config
 from api_client import APIClient
+import profiles
+import replica
+from receipts import load_receipt, receipt_base64, receipt_from_base64, upload_receipt
+import write_batcher
+from tasks import submit
 from translations import get_text
-import base64
 import io
 from pathlib import Path
 
@@ -59,7 +63,7 @@ async def withdraw_start(message: Message, state: FSMContext):
     # ВАЖНО: Проверяем блокировку пользователя СРАЗУ, до начала процесса
     try:
         blocked_check = await asyncio.wait_for(
-            APIClient.check_blocked(str(message.from_user.id)),
+            profiles.check_blocked(str(message.from_user.id)),
             timeout=2.0  # Максимум 2 секунды на проверку
         )
         if blocked_check.get('success') and blocked_check.get('data', {}).get('blocked'):
@@ -81,22 +85,16 @@ async def withdraw_start(message: Message, state: FSMContext):
     await state.update_data(language=lang)
     
     # Получаем настройки из админки
-    settings = await APIClient.get_payment_settings()
+    settings = await replica.get_payment_settings()
     
     # Проверяем pause режим
-    if settings.get('pause', False):
-        maintenance_message = settings.get('maintenance_message', get_text(lang, 'start', 'bot_paused'))
+    if settings.pause:
+        maintenance_message = settings.maintenance_message or get_text(lang, 'start', 'bot_paused')
         await message.answer(maintenance_message)
         return
     
     # Проверяем, включены ли выводы
-    withdrawals = settings.get('withdrawals', {})
-    if isinstance(withdrawals, dict):
-        withdrawals_enabled = withdrawals.get('enabled', True)
-    else:
-        withdrawals_enabled = withdrawals if withdrawals is not False else True
-    
-    if not withdrawals_enabled:
+    if not settings.withdrawals_enabled:
         await message.answer(get_text(lang, 'withdraw', 'withdrawals_disabled'))
         return
     
@@ -139,9 +137,8 @@ async def withdraw_casino_selected(callback: CallbackQuery, state: FSMContext):
     casino_id = callback.data.replace('withdraw_casino_', '')
     
     # Проверяем, включено ли казино
-    settings = await APIClient.get_payment_settings()
-    enabled_casinos = settings.get('casinos', {})
-    if enabled_casinos.get(casino_id, True) is False:
+    settings = await replica.get_payment_settings()
+    if not settings.casino_enabled(casino_id):
         await callback.answer(get_text(lang, 'withdraw', 'casino_disabled', default='❌ Это казино временно отключено'), show_alert=True)
         return
     
@@ -156,11 +153,10 @@ async def withdraw_casino_selected(callback: CallbackQuery, state: FSMContext):
         pass  # Игнорируем ошибки удаления (если сообщение уже удалено или нет прав)
     
     # Получаем настройки из админки для фильтрации банков
-    settings = await APIClient.get_payment_settings()
-    withdrawals_settings = settings.get('withdrawals', {})
+    settings = await replica.get_payment_settings()
     # Используем дефолтный список всех банков из конфига, если настройки не получены
     default_banks = [bank['id'] for bank in Config.WITHDRAW_BANKS]
-    enabled_banks = withdrawals_settings.get('banks', default_banks) if isinstance(withdrawals_settings, dict) else default_banks
+    enabled_banks = settings.withdrawal_banks if settings.withdrawal_banks is not None else default_banks
     
     # Создаем инлайн клавиатуру для банков
     keyboard = InlineKeyboardMarkup(inline_keyboard=[])
@@ -220,7 +216,7 @@ async def withdraw_bank_selected(callback: CallbackQuery, state: FSMContext, bot
     # Получаем последний номер телефона из последней заявки на вывод
     saved_phone = None
     try:
-        saved_phone = await APIClient.get_last_withdraw_phone(str(callback.from_user.id))
+        saved_phone = await profiles.get_last_withdraw_phone(str(callback.from_user.id))
     except Exception:
         pass  # Игнорируем ошибки получения номера
     
@@ -286,23 +282,11 @@ async def withdraw_phone_received(message: Message, state: FSMContext, bot: Bot)
 @router.message(WithdrawStates.waiting_for_qr_photo, F.photo)
 async def withdraw_qr_photo_received(message: Message, state: FSMContext):
     """Фото QR кода получено, запрашиваем ID казино"""
-    # Получаем фото
-    photo = message.photo[-1]  # Берем фото наибольшего размера
-    
-    # Скачиваем фото и конвертируем в base64
-    file = await message.bot.get_file(photo.file_id)
-    
-    # Получаем байты фото
-    photo_bytes = await message.bot.download_file(file.file_path)
-    # В aiogram 3 download_file возвращает BytesIO
-    if hasattr(photo_bytes, 'getvalue'):
-        photo_data = photo_bytes.getvalue()
-    elif hasattr(photo_bytes, 'read'):
-        photo_data = photo_bytes.read()
-    else:
-        photo_data = bytes(photo_bytes)
-    
-    photo_base64 = base64.b64encode(photo_data).decode('utf-8')
+    # Скачиваем наименьший подходящий размер фото и конвертируем в base64.
+    # Без кэша: фото хранится в FSM целиком, поэтому ссылка на уже загруженный
+    # чек (data = None) здесь не годится, даже если этот QR уже присылали
+    receipt = await load_receipt(message.bot, message.photo, use_cache=False)
+    photo_base64 = receipt_base64(receipt)
     
     await state.update_data(qr_photo=photo_base64)
     
@@ -316,7 +300,7 @@ async def withdraw_qr_photo_received(message: Message, state: FSMContext):
     saved_account_id = None
     if casino_id:
         try:
-            saved_id_result = await APIClient.get_saved_casino_account_id(str(message.from_user.id), casino_id)
+            saved_id_result = await profiles.get_saved_casino_account_id(str(message.from_user.id), casino_id)
             if saved_id_result.get('success') and saved_id_result.get('data', {}).get('accountId'):
                 saved_account_id = saved_id_result.get('data', {}).get('accountId')
         except Exception:
@@ -386,7 +370,7 @@ async def withdraw_account_id_received(message: Message, state: FSMContext, bot:
     casino_id = data.get('casino_id')
     if casino_id:
         try:
-            await APIClient.save_casino_account_id(str(message.from_user.id), casino_id, account_id)
+            await profiles.save_casino_account_id(str(message.from_user.id), casino_id, account_id)
         except Exception:
             pass  # Игнорируем ошибки сохранения
     
@@ -394,7 +378,7 @@ async def withdraw_account_id_received(message: Message, state: FSMContext, bot:
     try:
         import asyncio
         blocked_check = await asyncio.wait_for(
-            APIClient.check_blocked(str(message.from_user.id), account_id),
+            profiles.check_blocked(str(message.from_user.id), account_id),
             timeout=2.0  # Максимум 2 секунды на проверку
         )
         if blocked_check.get('success') and blocked_check.get('data', {}).get('blocked'):
@@ -542,21 +526,29 @@ async def withdraw_code_received(message: Message, state: FSMContext, bot: Bot):
         logger.info(f"[Withdraw] Using botType from Config: {bot_type} (casino: {casino_id})")
         
         # Создаем заявку на вывод
-        request_data = await APIClient.create_request(
-            telegram_user_id=str(message.from_user.id),
-            request_type='withdraw',
-            amount=withdraw_amount,  # Используем полученную сумму или 0
-            bookmaker=casino_id,
-            bank=data.get('bank_id'),
-            phone=data.get('phone'),
-            account_id=account_id,
-            telegram_username=message.from_user.username,
-            telegram_first_name=message.from_user.first_name,
-            telegram_last_name=message.from_user.last_name,
-            receipt_photo=data.get('qr_photo'),
-            withdrawal_code=withdrawal_code,
-            bot_type=bot_type,  # Передаем botType из конфига (main/1xbet/mostbet)
-        )
+        def send_withdraw_request(receipt_photo=None, receipt_hash=None):
+            return APIClient.create_request(
+                telegram_user_id=str(message.from_user.id),
+                request_type='withdraw',
+                amount=withdraw_amount,  # Используем полученную сумму или 0
+                bookmaker=casino_id,
+                bank=data.get('bank_id'),
+                phone=data.get('phone'),
+                account_id=account_id,
+                telegram_username=message.from_user.username,
+                telegram_first_name=message.from_user.first_name,
+                telegram_last_name=message.from_user.last_name,
+                receipt_photo=receipt_photo,
+                receipt_hash=receipt_hash,
+                withdrawal_code=withdrawal_code,
+                bot_type=bot_type,  # Передаем botType из конфига (main/1xbet/mostbet)
+            )
+        
+        # QR фото уходит ссылкой по sha256, если такой файл уже загружался
+        if data.get('qr_photo'):
+            request_data = await upload_receipt(send_withdraw_request, receipt_from_base64(data.get('qr_photo')))
+        else:
+            request_data = await send_withdraw_request()
         
         # Проверяем, не вернулась ли существующая заявка (дубликат)
         if request_data.get('message') == 'Request already exists':
@@ -569,6 +561,8 @@ async def withdraw_code_received(message: Message, state: FSMContext, bot: Bot):
             request_id = request_data.get('data', {}).get('id')
         
         if request_id:
+            profiles.remember_withdraw_phone(str(message.from_user.id), data.get('phone'))
+            
             # Формируем сообщение с суммой для всех казино
             if withdraw_amount > 0:
                 # Форматируем сумму без лишних нулей
@@ -608,17 +602,17 @@ async def withdraw_code_received(message: Message, state: FSMContext, bot: Bot):
             
             # Сохраняем ID сообщения в заявке через API (в фоне, не блокируя ответ пользователю)
             if request_id and request_created_msg.message_id:
+                message_id = request_created_msg.message_id
+                
                 async def save_message_id_background():
-                    try:
-                        await APIClient.update_request_message_id(request_id, request_created_msg.message_id)
-                    except Exception as e:
-                        import logging
-                        logger = logging.getLogger(__name__)
-                        logger.warning(f"Failed to save request message ID: {e}")
+                    result = await write_batcher.update_message_id(request_id, message_id)
+                    if not result.get('success'):
+                        raise RuntimeError(result.get('error') or 'Failed to save request message ID')
                 
-                # Запускаем в фоне, не ждем завершения
-                import asyncio
-                asyncio.create_task(save_message_id_background())
+                # В фоне, не ждем завершения: группа request-writes повторит при ошибке,
+                # при остановке бота задача дорабатывает
+                submit('request-writes', save_message_id_background,
+                       key=('message-id', request_id), name=f"save-message-id-{request_id}")
         else:
             await message.answer(get_text(lang, 'withdraw', 'error'))
         
@@ -0,0 +1,112 @@
+"""
+Задержки API админки: адаптивные таймауты и hedged запросы
+
+Раньше таймауты были захардкожены в каждом методе APIClient (2, 3, 5, 10 с) и никак
+не зависели от того, как API отвечает на самом деле. Здесь для каждого endpoint
+(отдельно локальный и fallback URL) хранятся последние LATENCY_WINDOW замеров:
+
+- timeout(): p99 * LATENCY_TIMEOUT_MULTIPLIER, но не меньше LATENCY_TIMEOUT_FLOOR
+  и не больше прежнего захардкоженного значения. Пока замеров мало - прежнее значение;
+- hedge_delay(): p95. Для идемпотентных чтений (настройки, проверка блокировки,
+  pending заявка) hedged() отправляет второй запрос на другой endpoint, если первый
+  не ответил за это время, и берет тот ответ, что придет раньше.
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+
+from config import Config
+from metrics import inc, observe
+
+logger = logging.getLogger(__name__)
+
+# endpoint -> deque последних задержек, мс
+_samples = {}
+
+
+def endpoint_key(name: str, api_url: str) -> str:
+    """'payment-settings@local' / 'payment-settings@remote'"""
+    return f"{name}@{'local' if api_url.startswith('http://localhost') else 'remote'}"
+
+
+def record(key: str, ms: float):
+    samples = _samples.get(key)
+    if samples is None:
+        samples = _samples[key] = deque(maxlen=Config.LATENCY_WINDOW)
+    samples.append(ms)
+    observe(f'api.{key}', ms)
+
+
+def percentile(key: str, p: float):
+    """p-й перцентиль задержки в мс или None, если замеров меньше LATENCY_MIN_SAMPLES"""
+    samples = _samples.get(key)
+    if not samples or len(samples) < Config.LATENCY_MIN_SAMPLES:
+        return None
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def timeout(key: str, default: float) -> float:
+    """Таймаут запроса в секундах по наблюдаемой задержке"""
+    p99 = percentile(key, 99)
+    if p99 is None:
+        return default
+    return min(default, max(Config.LATENCY_TIMEOUT_FLOOR, p99 / 1000 * Config.LATENCY_TIMEOUT_MULTIPLIER))
+
+
+def hedge_delay(key: str, default: float) -> float:
+    """Через сколько секунд без ответа отправлять второй запрос"""
+    p95 = percentile(key, 95)
+    if p95 is None:
+        return default
+    return max(Config.LATENCY_HEDGE_MIN_DELAY, p95 / 1000)
+
+
+class measure:
+    """with latency.measure(key): ... - записать длительность блока"""
+
+    def __init__(self, key: str):
+        self.key = key
+
+    def __enter__(self):
+        self.started = time.monotonic()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # Быстрые отказы (connection refused) и отмененные hedged запросы задержку не отражают,
+        # таймаут записываем: это нижняя граница реальной задержки
+        if exc_type is None or issubclass(exc_type, asyncio.TimeoutError):
+            record(self.key, (time.monotonic() - self.started) * 1000)
+        return False
+
+
+async def hedged(primary, secondary, delay: float):
+    """
+    Выполнить primary(); если за delay секунд ответа нет (или он упал), запустить
+    secondary() и вернуть первый успешный результат. Проигравший запрос отменяется.
+
+    primary/secondary - корутинные функции без аргументов, ошибка = исключение.
+    """
+    first = asyncio.create_task(primary())
+    done, _ = await asyncio.wait({first}, timeout=delay)
+    if done and first.exception() is None:
+        return first.result()
+
+    inc('api_hedge_sent')
+    second = asyncio.create_task(secondary())
+    pending = {task for task in (first, second) if not task.done()}
+    last_error = first.exception() if first.done() else None
+    while pending:
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            if task.exception() is None:
+                for other in pending:
+                    other.cancel()
+                if task is second:
+                    inc('api_hedge_won')
+                return task.result()
+            last_error = task.exception()
+    raise last_error
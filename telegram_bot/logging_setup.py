@@ -0,0 +1,228 @@
+"""
+Неблокирующее логирование для ботов
+
+- QueueHandler в потоке event loop'а только кладет запись в очередь,
+  форматирование, редактирование секретов и запись в stdout делает
+  фоновый поток QueueListener
+- вывод компактными JSON строками (LOG_FORMAT=text - привычный текстовый формат)
+- ограничение частоты на логгер и сэмплирование повторяющихся сообщений
+  (например, "[Timer] Could not update message ...")
+- из вывода вырезаются токены ботов, секреты из .env и base64 блобы
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import re
+import threading
+import time
+from datetime import datetime, timezone
+
+from config import Config
+
+# Токен бота Telegram: <bot_id>:<35 символов>
+_BOT_TOKEN_RE = re.compile(r'\b\d{6,12}:[A-Za-z0-9_-]{30,}\b')
+# data URI с base64 (чеки, QR коды)
+_DATA_URI_RE = re.compile(r'data:([\w/+.-]+);base64,[A-Za-z0-9+/=]{32,}')
+# Длинные "голые" base64 строки
+_BASE64_RE = re.compile(r'[A-Za-z0-9+/]{200,}={0,2}')
+
+_SECRET_ENV_SUFFIXES = ('TOKEN', 'KEY', 'SECRET', 'PASSWORD')
+
+_listener = None
+
+
+def _collect_secrets():
+    """Значения секретных переменных окружения, которые не должны попасть в лог"""
+    secrets = []
+    for name, value in os.environ.items():
+        if value and len(value) >= 8 and name.upper().endswith(_SECRET_ENV_SUFFIXES):
+            secrets.append(value)
+    # Длинные сначала, чтобы не оставлять хвосты при вложенных значениях
+    return sorted(set(secrets), key=len, reverse=True)
+
+
+def redact(text: str, secrets=()) -> str:
+    """Убрать из строки токены, секреты и base64 данные"""
+    for secret in secrets:
+        if secret in text:
+            text = text.replace(secret, '<redacted>')
+    text = _BOT_TOKEN_RE.sub('<redacted-token>', text)
+    text = _DATA_URI_RE.sub(lambda m: f'data:{m.group(1)};base64,<{len(m.group(0))} chars>', text)
+    text = _BASE64_RE.sub(lambda m: f'<base64 {len(m.group(0))} chars>', text)
+    return text
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна запись - одна компактная JSON строка"""
+
+    def __init__(self, secrets=()):
+        super().__init__()
+        self._secrets = secrets
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': redact(record.getMessage(), self._secrets),
+        }
+        suppressed = getattr(record, 'suppressed', 0)
+        if suppressed:
+            entry['suppressed'] = suppressed
+        if record.exc_text:
+            entry['exc'] = redact(record.exc_text, self._secrets)
+        return json.dumps(entry, ensure_ascii=False, separators=(',', ':'))
+
+
+class RedactingTextFormatter(logging.Formatter):
+    """Текстовый формат (как раньше в basicConfig), но с редактированием секретов"""
+
+    def __init__(self, secrets=()):
+        super().__init__('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+        self._secrets = secrets
+
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        suppressed = getattr(record, 'suppressed', 0)
+        if suppressed:
+            text += f' [+{suppressed} similar suppressed]'
+        return redact(text, self._secrets)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Ограничение частоты логов (ERROR и выше пропускаются всегда)
+
+    - на каждый логгер: не больше rate_per_logger записей в секунду (token bucket)
+    - одинаковые сообщения (тот же логгер, уровень и шаблон msg): первые
+      sample_after за окно проходят, дальше - каждое sample_every-е с
+      количеством подавленных в поле suppressed
+    """
+
+    def __init__(self, rate_per_logger: float, burst: int, sample_after: int, sample_every: int, window: float = 60.0):
+        super().__init__()
+        self.rate = rate_per_logger
+        self.burst = burst
+        self.sample_after = sample_after
+        self.sample_every = max(1, sample_every)
+        self.window = window
+        self._buckets = {}   # logger -> [tokens, last_ts]
+        self._repeats = {}   # (logger, level, template) -> [window_start, seen, suppressed]
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.ERROR:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            if not self._take_token(record.name, now):
+                return False
+            return self._sample(record, now)
+
+    def _take_token(self, name: str, now: float) -> bool:
+        if self.rate <= 0:
+            return True
+        bucket = self._buckets.get(name)
+        if bucket is None:
+            bucket = self._buckets[name] = [float(self.burst), now]
+        tokens = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+        bucket[1] = now
+        if tokens < 1:
+            bucket[0] = tokens
+            return False
+        bucket[0] = tokens - 1
+        return True
+
+    def _sample(self, record: logging.LogRecord, now: float) -> bool:
+        # record.msg - шаблон до подстановки аргументов, поэтому ленивые
+        # logger.warning("... %s", x) группируются, а f-строки - нет
+        key = (record.name, record.levelno, str(record.msg))
+        state = self._repeats.get(key)
+        if state is None or now - state[0] > self.window:
+            if len(self._repeats) > 5000:
+                self._repeats.clear()
+            self._repeats[key] = [now, 1, 0]
+            return True
+        state[1] += 1
+        if state[1] <= self.sample_after:
+            return True
+        if (state[1] - self.sample_after) % self.sample_every == 0:
+            record.suppressed = state[2]
+            state[2] = 0
+            return True
+        state[2] += 1
+        return False
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler, который при переполнении очереди теряет запись, а не блокирует loop"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Подставляем аргументы сразу (они могут измениться после возврата из
+        # вызова), а форматирование и редактирование оставляем фоновому потоку
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def setup_logging(level: str = None, fmt: str = None):
+    """Настроить корневой логгер процесса (вызывать один раз при старте)"""
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    level_name = (level or Config.LOG_LEVEL).upper()
+    fmt = (fmt or Config.LOG_FORMAT).lower()
+    secrets = _collect_secrets()
+
+    stream_handler = logging.StreamHandler()
+    if fmt == 'text':
+        stream_handler.setFormatter(RedactingTextFormatter(secrets))
+    else:
+        stream_handler.setFormatter(JsonFormatter(secrets))
+
+    log_queue = queue.Queue(maxsize=Config.LOG_QUEUE_SIZE)
+    queue_handler = NonBlockingQueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(
+        rate_per_logger=Config.LOG_RATE_PER_LOGGER,
+        burst=Config.LOG_RATE_BURST,
+        sample_after=Config.LOG_SAMPLE_AFTER,
+        sample_every=Config.LOG_SAMPLE_EVERY,
+    ))
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(getattr(logging, level_name, logging.INFO))
+
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=False)
+    _listener.start()
+    atexit.register(shutdown_logging)
+    return _listener
+
+
+def shutdown_logging():
+    """Дописать очередь и остановить фоновый поток"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,164 @@
+"""
+Детектор блокировок event loop
+
+Синхронная работа в обработчиках (base64 больших чеков, PIL, разбор большого JSON)
+останавливает весь бот. metrics.py показывает только величину задержки loop,
+здесь находим, КТО его блокирует:
+
+- задача в loop каждые LOOP_MONITOR_INTERVAL секунд обновляет отметку времени;
+- сторожевой поток видит, что отметка не обновлялась дольше LOOP_MONITOR_THRESHOLD_MS,
+  и снимает стек потока event loop (sys._current_frames) прямо во время блокировки;
+- когда loop отпускает, блокировка записывается с полной длительностью.
+
+Блокировки группируются по месту в нашем коде (первый кадр стека не из библиотек).
+Счетчики и тайминги уходят в metrics.py (loop_stalls, loop_stall), худшие места -
+в gauge slow_callbacks и раз в LOOP_MONITOR_REPORT_INTERVAL секунд в лог.
+"""
+
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+
+from config import Config
+from metrics import inc, observe, set_gauge
+
+logger = logging.getLogger(__name__)
+
+BOT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# место в коде -> {'count', 'total_ms', 'max_ms', 'stack', 'task'}
+offenders = {}
+
+_monitor_task = None
+_watchdog = None
+
+
+def _is_own_frame(filename: str) -> bool:
+    path = os.path.abspath(filename)
+    return path.startswith(BOT_DIR) and 'site-packages' not in path and path != os.path.abspath(__file__)
+
+
+def _capture(thread_id: int, loop):
+    """Стек потока event loop и имя текущей задачи (вызывается из сторожевого потока)"""
+    frame = sys._current_frames().get(thread_id)
+    if frame is None:
+        return None, '', None
+    stack = traceback.extract_stack(frame)
+    where = None
+    for entry in reversed(stack):
+        if _is_own_frame(entry.filename):
+            where = f"{os.path.relpath(entry.filename, BOT_DIR)}:{entry.lineno} {entry.name}"
+            break
+    if where is None and stack:
+        last = stack[-1]
+        where = f"{os.path.basename(last.filename)}:{last.lineno} {last.name}"
+    try:
+        task = asyncio.current_task(loop)
+        task_name = task.get_name() if task else None
+    except Exception:
+        task_name = None
+    return where, ''.join(traceback.format_list(stack[-15:])), task_name
+
+
+def _record(where: str, stack: str, task_name, blocked_ms: float):
+    """Учет одной блокировки (выполняется в event loop)"""
+    inc('loop_stalls')
+    observe('loop_stall', blocked_ms)
+
+    entry = offenders.get(where)
+    if entry is None:
+        entry = offenders[where] = {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'stack': stack, 'task': task_name}
+    entry['count'] += 1
+    entry['total_ms'] += blocked_ms
+    if blocked_ms >= entry['max_ms']:
+        entry['max_ms'] = blocked_ms
+        entry['stack'] = stack
+        entry['task'] = task_name
+
+    set_gauge('slow_callbacks', worst_offenders())
+    logger.warning(
+        "[LoopMonitor] Event loop blocked for %.0f ms at %s (task %s)\n%s",
+        blocked_ms, where, task_name, stack,
+    )
+
+
+def worst_offenders(limit: int = None) -> list:
+    """Места, которые суммарно дольше всего блокировали loop"""
+    limit = limit or Config.LOOP_MONITOR_TOP
+    top = sorted(offenders.items(), key=lambda item: item[1]['total_ms'], reverse=True)[:limit]
+    return [
+        {
+            'where': where,
+            'count': data['count'],
+            'total_ms': round(data['total_ms'], 1),
+            'max_ms': round(data['max_ms'], 1),
+        }
+        for where, data in top
+    ]
+
+
+class _Watchdog(threading.Thread):
+    """Поток, который замечает блокировку loop и снимает его стек"""
+
+    def __init__(self, loop, loop_thread_id: int):
+        super().__init__(name='loop-watchdog', daemon=True)
+        self.loop = loop
+        self.loop_thread_id = loop_thread_id
+        self.beat = time.monotonic()
+        self.stopped = threading.Event()
+
+    def run(self):
+        threshold = Config.LOOP_MONITOR_THRESHOLD_MS / 1000
+        check_every = max(Config.LOOP_MONITOR_INTERVAL / 2, 0.01)
+        stall = None  # (beat на начало блокировки, место, стек, задача)
+        while not self.stopped.wait(check_every):
+            beat = self.beat
+            now = time.monotonic()
+            if stall is None:
+                # Отметка обновляется раз в INTERVAL, все сверх этого - блокировка
+                if now - beat - Config.LOOP_MONITOR_INTERVAL > threshold:
+                    where, stack, task_name = _capture(self.loop_thread_id, self.loop)
+                    if where:
+                        stall = (beat, where, stack, task_name)
+            elif beat != stall[0]:
+                blocked_ms = (beat - stall[0] - Config.LOOP_MONITOR_INTERVAL) * 1000
+                _, where, stack, task_name = stall
+                stall = None
+                try:
+                    self.loop.call_soon_threadsafe(_record, where, stack, task_name, blocked_ms)
+                except RuntimeError:
+                    # loop уже закрыт
+                    return
+
+
+async def _heartbeat(watchdog: _Watchdog):
+    report_every = Config.LOOP_MONITOR_REPORT_INTERVAL
+    next_report = time.monotonic() + report_every
+    try:
+        while True:
+            await asyncio.sleep(Config.LOOP_MONITOR_INTERVAL)
+            watchdog.beat = time.monotonic()
+            if watchdog.beat >= next_report:
+                next_report = watchdog.beat + report_every
+                if offenders:
+                    logger.info("[LoopMonitor] Worst event loop blockers: %s", worst_offenders())
+    finally:
+        watchdog.stopped.set()
+
+
+def start_loop_monitor() -> asyncio.Task:
+    """Запустить детектор блокировок (вызывать из main() бота, внутри event loop)"""
+    global _monitor_task, _watchdog
+    if not Config.LOOP_MONITOR_ENABLED:
+        return None
+    _watchdog = _Watchdog(asyncio.get_running_loop(), threading.get_ident())
+    _watchdog.start()
+    _monitor_task = asyncio.create_task(_heartbeat(_watchdog), name='loop-monitor')
+    logger.info(
+        "[LoopMonitor] Watching event loop, threshold %s ms", Config.LOOP_MONITOR_THRESHOLD_MS
+    )
+    return _monitor_task
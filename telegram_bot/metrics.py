@@ -0,0 +1,113 @@
+"""
+Метрики процесса бота
+
+Счетчики, gauge и тайминги в памяти процесса. Раз в METRICS_INTERVAL секунд
+они сбрасываются в JSON файл <METRICS_DIR>/<script>.json, который читает
+server_monitor.py (heartbeat: поле ts, задержка event loop: loop_lag_ms).
+Запись файла идет в отдельном потоке, чтобы не блокировать event loop.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+counters = {}
+gauges = {}
+# name -> [count, total_ms, max_ms]
+timings = {}
+
+_started_at = time.time()
+_metrics_task = None
+
+
+def inc(name: str, value: int = 1):
+    counters[name] = counters.get(name, 0) + value
+
+
+def set_gauge(name: str, value):
+    gauges[name] = value
+
+
+def observe(name: str, ms: float):
+    entry = timings.get(name)
+    if entry is None:
+        timings[name] = [1, ms, ms]
+    else:
+        entry[0] += 1
+        entry[1] += ms
+        if ms > entry[2]:
+            entry[2] = ms
+
+
+def snapshot() -> dict:
+    """Текущее состояние всех метрик (для файла и логов)"""
+    return {
+        'ts': time.time(),
+        'pid': os.getpid(),
+        'started_at': _started_at,
+        'counters': dict(counters),
+        'gauges': dict(gauges),
+        'timings': {
+            name: {'count': c, 'avg_ms': round(total / c, 2) if c else 0, 'max_ms': round(mx, 2)}
+            for name, (c, total, mx) in timings.items()
+        },
+    }
+
+
+def metrics_path(app: str = None) -> Path:
+    """Файл метрик процесса: по умолчанию <METRICS_DIR>/<имя запущенного скрипта>.json"""
+    app = app or Path(sys.argv[0]).stem
+    return Path(Config.METRICS_DIR) / f'{app}.json'
+
+
+def _write(path: Path, data: dict):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix('.tmp')
+    tmp.write_text(json.dumps(data, ensure_ascii=False, separators=(',', ':')), encoding='utf-8')
+    os.replace(tmp, path)
+
+
+async def run_metrics_loop(app: str = None):
+    """
+    Фоновая задача: измеряет задержку event loop и периодически пишет метрики в файл.
+
+    Задержка считается как опоздание пробуждения asyncio.sleep(LAG_INTERVAL):
+    если loop занят синхронной работой, таймер срабатывает позже.
+    """
+    path = metrics_path(app)
+    lag_interval = Config.METRICS_LAG_INTERVAL
+    next_dump = time.monotonic() + Config.METRICS_INTERVAL
+    lag_max = 0.0
+    logger.info("[Metrics] Writing metrics to %s every %ss", path, Config.METRICS_INTERVAL)
+    while True:
+        started = time.monotonic()
+        await asyncio.sleep(lag_interval)
+        lag_ms = max(0.0, (time.monotonic() - started - lag_interval) * 1000)
+        lag_max = max(lag_max, lag_ms)
+        set_gauge('loop_lag_ms', round(lag_ms, 2))
+
+        if time.monotonic() >= next_dump:
+            next_dump = time.monotonic() + Config.METRICS_INTERVAL
+            set_gauge('loop_lag_max_ms', round(lag_max, 2))
+            set_gauge('tasks', len(asyncio.all_tasks()))
+            lag_max = 0.0
+            try:
+                await asyncio.to_thread(_write, path, snapshot())
+            except Exception as e:
+                logger.warning("[Metrics] Could not write metrics file: %s", e)
+
+
+def start_metrics(app: str = None) -> asyncio.Task:
+    """Запустить сбор метрик (вызывать из main() бота)"""
+    global _metrics_task
+    # Держим ссылку на задачу, иначе ее может собрать GC
+    _metrics_task = asyncio.create_task(run_metrics_loop(app), name='metrics')
+    return _metrics_task
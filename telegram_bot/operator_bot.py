@@ -1,18 +1,21 @@
 import asyncio
 import logging
 import os
+import time
 from aiogram import Bot, Dispatcher, F
 from aiogram.types import Message
 from aiogram.fsm.storage.memory import MemoryStorage
 from config import Config
+from logging_setup import setup_logging
+from metrics import start_metrics
+from loop_monitor import start_loop_monitor
+from tasks import InFlightMiddleware, drain, spawn
+from receipts import select_photo_size
 import aiohttp
 import ssl
 
-# Настройка логирования
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+# Настройка логирования (очередь + фоновый поток, JSON строки)
+setup_logging()
 logger = logging.getLogger(__name__)
 
 # Отключаем проверку SSL для внутренних запросов
@@ -26,6 +29,63 @@ WELCOME_MESSAGES = {
     'ky': 'Саламатсызбы!\n\nОператор 24 саат ичинде жооп берет.\n\nЭгер сизде каражат кошуу же чыгаруу менен көйгөйлөр болсо, сураныч, дароо чек, ID жана кодду жөнөтүңүз — бул тилкемди иштетүүнү тездетет.',
 }
 
+# Кэш состояния операторских чатов в памяти процесса:
+# user_id -> {'is_closed': bool | None, 'status_at': float, 'has_messages': bool | None}
+# Статус "открыт" пишется сразу в кэш, а в API - в фоне и не чаще раза в CHAT_STATE_TTL
+# (входящее сообщение и так открывает чат на стороне /api/chat-message)
+chat_state_cache = {}
+# Фоновые задачи сохранения статуса: user_id -> asyncio.Task
+status_persist_tasks = {}
+CHAT_STATE_TTL = int(os.getenv('OPERATOR_CHAT_STATE_TTL', '60'))
+CHAT_STATE_MAX_USERS = 10000
+
+def get_chat_state(user_id: int) -> dict:
+    """Запись кэша для пользователя (создается при первом обращении)"""
+    state = chat_state_cache.get(user_id)
+    if state is None:
+        if len(chat_state_cache) >= CHAT_STATE_MAX_USERS:
+            # Выбрасываем самые давние записи
+            oldest = sorted(chat_state_cache, key=lambda uid: chat_state_cache[uid]['status_at'])
+            for uid in oldest[:CHAT_STATE_MAX_USERS // 10]:
+                chat_state_cache.pop(uid, None)
+        state = chat_state_cache[user_id] = {'is_closed': None, 'status_at': 0.0, 'has_messages': None}
+    return state
+
+def is_status_fresh(state: dict) -> bool:
+    return state['is_closed'] is not None and time.monotonic() - state['status_at'] < CHAT_STATE_TTL
+
+async def persist_chat_status(user_id: int, is_closed: bool):
+    """Сохранить статус чата в API (фоном, с одной повторной попыткой)"""
+    try:
+        saved = await set_operator_chat_status(user_id, is_closed=is_closed)
+        if not saved:
+            await asyncio.sleep(1)
+            saved = await set_operator_chat_status(user_id, is_closed=is_closed)
+        if saved:
+            logger.info(f"✅ Operator chat status saved for user {user_id}: isClosed={is_closed}")
+        else:
+            logger.error(f"❌ Failed to save operator chat status for user {user_id} even after retry")
+            state = get_chat_state(user_id)
+            if state['is_closed'] == is_closed:
+                # Следующее сообщение пользователя попробует снова
+                state['status_at'] = 0.0
+    finally:
+        status_persist_tasks.pop(user_id, None)
+
+def open_operator_chat(user_id: int):
+    """
+    Отметить чат открытым: сразу в кэше, в API - в фоне.
+    Если кэш свежий и чат уже открыт, запрос в API не отправляется.
+    """
+    state = get_chat_state(user_id)
+    if state['is_closed'] is False and is_status_fresh(state):
+        return
+    state['is_closed'] = False
+    state['status_at'] = time.monotonic()
+    if user_id not in status_persist_tasks:
+        logger.info(f"🔓 Opening chat for user {user_id} (background)")
+        status_persist_tasks[user_id] = spawn(persist_chat_status(user_id, False), name=f"chat-status-{user_id}")
+
 async def save_message_to_db(
     user_id: int,
     message_text: str = None,
@@ -61,7 +121,7 @@ async def save_message_to_db(
                 data['lastName'] = last_name
             
             logger.info(f"💾 Saving message to DB: user_id={user_id}, direction={direction}, bot_type={bot_type}, api_url={api_url}")
-            logger.info(f"📤 Request data: {data}")
+            logger.debug("📤 Request data: %s", data)
             
             # Сначала пробуем локальный API (если админка запущена локально)
             local_api_urls = ['http://localhost:3001/api', 'http://localhost:3000/api']
@@ -121,6 +181,17 @@ async def save_message_to_db(
 
 async def get_operator_chat_status(user_id: int) -> bool:
     """Получить текущий статус операторского чата (True = закрыт, False = открыт)"""
+    state = get_chat_state(user_id)
+    if is_status_fresh(state):
+        return state['is_closed']
+    is_closed = await fetch_operator_chat_status(user_id)
+    if is_closed is not None:
+        state['is_closed'] = is_closed
+        state['status_at'] = time.monotonic()
+    return is_closed if is_closed is not None else False  # По умолчанию считаем открытым
+
+async def fetch_operator_chat_status(user_id: int):
+    """Статус операторского чата из API (None - если получить не удалось)"""
     try:
         service_token = os.getenv('OPERATOR_SERVICE_TOKEN', 'dev-operator-token')
         connector = aiohttp.TCPConnector(ssl=ssl_context)
@@ -152,11 +223,10 @@ async def get_operator_chat_status(user_id: int) -> bool:
                 from config import Config
                 api_url = Config.API_FALLBACK_URL
             
-            result = await do_get(api_url)
-            return result if result is not None else False  # По умолчанию считаем открытым
+            return await do_get(api_url)
     except Exception as e:
         logger.error(f"❌ Error getting operator chat status: {e}", exc_info=True)
-        return False  # По умолчанию считаем открытым
+        return None
 
 async def set_operator_chat_status(user_id: int, is_closed: bool):
     """Открыть/закрыть операторский чат для пользователя (нужно, чтобы /start выводил чат в открытые)."""
@@ -218,6 +288,16 @@ async def set_operator_chat_status(user_id: int, is_closed: bool):
         logger.error(f"❌ Error setting operator chat status: {e}", exc_info=True)
         return False
 
+async def has_existing_messages(user_id: int) -> bool:
+    """Есть ли сообщения в операторском чате (положительный ответ кэшируется - сообщения не исчезают)"""
+    state = get_chat_state(user_id)
+    if state['has_messages']:
+        return True
+    has_messages = await check_existing_messages(user_id)
+    if has_messages:
+        state['has_messages'] = True
+    return has_messages
+
 async def check_existing_messages(user_id: int) -> bool:
     """Проверить, есть ли уже сообщения от пользователя"""
     try:
@@ -256,19 +336,9 @@ async def handle_start(message: Message, bot: Bot):
     
     # ВАЖНО: Сначала открываем чат, чтобы он сразу попал в открытые
     # Это нужно, чтобы при /start чат всегда попадал в открытые, даже если он был закрыт
-    logger.info(f"🔓 Opening chat for user {user_id} on /start command (BEFORE saving message)...")
-    opened = await set_operator_chat_status(user_id, is_closed=False)
-    if opened:
-        logger.info(f"✅ Operator chat opened for user {user_id}")
-    else:
-        logger.warning(f"⚠️ Failed to open operator chat for user {user_id}, retrying...")
-        # Повторная попытка через 1 секунду
-        await asyncio.sleep(1)
-        opened = await set_operator_chat_status(user_id, is_closed=False)
-        if opened:
-            logger.info(f"✅ Operator chat opened for user {user_id} on retry")
-        else:
-            logger.error(f"❌ Failed to open operator chat for user {user_id} even after retry")
+    # (кэш сбрасываем: /start всегда подтверждает статус в API)
+    get_chat_state(user_id)['status_at'] = 0.0
+    open_operator_chat(user_id)
     
     # Создаем/обновляем пользователя в БД при первом обращении
     result = await save_message_to_db(
@@ -288,15 +358,8 @@ async def handle_start(message: Message, bot: Bot):
     else:
         logger.error(f"❌ Failed to save /start message for user {user_id}: {result}")
     
-    # Открываем чат еще раз после сохранения сообщения (на всякий случай)
-    if not opened:
-        logger.info(f"🔓 Opening chat for user {user_id} on /start command (AFTER saving message)...")
-        opened = await set_operator_chat_status(user_id, is_closed=False)
-        if opened:
-            logger.info(f"✅ Operator chat opened for user {user_id} after message save")
-    
     # Проверяем, есть ли уже сообщения (кроме /start)
-    has_messages = await check_existing_messages(user_id)
+    has_messages = await has_existing_messages(user_id)
     logger.info(f"📋 User {user_id} has existing messages: {has_messages}")
     
     if not has_messages:
@@ -319,6 +382,7 @@ async def handle_start(message: Message, bot: Bot):
         )
         
         if welcome_result and welcome_result.get('success'):
+            get_chat_state(user_id)['has_messages'] = True
             logger.info(f"✅ Welcome message saved for user {user_id}: {welcome_result}")
         else:
             logger.error(f"❌ Failed to save welcome message for user {user_id}: {welcome_result}")
@@ -337,13 +401,8 @@ async def handle_text(message: Message, bot: Bot):
     
     logger.info(f"💬 Processing text message from user {user_id}: {text[:50] if text else 'None'}")
     
-    # Открываем чат при любом сообщении от пользователя
-    logger.info(f"🔓 Opening chat for user {user_id} on text message...")
-    opened = await set_operator_chat_status(user_id, is_closed=False)
-    if opened:
-        logger.info(f"✅ Operator chat opened for user {user_id}")
-    else:
-        logger.warning(f"⚠️ Failed to open operator chat for user {user_id}, but continuing...")
+    # Открываем чат при любом сообщении от пользователя (из кэша, в API - в фоне)
+    open_operator_chat(user_id)
     
     # Сохраняем сообщение пользователя в БД
     result = await save_message_to_db(
@@ -359,6 +418,7 @@ async def handle_text(message: Message, bot: Bot):
     )
     
     if result and result.get('success'):
+        get_chat_state(user_id)['has_messages'] = True
         logger.info(f"✅ Message saved for user {user_id}: {result}")
     else:
         logger.error(f"❌ Failed to save message for user {user_id}: {result}")
@@ -367,16 +427,11 @@ async def handle_photo(message: Message, bot: Bot):
     """Обработка фото"""
     user_id = message.from_user.id
     
-    # Открываем чат при любом сообщении от пользователя
-    logger.info(f"🔓 Opening chat for user {user_id} on photo message...")
-    opened = await set_operator_chat_status(user_id, is_closed=False)
-    if opened:
-        logger.info(f"✅ Operator chat opened for user {user_id}")
-    else:
-        logger.warning(f"⚠️ Failed to open operator chat for user {user_id}, but continuing...")
+    # Открываем чат при любом сообщении от пользователя (из кэша, в API - в фоне)
+    open_operator_chat(user_id)
     
     # Получаем URL фото
-    photo = message.photo[-1]  # Берем фото наибольшего размера
+    photo = select_photo_size(message.photo)  # Наименьший размер, достаточный для оператора
     file = await bot.get_file(photo.file_id)
     media_url = f"https://api.telegram.org/file/bot{bot.token}/{file.file_path}"
     
@@ -398,13 +453,8 @@ async def handle_video(message: Message, bot: Bot):
     """Обработка видео"""
     user_id = message.from_user.id
     
-    # Открываем чат при любом сообщении от пользователя
-    logger.info(f"🔓 Opening chat for user {user_id} on video message...")
-    opened = await set_operator_chat_status(user_id, is_closed=False)
-    if opened:
-        logger.info(f"✅ Operator chat opened for user {user_id}")
-    else:
-        logger.warning(f"⚠️ Failed to open operator chat for user {user_id}, but continuing...")
+    # Открываем чат при любом сообщении от пользователя (из кэша, в API - в фоне)
+    open_operator_chat(user_id)
     
     # Получаем URL видео
     video = message.video
@@ -444,11 +494,25 @@ async def main():
     dp.message.register(handle_video, F.video)
     dp.message.register(handle_text, F.text)  # Текстовые сообщения в конце, чтобы не перехватывать команды
     
+    # Учет выполняемых обработчиков, чтобы при остановке дождаться их
+    dp.update.outer_middleware(InFlightMiddleware())
+    
     logger.info("✅ Handlers registered: /start, text, photo, video")
     logger.info("Бот оператор запущен!")
     
+    # Heartbeat и задержка event loop для server_monitor.py
+    start_metrics()
+    # Кто блокирует event loop (стеки в лог, худшие места в метрики)
+    start_loop_monitor()
+    
     # Запуск polling
-    await dp.start_polling(bot)
+    try:
+        await dp.start_polling(bot, close_bot_session=False)
+    finally:
+        # Polling остановлен (SIGTERM/SIGINT от PM2): дожидаемся обработчиков и сохранения
+        # статусов чатов, потом закрываем сессию Telegram
+        await drain(Config.SHUTDOWN_TIMEOUT)
+        await bot.session.close()
 
 if __name__ == '__main__':
     try:
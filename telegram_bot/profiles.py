@@ -0,0 +1,152 @@
+"""
+Кэш профиля пользователя
+
+За одну короткую сессию (пополнение/вывод) бот несколько раз ходил в API за одним
+и тем же: сохраненные ID казино, последний номер телефона для вывода, статус блокировки.
+Здесь профиль загружается один раз и живет PROFILE_TTL секунд, всего профилей не больше
+PROFILE_CACHE_SIZE (вытесняются давно не использованные).
+
+- get_saved_casino_account_id: все ID казино пользователя одним запросом;
+- save_casino_account_id: сразу обновляет профиль, в API пишет в фоне (tasks.submit,
+  группа profile-writes: повтор при ошибке, при остановке бота запись дожидается);
+- check_blocked: пока реплика (replica.py) свежая, ответ берется из нее без сети.
+  Иначе ответ API кэшируется на PROFILE_BLOCK_TTL секунд; при любом изменении
+  блокировок в реплике все закэшированные проверки сбрасываются: блокировка
+  пользователя блокирует и его accountId у других.
+
+Функции возвращают то же, что соответствующие методы APIClient.
+"""
+
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+import replica
+from api_client import APIClient
+from config import Config
+from tasks import define_group, submit
+
+logger = logging.getLogger(__name__)
+
+define_group('profile-writes', retries=1)
+
+_UNSET = object()
+
+# user_id -> профиль
+_profiles = OrderedDict()
+
+
+def _profile(user_id) -> dict:
+    user_id = str(user_id)
+    now = time.monotonic()
+    profile = _profiles.get(user_id)
+    if profile is None or now - profile['loaded_at'] > Config.PROFILE_TTL:
+        profile = {
+            'loaded_at': now,
+            'account_ids': None,   # {casino_id: account_id} после загрузки
+            'written': {},         # ID, сохраненные до загрузки профиля
+            'phone': _UNSET,
+            'blocked': {},         # account_id | None -> (ответ, поколение, истекает_в)
+        }
+        _profiles[user_id] = profile
+    _profiles.move_to_end(user_id)
+    while len(_profiles) > Config.PROFILE_CACHE_SIZE:
+        _profiles.popitem(last=False)
+    return profile
+
+
+def invalidate(user_id):
+    """Забыть профиль пользователя целиком"""
+    _profiles.pop(str(user_id), None)
+
+
+async def _account_ids(user_id) -> Optional[dict]:
+    profile = _profile(user_id)
+    if profile['account_ids'] is None:
+        result = await APIClient.get_all_saved_casino_account_ids(str(user_id))
+        if not result.get('success'):
+            return None
+        account_ids = dict((result.get('data') or {}).get('accountIds') or {})
+        account_ids.update(profile['written'])
+        profile['account_ids'] = account_ids
+    return profile['account_ids']
+
+
+async def get_saved_casino_account_id(telegram_user_id: str, casino_id: str) -> Dict[str, Any]:
+    """Сохраненный ID казино (из профиля, при первом обращении - все ID одним запросом)"""
+    account_ids = await _account_ids(telegram_user_id)
+    if account_ids is None:
+        # Профиль не загрузился - спрашиваем точечно, как раньше
+        return await APIClient.get_saved_casino_account_id(telegram_user_id, casino_id)
+    return {'success': True, 'data': {'accountId': account_ids.get(casino_id.lower()), 'casinoId': casino_id}}
+
+
+async def get_all_saved_casino_account_ids(telegram_user_id: str) -> Dict[str, Any]:
+    account_ids = await _account_ids(telegram_user_id)
+    if account_ids is None:
+        return await APIClient.get_all_saved_casino_account_ids(telegram_user_id)
+    return {'success': True, 'data': {'accountIds': dict(account_ids)}}
+
+
+async def _write_account_id(telegram_user_id: str, casino_id: str, account_id: str):
+    result = await APIClient.save_casino_account_id(telegram_user_id, casino_id, account_id)
+    if not result.get('success'):
+        raise RuntimeError(result.get('error') or 'save failed')
+
+
+async def save_casino_account_id(telegram_user_id: str, casino_id: str, account_id: str) -> Dict[str, Any]:
+    """Сохранить ID казино: в профиле сразу, в API в фоне"""
+    profile = _profile(telegram_user_id)
+    casino_key = casino_id.lower()
+    account_id = account_id.strip()
+    if profile['account_ids'] is not None:
+        profile['account_ids'][casino_key] = account_id
+    else:
+        profile['written'][casino_key] = account_id
+    user_id = str(telegram_user_id)
+    submit(
+        'profile-writes',
+        lambda: _write_account_id(user_id, casino_id, account_id),
+        key=(user_id, casino_key),
+        name=f"save-account-id-{user_id}",
+        # Профиль показывает несохраненный ID, следующая загрузка возьмет данные из API
+        on_failure=lambda error: invalidate(user_id),
+    )
+    return {'success': True, 'data': {'success': True}}
+
+
+async def get_last_withdraw_phone(telegram_user_id: str) -> Optional[str]:
+    """Номер телефона из последней заявки на вывод"""
+    profile = _profile(telegram_user_id)
+    if profile['phone'] is _UNSET:
+        profile['phone'] = await APIClient.get_last_withdraw_phone(telegram_user_id)
+    return profile['phone']
+
+
+def remember_withdraw_phone(telegram_user_id: str, phone: str):
+    """Заявка на вывод создана - этот номер теперь последний"""
+    if phone:
+        _profile(telegram_user_id)['phone'] = phone
+
+
+async def check_blocked(telegram_user_id: str, account_id: Optional[str] = None) -> Dict[str, Any]:
+    """Проверка блокировки пользователя / accountId: по реплике или через API с кэшем"""
+    reason = replica.blocked_reason(telegram_user_id, account_id)
+    if reason == '':
+        return {'success': True, 'data': {'blocked': False}}
+    if reason == 'user':
+        return {'success': True, 'data': {'blocked': True, 'reason': 'user', 'message': 'Вы заблокированы'}}
+    # accountId заблокирован или реплика устарела - спрашиваем админку
+    # (при заблокированном accountId она блокирует и этого пользователя)
+    
+    profile = _profile(telegram_user_id)
+    cached = profile['blocked'].get(account_id)
+    now = time.monotonic()
+    if reason is None and cached and cached[1] == replica.block_generation and cached[2] > now:
+        return cached[0]
+    generation = replica.block_generation
+    result = await APIClient.check_blocked(telegram_user_id, account_id)
+    if result.get('success') and generation == replica.block_generation:
+        profile['blocked'][account_id] = (result, generation, now + Config.PROFILE_BLOCK_TTL)
+    return result
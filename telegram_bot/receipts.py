@@ -0,0 +1,198 @@
+"""
+Прием фото чеков/QR от пользователя
+
+Telegram присылает несколько PhotoSize одного фото (90, 320, 800, 1280, 2560 px).
+Раньше всегда брался message.photo[-1] (самый большой) и целиком уходил в админку
+base64 строкой. Здесь выбираем наименьший размер, которого достаточно оператору
+для проверки, и при необходимости пережимаем его в JPEG в отдельном потоке.
+
+Повторно присланный чек (тот же file_unique_id или те же байты) не загружается
+в админку заново: отправляется только sha256, админка берет уже сохраненное фото
+из заявок этого же пользователя (requests.photo_file_id = "sha256:<hex>") и сообщает
+о дубле в duplicate_receipt_of. Чужого чека с таким хешем для нее нет: 409, и бот
+присылает фото целиком.
+"""
+
+import asyncio
+import base64
+import hashlib
+import io
+import logging
+from collections import OrderedDict
+
+from config import Config
+
+try:
+    from PIL import Image
+except ImportError:  # без Pillow просто отдаем файл как есть
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+# file_unique_id -> sha256 итоговых байт (после пережатия)
+_unique_id_hashes = OrderedDict()
+# sha256 чеков, которые админка уже сохранила
+_stored_hashes = OrderedDict()
+
+RECEIPT_NOT_FOUND = 'Receipt not found'
+
+
+def _remember(cache: OrderedDict, key, value=True):
+    cache[key] = value
+    cache.move_to_end(key)
+    while len(cache) > Config.RECEIPT_CACHE_SIZE:
+        cache.popitem(last=False)
+
+
+def select_photo_size(photos, min_side: int = None):
+    """
+    Наименьший PhotoSize, у которого длинная сторона >= min_side.
+    Если такого нет - самый большой из доступных (как раньше photo[-1]).
+    """
+    min_side = min_side or Config.RECEIPT_MIN_SIDE
+    sizes = sorted(photos, key=lambda p: p.width * p.height)
+    for size in sizes:
+        if max(size.width, size.height) >= min_side:
+            return size
+    return sizes[-1]
+
+
+def _recompress(data: bytes, max_side: int, max_bytes: int, quality: int):
+    """Уменьшение и пережатие в JPEG (вызывается в потоке, не в event loop)"""
+    with Image.open(io.BytesIO(data)) as img:
+        img = img.convert('RGB')
+        img.thumbnail((max_side, max_side), Image.LANCZOS)
+        result = data
+        # Понижаем качество ступенями, пока не влезем в лимит
+        for q in (quality, quality - 10, quality - 20, quality - 30):
+            buffer = io.BytesIO()
+            img.save(buffer, format='JPEG', quality=max(q, 40), optimize=True, progressive=True)
+            result = buffer.getvalue()
+            if len(result) <= max_bytes:
+                break
+        return result, img.width, img.height
+
+
+async def load_receipt(bot, photos, use_cache: bool = True) -> dict:
+    """
+    Скачать фото чека в подходящем размере.
+
+    Если этот file_unique_id уже загружался в админку, файл не скачивается:
+    data = None, в API уйдет только sha256.
+
+    Returns:
+        dict: {'data': bytes | None, 'mime': str, 'width': int, 'height': int,
+               'file_id': str, 'file_unique_id': str, 'sha256': str, 'recompressed': bool}
+    """
+    photo = select_photo_size(photos)
+
+    known_hash = _unique_id_hashes.get(photo.file_unique_id) if use_cache else None
+    if known_hash and known_hash in _stored_hashes:
+        logger.info("[Receipt] %s already uploaded (sha256 %s), sending reference", photo.file_unique_id, known_hash[:12])
+        return {
+            'data': None,
+            'mime': 'image/jpeg',
+            'width': photo.width,
+            'height': photo.height,
+            'file_id': photo.file_id,
+            'file_unique_id': photo.file_unique_id,
+            'sha256': known_hash,
+            'recompressed': False,
+        }
+
+    file = await bot.get_file(photo.file_id)
+    downloaded = await bot.download_file(file.file_path)
+    # В aiogram 3 download_file возвращает BytesIO
+    if hasattr(downloaded, 'getvalue'):
+        data = downloaded.getvalue()
+    elif hasattr(downloaded, 'read'):
+        data = downloaded.read()
+    else:
+        data = bytes(downloaded)
+
+    receipt = {
+        'data': data,
+        'mime': 'image/jpeg',
+        'width': photo.width,
+        'height': photo.height,
+        'file_id': photo.file_id,
+        'file_unique_id': photo.file_unique_id,
+        'recompressed': False,
+    }
+
+    too_big = len(data) > Config.RECEIPT_MAX_BYTES or max(photo.width, photo.height) > Config.RECEIPT_MAX_SIDE
+    if too_big and Image is not None:
+        try:
+            compressed, width, height = await asyncio.to_thread(
+                _recompress, data, Config.RECEIPT_MAX_SIDE, Config.RECEIPT_MAX_BYTES, Config.RECEIPT_JPEG_QUALITY
+            )
+            if len(compressed) < len(data):
+                receipt.update(data=compressed, width=width, height=height, recompressed=True)
+        except Exception as e:
+            logger.warning("[Receipt] Recompression failed, sending original: %s", e)
+
+    receipt['sha256'] = hashlib.sha256(receipt['data']).hexdigest()
+    _remember(_unique_id_hashes, photo.file_unique_id, receipt['sha256'])
+
+    logger.info(
+        "[Receipt] %sx%s, %s bytes (original %s bytes, recompressed=%s)",
+        receipt['width'], receipt['height'], len(receipt['data']), len(data), receipt['recompressed'],
+    )
+    return receipt
+
+
+def receipt_base64(receipt: dict) -> str:
+    """base64 без префикса (так хранится QR фото при выводе)"""
+    return base64.b64encode(receipt['data']).decode('utf-8')
+
+
+def receipt_data_uri(receipt: dict) -> str:
+    """data URI для receiptPhoto в API заявок"""
+    return f"data:{receipt['mime']};base64,{receipt_base64(receipt)}"
+
+
+def receipt_from_base64(photo_base64: str) -> dict:
+    """Чек из base64, сохраненного в FSM (QR фото при выводе)"""
+    data = base64.b64decode(photo_base64)
+    return {'data': data, 'mime': 'image/jpeg', 'sha256': hashlib.sha256(data).hexdigest()}
+
+
+async def upload_receipt(send, receipt: dict, reload=None) -> dict:
+    """
+    Отправить чек в API, по возможности ссылкой на уже сохраненный.
+
+    Args:
+        send: корутинная функция send(receipt_photo=..., receipt_hash=...) -> dict ответа API
+              (APIClient.create_request / update_request с остальными аргументами)
+        receipt: результат load_receipt / receipt_from_base64
+        reload: корутинная функция без аргументов, которая заново скачивает чек
+                (нужна, если data = None, а админка этот хеш не нашла)
+    """
+    sha256 = receipt['sha256']
+    if receipt['data'] is None or sha256 in _stored_hashes:
+        result = await send(receipt_photo=None, receipt_hash=sha256)
+        if result.get('error') != RECEIPT_NOT_FOUND:
+            _log_duplicate(result, sha256)
+            return result
+        # Админка этот чек не знает (заявку удалили или другой инстанс API) - отправляем целиком
+        logger.info("[Receipt] Reference %s not found on server, uploading full photo", sha256[:12])
+        _stored_hashes.pop(sha256, None)
+        if receipt['data'] is None:
+            if reload is None:
+                return result
+            receipt = await reload()
+
+    result = await send(receipt_photo=receipt_data_uri(receipt), receipt_hash=receipt['sha256'])
+    if result.get('success'):
+        _remember(_stored_hashes, receipt['sha256'])
+        _log_duplicate(result, receipt['sha256'])
+    return result
+
+
+def _log_duplicate(result: dict, sha256: str):
+    data = result.get('data') or {}
+    if isinstance(data, dict) and data.get('duplicate_receipt_of'):
+        logger.warning(
+            "[Receipt] Receipt %s was already attached to request %s",
+            sha256[:12], data.get('duplicate_receipt_of'),
+        )
@@ -0,0 +1,142 @@
+"""
+Локальная реплика редко меняющихся данных админки
+
+Настройки платежей (казино, банки, включение пополнений/выводов, пауза, канал) и
+список заблокированных читались из API на каждом шаге диалога. Здесь они живут
+в процессе бота:
+
+- при старте загружается полный снимок (/public/replica без since);
+- раз в REPLICA_SYNC_INTERVAL секунд приходят только изменения после cursor
+  прошлого ответа; настройки - только если изменилась их версия;
+- раз в REPLICA_FULL_SYNC_INTERVAL секунд (и если изменений слишком много) снимок
+  загружается заново, чтобы реплика не разошлась с админкой;
+- заблокированные пользователи и accountId лежат в set: проверка - O(1) без сети.
+  Совпадение по accountId подтверждается в админке (profiles.check_blocked), она
+  же блокирует пользователя, который пришел с заблокированным accountId.
+
+Если синхронизации не было дольше REPLICA_MAX_STALENESS секунд, реплика считается
+устаревшей и чтения идут в API, как раньше.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Optional
+
+from api_client import APIClient
+from api_models import PaymentSettings
+from config import Config
+from metrics import inc, set_gauge
+from tasks import spawn
+
+logger = logging.getLogger(__name__)
+
+_state = {
+    'cursor': 0,
+    'synced_at': 0.0,        # monotonic, 0 - синхронизации еще не было
+    'full_synced_at': 0.0,
+    'settings': None,        # PaymentSettings
+    'settings_version': None,
+}
+_blocked_users = set()
+_blocked_accounts = set()
+# Увеличивается при любом изменении блокировок (по нему profiles сбрасывает кэш проверок)
+block_generation = 0
+_sync_task = None
+
+
+def is_fresh() -> bool:
+    synced_at = _state['synced_at']
+    return bool(synced_at) and time.monotonic() - synced_at < Config.REPLICA_MAX_STALENESS
+
+
+def _apply(data: dict):
+    global block_generation
+    if 'settings' in data:
+        _state['settings'] = PaymentSettings.from_payload({'success': True, **data['settings']})
+        _state['settings_version'] = data.get('settingsVersion')
+        logger.info("[Replica] Payment settings updated (version %s)", _state['settings_version'])
+
+    if data.get('full'):
+        _blocked_users.clear()
+        _blocked_users.update(data.get('blockedUsers') or [])
+        _blocked_accounts.clear()
+        _blocked_accounts.update(data.get('blockedAccounts') or [])
+        block_generation += 1
+        _state['full_synced_at'] = time.monotonic()
+    else:
+        users = data.get('users') or []
+        accounts = data.get('accounts') or []
+        for change in users:
+            (_blocked_users.add if change['blocked'] else _blocked_users.discard)(change['userId'])
+        for change in accounts:
+            (_blocked_accounts.add if change['blocked'] else _blocked_accounts.discard)(change['accountId'])
+        if users or accounts:
+            block_generation += 1
+            logger.info("[Replica] Block changes applied: %s users, %s accounts", len(users), len(accounts))
+
+    _state['cursor'] = data['cursor']
+    _state['synced_at'] = time.monotonic()
+    set_gauge('replica.blocked_users', len(_blocked_users))
+    set_gauge('replica.blocked_accounts', len(_blocked_accounts))
+
+
+async def sync(full: bool = False) -> bool:
+    """Одна синхронизация с админкой. True - реплика обновлена"""
+    full = full or not _state['cursor'] or (
+        time.monotonic() - _state['full_synced_at'] > Config.REPLICA_FULL_SYNC_INTERVAL
+    )
+    result = await APIClient.get_replica(0 if full else _state['cursor'], _state['settings_version'])
+    data = result.get('data') if result.get('success') else None
+    if not data:
+        inc('replica.sync_failed')
+        logger.warning("[Replica] Sync failed: %s", result.get('error'))
+        return False
+    if data.get('truncated'):
+        logger.info("[Replica] Too many changes since last sync, reloading snapshot")
+        return await sync(full=True)
+    _apply(data)
+    inc('replica.full_syncs' if data.get('full') else 'replica.delta_syncs')
+    return True
+
+
+async def _sync_loop():
+    while True:
+        try:
+            await sync()
+        except Exception as e:
+            inc('replica.sync_failed')
+            logger.warning("[Replica] Sync failed: %s", e)
+        await asyncio.sleep(Config.REPLICA_SYNC_INTERVAL)
+
+
+def start_replica() -> asyncio.Task:
+    """Запустить синхронизацию реплики (вызывать из main() бота)"""
+    global _sync_task
+    _sync_task = spawn(_sync_loop(), name='replica-sync', cancel_on_shutdown=True)
+    return _sync_task
+
+
+async def get_payment_settings() -> PaymentSettings:
+    """Настройки платежей из реплики, если она свежая, иначе из API"""
+    settings = _state['settings']
+    if settings is not None and is_fresh():
+        return settings
+    return await APIClient.get_payment_settings()
+
+
+def blocked_reason(telegram_user_id, account_id: Optional[str] = None) -> Optional[str]:
+    """
+    Проверка блокировки по реплике.
+
+    Returns:
+        None - реплика устарела, нужно спросить API; '' - не заблокирован;
+        'user' / 'accountId' - причина блокировки
+    """
+    if not is_fresh():
+        return None
+    if str(telegram_user_id) in _blocked_users:
+        return 'user'
+    if account_id and str(account_id) in _blocked_accounts:
+        return 'accountId'
+    return ''
@@ -0,0 +1,120 @@
+"""
+Снимок FSM и таймеров QR при остановке бота
+
+MemoryStorage живет только в памяти процесса: после перезапуска пользователь, который
+уже получил QR и должен прислать чек, терял состояние, а таймер на сообщении замирал.
+При остановке (tasks.drain) записи MemoryStorage и параметры активных таймеров
+пишутся в JSON файл, при старте загружаются обратно, таймеры запускаются заново
+(оставшееся время считается от created_at, поэтому отсчет продолжается верно).
+
+Снимок старше STATE_SNAPSHOT_MAX_AGE секунд игнорируется.
+"""
+
+import json
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+
+from aiogram.fsm.storage.base import StorageKey
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+VERSION = 1
+
+
+def snapshot_path(app: str = None) -> Path:
+    """Файл снимка процесса: <STATE_DIR>/<имя запущенного скрипта>.json"""
+    app = app or Path(sys.argv[0]).stem
+    return Path(Config.STATE_DIR) / f'{app}.json'
+
+
+def _key_to_dict(key: StorageKey) -> dict:
+    return {
+        'bot_id': key.bot_id,
+        'chat_id': key.chat_id,
+        'user_id': key.user_id,
+        'thread_id': key.thread_id,
+        'business_connection_id': key.business_connection_id,
+        'destiny': key.destiny,
+    }
+
+
+def _key_from_dict(data: dict) -> StorageKey:
+    return StorageKey(**data)
+
+
+def save_snapshot(storage, timers: list, path: Path = None) -> dict:
+    """
+    Записать снимок MemoryStorage и таймеров.
+
+    Args:
+        storage: MemoryStorage диспетчера
+        timers: список параметров таймеров (handlers.deposit.export_timers())
+    """
+    path = path or snapshot_path()
+    records = []
+    skipped = 0
+    for key, record in storage.storage.items():
+        if record.state is None and not record.data:
+            continue
+        entry = {'key': _key_to_dict(key), 'state': record.state, 'data': record.data}
+        try:
+            json.dumps(entry, ensure_ascii=False)
+        except (TypeError, ValueError):
+            skipped += 1
+            logger.warning("[Snapshot] FSM data for chat %s is not JSON serializable, skipped", key.chat_id)
+            continue
+        records.append(entry)
+
+    snapshot = {'version': VERSION, 'saved_at': time.time(), 'fsm': records, 'timers': timers}
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix('.tmp')
+    tmp.write_text(json.dumps(snapshot, ensure_ascii=False), encoding='utf-8')
+    os.replace(tmp, path)
+
+    logger.info("[Snapshot] Saved %s FSM records and %s timers to %s (skipped %s)", len(records), len(timers), path, skipped)
+    return {'fsm': len(records), 'timers': len(timers), 'skipped': skipped}
+
+
+def load_snapshot(storage, path: Path = None) -> list:
+    """
+    Восстановить записи MemoryStorage из снимка и удалить файл.
+
+    Returns:
+        list: параметры таймеров, которые нужно запустить заново
+    """
+    path = path or snapshot_path()
+    if not path.exists():
+        return []
+    try:
+        snapshot = json.loads(path.read_text(encoding='utf-8'))
+    except (OSError, ValueError) as e:
+        logger.error("[Snapshot] Could not read %s: %s", path, e)
+        return []
+    finally:
+        # Снимок одноразовый: повторный старт не должен поднимать старое состояние
+        try:
+            path.unlink()
+        except OSError:
+            pass
+
+    age = time.time() - snapshot.get('saved_at', 0)
+    if snapshot.get('version') != VERSION or age > Config.STATE_SNAPSHOT_MAX_AGE:
+        logger.warning("[Snapshot] Ignoring snapshot %s (age %.0fs, version %s)", path, age, snapshot.get('version'))
+        return []
+
+    for entry in snapshot.get('fsm', []):
+        record = storage.storage[_key_from_dict(entry['key'])]
+        record.state = entry['state']
+        record.data = entry['data']
+
+    timers = snapshot.get('timers', [])
+    logger.info(
+        "[Snapshot] Restored %s FSM records and %s timers (saved %.0fs ago)",
+        len(snapshot.get('fsm', [])), len(timers), age,
+    )
+    return timers
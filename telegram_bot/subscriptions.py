@@ -0,0 +1,71 @@
+"""
+Кэш подписки на канал
+
+Раньше каждый /start и каждая проверка подписки делали bot.get_chat_member (до 5 с).
+Бот получает chat_member апдейты канала (он администратор канала), поэтому статус
+подписки обновляется здесь сразу при вступлении/выходе пользователя, а в Telegram
+идем только при промахе кэша.
+
+Записи живут ограниченное время: из апдейтов - SUBSCRIPTION_EVENT_TTL (апдейт мог
+потеряться, пока бот был выключен), из get_chat_member - SUBSCRIPTION_CACHE_TTL,
+отрицательный ответ - SUBSCRIPTION_NEGATIVE_TTL (пользователь скоро подпишется).
+"""
+
+import logging
+import time
+from collections import OrderedDict
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+SUBSCRIBED_STATUSES = ('member', 'administrator', 'creator')
+
+# (канал, user_id) -> (подписан, истекает_в)
+_cache = OrderedDict()
+# @username канала -> id (из chat_member апдейтов), чтобы настройка канала
+# username'ом и апдейты с числовым id попадали в одну запись
+_channel_ids = {}
+
+
+def channel_key(channel) -> str:
+    """Нормализованный идентификатор канала: '-100...' или '@username' в нижнем регистре"""
+    channel = str(channel).strip()
+    if channel.lstrip('-').isdigit():
+        return channel
+    username = '@' + channel.lstrip('@').lower()
+    return _channel_ids.get(username, username)
+
+
+def get_cached(channel, user_id: int):
+    """True/False из кэша или None, если записи нет или она устарела"""
+    key = (channel_key(channel), user_id)
+    entry = _cache.get(key)
+    if entry is None:
+        return None
+    is_subscribed, expires_at = entry
+    if expires_at < time.monotonic():
+        _cache.pop(key, None)
+        return None
+    return is_subscribed
+
+
+def remember(channel, user_id: int, is_subscribed: bool, ttl: float = None):
+    if ttl is None:
+        ttl = Config.SUBSCRIPTION_CACHE_TTL if is_subscribed else Config.SUBSCRIPTION_NEGATIVE_TTL
+    key = (channel_key(channel), user_id)
+    _cache[key] = (is_subscribed, time.monotonic() + ttl)
+    _cache.move_to_end(key)
+    while len(_cache) > Config.SUBSCRIPTION_CACHE_SIZE:
+        _cache.popitem(last=False)
+
+
+def record_chat_member(event):
+    """Обновить кэш по chat_member апдейту (aiogram ChatMemberUpdated)"""
+    chat = event.chat
+    if chat.username:
+        _channel_ids['@' + chat.username.lower()] = str(chat.id)
+    user_id = event.new_chat_member.user.id
+    is_subscribed = event.new_chat_member.status in SUBSCRIBED_STATUSES
+    remember(str(chat.id), user_id, is_subscribed, ttl=Config.SUBSCRIPTION_EVENT_TTL)
+    logger.debug("[Subscription] chat_member update: user %s in %s -> %s", user_id, chat.id, event.new_chat_member.status)
@@ -0,0 +1,283 @@
+"""
+Фоновые задачи и корректная остановка бота
+
+Раньше фоновые задачи (save_message_id_background, таймеры QR, сохранение статуса
+чата оператора) запускались через asyncio.create_task без учета и просто обрывались
+при остановке процесса. Теперь:
+
+- spawn() запускает задачу и держит на нее ссылку до завершения;
+- InFlightMiddleware отмечает обработчики апдейтов, которые сейчас выполняются;
+- drain() вызывается при остановке (SIGTERM/SIGINT от PM2, aiogram уже остановил polling):
+  ждет обработчики, сохраняет состояние (register_snapshot), отменяет долгие задачи
+  (таймеры, cancel_on_shutdown=True), ждет остальные фоновые задачи и сбрасывает
+  очереди отложенной записи (register_flush). Все укладывается в SHUTDOWN_TIMEOUT,
+  что не успело - попадает в отчет.
+
+Мелкие записи в API (ID сообщения заявки, сохраненный ID казино) идут через
+submit() в именованные группы:
+
+- в группе одновременно выполняется не больше concurrency задач, в очереди ждет
+  не больше max_queue (сверх - задача отклоняется с ошибкой в лог);
+- задача - корутинная функция без аргументов; исключение или таймаут (timeout) -
+  повтор до retries раз с задержкой backoff * 2^попытка;
+- задачи с одинаковым key выполняются по очереди, а еще не начатая задача
+  заменяется новой с тем же key (несколько записей одного поля - одна запись);
+- метрики группы: tasks.<группа>.queued / .running (gauges), .done / .failed /
+  .retried / .coalesced / .rejected (counters), .duration (время выполнения);
+- задачи групп - обычные фоновые задачи spawn(), drain() их дожидается.
+"""
+
+import asyncio
+import logging
+import time
+
+from aiogram import BaseMiddleware
+
+from config import Config
+from metrics import inc, observe, set_gauge
+
+logger = logging.getLogger(__name__)
+
+# task -> отменять ли при остановке (True для таймеров, которые сохраняются в снимок)
+_background = {}
+# Задачи обработчиков апдейтов, которые сейчас выполняются
+_inflight = set()
+_snapshot_hooks = []
+_flush_hooks = []
+# Группы задач submit(): имя -> настройки и состояние
+_groups = {}
+
+draining = False
+
+
+def _task_done(task: asyncio.Task):
+    _background.pop(task, None)
+    if task.cancelled():
+        return
+    exc = task.exception()
+    if exc is not None:
+        logger.error("[Tasks] Background task %s failed: %s", task.get_name(), exc, exc_info=exc)
+
+
+def spawn(coro, name: str = None, cancel_on_shutdown: bool = False) -> asyncio.Task:
+    """
+    Запустить фоновую задачу с учетом для остановки.
+
+    cancel_on_shutdown=True - долгие задачи (таймеры), которые при остановке не ждем,
+    а отменяем после сохранения снимка состояния.
+    """
+    task = asyncio.create_task(coro, name=name)
+    _background[task] = cancel_on_shutdown
+    task.add_done_callback(_task_done)
+    return task
+
+
+def define_group(name: str, concurrency: int = None, max_queue: int = None, retries: int = None,
+                 timeout: float = None, backoff: float = None):
+    """Настроить группу задач (не заданное - из Config.TASK_GROUP_*)"""
+    group = _group(name)
+    for option, value in (('concurrency', concurrency), ('max_queue', max_queue), ('retries', retries),
+                          ('timeout', timeout), ('backoff', backoff)):
+        if value is not None:
+            group[option] = value
+    group['semaphore'] = asyncio.Semaphore(group['concurrency'])
+
+
+def _group(name: str) -> dict:
+    group = _groups.get(name)
+    if group is None:
+        group = _groups[name] = {
+            'concurrency': Config.TASK_GROUP_CONCURRENCY,
+            'max_queue': Config.TASK_GROUP_MAX_QUEUE,
+            'retries': Config.TASK_GROUP_RETRIES,
+            'timeout': Config.TASK_GROUP_TIMEOUT,
+            'backoff': Config.TASK_GROUP_BACKOFF,
+            'semaphore': asyncio.Semaphore(Config.TASK_GROUP_CONCURRENCY),
+            'queued': 0,
+            'running': 0,
+            'pending': {},     # key -> последняя еще не начатая задача
+            'key_locks': {},   # key -> [Lock, сколько задач с этим key]
+        }
+    return group
+
+
+def _report(name: str, group: dict):
+    set_gauge(f'tasks.{name}.queued', group['queued'])
+    set_gauge(f'tasks.{name}.running', group['running'])
+
+
+async def _attempts(name: str, group: dict, job, label: str, on_failure):
+    for attempt in range(group['retries'] + 1):
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(job(), timeout=group['timeout'])
+            inc(f'tasks.{name}.done')
+            return
+        except Exception as e:
+            error = e
+            logger.warning("[Tasks] %s attempt %s failed: %r", label, attempt + 1, e)
+        finally:
+            observe(f'tasks.{name}.duration', (time.monotonic() - started) * 1000)
+        if attempt < group['retries']:
+            inc(f'tasks.{name}.retried')
+            await asyncio.sleep(group['backoff'] * 2 ** attempt)
+    inc(f'tasks.{name}.failed')
+    logger.error("[Tasks] %s failed after %s attempts: %r", label, group['retries'] + 1, error)
+    if on_failure is not None:
+        on_failure(error)
+
+
+async def _run_job(name: str, group: dict, job, key, label: str, on_failure):
+    key_lock = None
+    if key is not None:
+        key_lock = group['key_locks'].setdefault(key, [asyncio.Lock(), 0])
+        key_lock[1] += 1
+    try:
+        if key_lock is not None:
+            await key_lock[0].acquire()
+        try:
+            async with group['semaphore']:
+                group['queued'] -= 1
+                if key is not None:
+                    # Пока ждали, задачу могли заменить более новой
+                    job, on_failure = group['pending'].pop(key)
+                group['running'] += 1
+                _report(name, group)
+                try:
+                    await _attempts(name, group, job, label, on_failure)
+                finally:
+                    group['running'] -= 1
+                    _report(name, group)
+        finally:
+            if key_lock is not None:
+                key_lock[0].release()
+    finally:
+        if key_lock is not None:
+            key_lock[1] -= 1
+            if not key_lock[1]:
+                group['key_locks'].pop(key, None)
+
+
+def submit(group_name: str, job, key=None, name: str = None, on_failure=None):
+    """
+    Запустить запись в группе задач.
+
+    job - корутинная функция без аргументов (при повторе вызывается заново);
+    on_failure(exc) - вызывается, если все попытки не удались.
+
+    Returns:
+        asyncio.Task; None - задача слилась с ожидающей задачей того же key или отклонена
+    """
+    group = _group(group_name)
+    label = name or (group_name if key is None else f'{group_name}:{key}')
+    if key is not None and key in group['pending']:
+        group['pending'][key] = (job, on_failure)
+        inc(f'tasks.{group_name}.coalesced')
+        return None
+    if group['queued'] >= group['max_queue']:
+        inc(f'tasks.{group_name}.rejected')
+        logger.error("[Tasks] Group %s queue is full (%s), %s rejected", group_name, group['queued'], label)
+        return None
+    if key is not None:
+        group['pending'][key] = (job, on_failure)
+    group['queued'] += 1
+    _report(group_name, group)
+    return spawn(_run_job(group_name, group, job, key, label, on_failure), name=label)
+
+
+def register_snapshot(hook):
+    """Корутинная функция без аргументов: сохранить состояние перед отменой таймеров"""
+    _snapshot_hooks.append(hook)
+
+
+def register_flush(hook):
+    """Корутинная функция без аргументов: дописать отложенные записи в API"""
+    _flush_hooks.append(hook)
+
+
+class InFlightMiddleware(BaseMiddleware):
+    """Учет выполняемых обработчиков (вешается как outer middleware на dp.update)"""
+
+    async def __call__(self, handler, event, data):
+        task = asyncio.current_task()
+        _inflight.add(task)
+        try:
+            return await handler(event, data)
+        finally:
+            _inflight.discard(task)
+
+
+async def _wait(tasks: set, deadline: float) -> set:
+    """Подождать задачи до дедлайна, вернуть незавершенные"""
+    tasks = {task for task in tasks if not task.done()}
+    timeout = deadline - time.monotonic()
+    if tasks and timeout > 0:
+        _, pending = await asyncio.wait(tasks, timeout=timeout)
+        return pending
+    return tasks
+
+
+async def _run_hooks(hooks: list, deadline: float, kind: str, report: dict):
+    for hook in hooks:
+        timeout = deadline - time.monotonic()
+        name = getattr(hook, '__qualname__', repr(hook))
+        if timeout <= 0:
+            report['errors'].append(f'{kind} {name}: no time left')
+            continue
+        try:
+            await asyncio.wait_for(hook(), timeout=timeout)
+        except Exception as e:
+            logger.error("[Shutdown] %s hook %s failed: %s", kind, name, e, exc_info=True)
+            report['errors'].append(f'{kind} {name}: {e}')
+
+
+async def drain(timeout: float) -> dict:
+    """
+    Дождаться завершения работы перед выходом.
+
+    Returns:
+        dict: {'handlers_dropped': int, 'tasks_dropped': [имена], 'timers_cancelled': int,
+               'errors': [str], 'seconds': float}
+    """
+    global draining
+    draining = True
+    started = time.monotonic()
+    deadline = started + timeout
+    report = {'handlers_dropped': 0, 'tasks_dropped': [], 'timers_cancelled': 0, 'errors': []}
+
+    current = asyncio.current_task()
+    handlers = {task for task in _inflight if task is not current}
+    logger.info("[Shutdown] Draining: %s handlers in flight, %s background tasks", len(handlers), len(_background))
+
+    # 1. Обработчики, которые уже начали работу
+    pending = await _wait(handlers, deadline)
+    for task in pending:
+        task.cancel()
+    report['handlers_dropped'] = len(pending)
+
+    # 2. Снимок состояния (FSM, таймеры) - пока таймеры еще живы
+    await _run_hooks(_snapshot_hooks, deadline, 'snapshot', report)
+
+    # 3. Долгие задачи отменяем, остальные фоновые ждем
+    for task, cancel in list(_background.items()):
+        if cancel and not task.done():
+            task.cancel()
+            report['timers_cancelled'] += 1
+    pending = await _wait({task for task, cancel in _background.items() if not cancel}, deadline)
+    for task in pending:
+        task.cancel()
+    report['tasks_dropped'] = sorted(task.get_name() for task in pending)
+
+    # 4. Отложенные записи
+    await _run_hooks(_flush_hooks, deadline, 'flush', report)
+
+    report['seconds'] = round(time.monotonic() - started, 2)
+    if report['handlers_dropped'] or report['tasks_dropped'] or report['errors']:
+        logger.warning(
+            "[Shutdown] Drain finished in %ss with losses: handlers dropped %s, tasks dropped %s, errors %s",
+            report['seconds'], report['handlers_dropped'], report['tasks_dropped'], report['errors'],
+        )
+    else:
+        logger.info("[Shutdown] Drain finished in %ss, nothing dropped (%s timers saved and stopped)",
+                    report['seconds'], report['timers_cancelled'])
+    return report
@@ -0,0 +1,141 @@
+"""
+Пачки мелких записей по заявкам
+
+ID сообщения о созданной заявке (update_request_message_id) и отклонение заявки по
+таймеру (update_request status='rejected') уходили в админку отдельными запросами,
+в пиковое время - десятками подряд. Теперь записи копятся WRITE_BATCH_DELAY_MS
+миллисекунд (или до WRITE_BATCH_MAX_SIZE штук) и уходят одним запросом
+POST /public/request-writes:
+
+- каждый вызывающий получает свой ответ - тот же, что вернул бы одиночный запрос;
+- пачки отправляются по одной, а админка выполняет записи одной заявки по порядку,
+  поэтому порядок записей по заявке сохраняется;
+- если админка не знает /public/request-writes (404) или пачка не прошла, записи
+  выполняются одиночными запросами (PATCH /public/request-message-id, PUT /payment;
+  обе записи идемпотентны).
+
+Оба маршрута админки принимают записи только с заголовком X-Bot-Token
+(Config.BOT_SERVICE_TOKEN = BOT_SERVICE_TOKEN админки).
+
+При остановке бота оставшиеся записи дописываются (tasks.register_flush).
+"""
+
+import asyncio
+import logging
+import time
+
+from api_client import APIClient
+from config import Config
+from metrics import inc, observe
+from tasks import register_flush, spawn
+
+logger = logging.getLogger(__name__)
+
+# (запись, future с ответом) в порядке вызовов
+_pending = []
+_state = {
+    'flusher': None,              # задача отправки пачек
+    'full': None,                 # asyncio.Event: набралась полная пачка
+    'batch_unsupported_until': 0.0,
+}
+# После 404 пробуем пачки снова через это время (админку могли обновить)
+BATCH_RECHECK_INTERVAL = 600
+
+
+async def update_message_id(request_id, message_id) -> dict:
+    """Как APIClient.update_request_message_id, но в пачке"""
+    return await _submit({'op': 'message_id', 'requestId': request_id, 'messageId': message_id})
+
+
+async def update_status(request_id, status: str, status_detail: str = None) -> dict:
+    """Как APIClient.update_request(request_id, status=..., status_detail=...), но в пачке"""
+    return await _submit({'op': 'status', 'requestId': request_id, 'status': status, 'statusDetail': status_detail})
+
+
+async def _submit(write: dict) -> dict:
+    future = asyncio.get_running_loop().create_future()
+    _pending.append((write, future))
+    inc('write_batch.writes')
+    if _state['full'] is None:
+        _state['full'] = asyncio.Event()
+    if len(_pending) >= Config.WRITE_BATCH_MAX_SIZE:
+        _state['full'].set()
+    flusher = _state['flusher']
+    if flusher is None or flusher.done():
+        _state['flusher'] = spawn(_flush_loop(), name='write-batch')
+    return await future
+
+
+async def _flush_loop():
+    while _pending:
+        # Ждем, пока подтянутся соседние записи, но не дольше WRITE_BATCH_DELAY_MS
+        if len(_pending) < Config.WRITE_BATCH_MAX_SIZE:
+            try:
+                await asyncio.wait_for(_state['full'].wait(), timeout=Config.WRITE_BATCH_DELAY_MS / 1000)
+            except asyncio.TimeoutError:
+                pass
+        _state['full'].clear()
+        batch = _pending[:Config.WRITE_BATCH_MAX_SIZE]
+        del _pending[:len(batch)]
+        await _send(batch)
+
+
+async def _send_single(write: dict) -> dict:
+    if write['op'] == 'message_id':
+        return await APIClient.update_request_message_id(write['requestId'], write['messageId'])
+    return await APIClient.update_request(
+        request_id=str(write['requestId']),
+        status=write['status'],
+        status_detail=write['statusDetail'],
+    )
+
+
+def _resolve(future: asyncio.Future, result: dict):
+    if not future.done():
+        future.set_result(result)
+
+
+async def _send(batch: list):
+    started = time.monotonic()
+    if time.monotonic() >= _state['batch_unsupported_until']:
+        try:
+            response = await APIClient.request_writes([write for write, _ in batch])
+        except Exception as e:
+            response = {'success': False, 'error': str(e)}
+        results = (response.get('data') or {}).get('results') if response.get('success') else None
+        if isinstance(results, list) and len(results) == len(batch):
+            for (_, future), result in zip(batch, results):
+                _resolve(future, result or {'success': False, 'error': 'Empty result'})
+            inc('write_batch.batches')
+            inc('write_batch.batched_writes', len(batch))
+            observe('write_batch.latency', (time.monotonic() - started) * 1000)
+            return
+        if response.get('status') == 404:
+            _state['batch_unsupported_until'] = time.monotonic() + BATCH_RECHECK_INTERVAL
+            logger.warning("[WriteBatch] Admin has no /public/request-writes, using single requests")
+        else:
+            logger.warning("[WriteBatch] Batch of %s failed: %s, using single requests", len(batch), response.get('error'))
+
+    inc('write_batch.fallbacks')
+    for write, future in batch:
+        try:
+            result = await _send_single(write)
+        except Exception as e:
+            result = {'success': False, 'error': str(e)}
+        _resolve(future, result)
+
+
+async def flush():
+    """Дописать все накопленные записи (при остановке бота)"""
+    flusher = _state['flusher']
+    if flusher is not None and not flusher.done():
+        if _state['full'] is not None:
+            _state['full'].set()
+        await flusher
+    while _pending:
+        batch = _pending[:Config.WRITE_BATCH_MAX_SIZE]
+        del _pending[:len(batch)]
+        await _send(batch)
+
+
+register_flush(flush)